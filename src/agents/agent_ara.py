@@ -0,0 +1,105 @@
+# Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
+#
+
+import logging
+import p4_search
+from p4_timing import wallClock as timer
+from agents import agent_astar
+
+EPSILON = 3.0       # inflation of the heuristic in the first search
+DECREMENT = 0.5     # decrease of the inflation between searches
+BUDGET = 0.5        # share of the time remaining spent on improving the path (the rest is left for moving)
+CHECK = 256         # expansions between checks of the clock
+
+
+class Agent(agent_astar.Agent):
+    """
+    Uses Anytime Repairing A* (Likhachev, Gordon and Thrun, 2003), on p4_search. A weighted A* search,
+    with the heuristic inflated by EPSILON, finds a first path quickly; the inflation is then lowered
+    by DECREMENT and the search resumed, reusing its g-values: cells whose g fell after they were
+    expanded (kept aside, rather than reopened, during each search) go back on the open list, which
+    is reordered for the new inflation. Each search finds a path at most epsilon times the optimum.
+    Searches go on until epsilon reaches 1 or BUDGET of the time remaining (see getNext()) has been
+    spent, and the best path found is followed. self.epsilon is the bound proven for that path:
+    epsilon, or less, as the cost over the least g + h of the cells left to expand.
+    """
+
+    def __init__(self, **kwargs):
+        agent_astar.Agent.__init__(self, **kwargs)
+        self.timeremaining = float('inf')
+        self.epsilon = None
+
+    def reset(self, **kwargs):
+        agent_astar.Agent.reset(self, **kwargs)
+        self.epsilon = None     # suboptimality bound of the path followed
+
+    def getNext(self, mapref, current, goal, timeremaining):
+        """called by SimController, keeps timeremaining as the budget of a new plan"""
+        self.timeremaining = timeremaining
+        return agent_astar.Agent.getNext(self, mapref, current, goal, timeremaining)
+
+    def _planpath(self, mapref, start, goal, all=False):
+        """ Performs ARA* from start to goal on map mapref, within the time budget """
+        if start == goal:
+            return []     # 0 steps, empty self.path
+
+        self.path = []          # path as list of coordinates
+        if not mapref.isReachable(start, goal):
+            return              # goal in another component: no path, empty self.path
+
+        deadline = timer() + BUDGET * self.timeremaining
+        getH = mapref.getH
+        epsilon = EPSILON
+        search = p4_search.BestFirst(mapref, lambda g, coord, cell: (g + epsilon * getH(coord, goal), g, cell))
+        self.search = search
+        self.goalcell = search.cell(goal)
+        search.begin(start)
+        self.incons = set()     # cells whose g fell after they were expanded, in this search
+        while True:
+            done = self._improvePath(deadline)
+            if search.g[self.goalcell] < float('inf'):
+                self.path = search.path(goal)[::-1]    # goal to start
+            if not done:
+                break
+            # g + h of the cells left bounds the optimum from below
+            least = min([search.g[cell] + getH(search.coord(cell), goal)
+                         for cell in search.open.cells() + list(self.incons)] or [float('inf')])
+            self.epsilon = min(epsilon, search.g[self.goalcell] / least) if least > 0 else epsilon
+            logging.info("agent_ara: epsilon {:.2f} (bound {:.3f}), cost {}, {} expansions".format(
+                epsilon, self.epsilon, search.g[self.goalcell], search.expanded))
+            if self.epsilon <= 1 or timer() > deadline:
+                break
+            epsilon = max(epsilon - DECREMENT, 1.0)
+            # reopen the cells set aside, and reorder the open list for the new epsilon
+            queue = p4_search.IndexedHeap(len(search.g))
+            for cell in search.open.cells() + list(self.incons):
+                queue.push(cell, search.key(search.g[cell], search.coord(cell), cell))
+            search.open = queue
+            search.closed = bytearray(len(search.closed))
+            self.incons = set()
+
+    def _improvePath(self, deadline):
+        """ Expands cells until none on the open list has a key below the cost of the goal. Returns False
+            if the deadline passed first (after a path has been found). """
+        search = self.search
+        g, parent, closed, h = search.g, search.parent, search.closed, search.height
+        queue, key, successors = search.open, search.key, search.successors
+        target = self.goalcell
+        incons = self.incons
+        while queue and queue.top()[0][0] < g[target]:
+            if not search.expanded % CHECK and g[target] < float('inf') and timer() > deadline:
+                return False
+            current = queue.pop()[1]
+            closed[current >> 3] |= 1 << (current & 7)
+            search.expanded += 1
+            gcurrent = g[current]
+            for cell, cost in successors(current):
+                gcell = gcurrent + cost
+                if gcell < g[cell]:
+                    g[cell] = gcell
+                    parent[cell] = current
+                    if closed[cell >> 3] >> (cell & 7) & 1:
+                        incons.add(cell)
+                    else:
+                        queue.push(cell, key(gcell, divmod(cell, h), cell))
+        return True
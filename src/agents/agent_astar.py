@@ -1,21 +1,27 @@
 # Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
 #
 
-from heapq import heappush, heappop
 import  p4_utils as p4               #contains colours and constants
+import p4_search
 #from twisted.python.util import println
 
 class Agent(object):
-    """Uses A* algorithm to calculate and return open list, closed list, and path"""
+    """Uses A* algorithm to calculate and return open list, closed list, and path (on p4_search)"""
     def __init__(self,**kwargs):
         self.stepgen = None
         self.goal = None
         self.nextmove = None
         self.mapref = None
         self.draw = False
+        self.search = None
         
     def getWorkings(self):
-        return ((zip(*self.openlist)[2], p4.COL_OL), (self.closedlist, p4.COL_CL))
+        openlist, closedlist = self._workings()
+        return ((openlist, p4.COL_OL), (closedlist, p4.COL_CL))
+
+    def _workings(self):
+        """Returns the coordinates on the open and closed lists of the last search"""
+        return self.search.openCells(), self.search.closedCells()
         
     def getNext(self, mapref, current, goal, timeremaining):
         """called by SimController, uses generator to return next step towards goal."""
@@ -37,8 +43,7 @@ class Agent(object):
         self.nextmove = None
         self.mapref = None
         self.draw = False
-        self.closedlist = {}    # dictionary of expanded nodes - key=coord, data = node
-        self.openlist = []      # heap as pqueue on f_val
+        self.search = None      # p4_search.BestFirst of the last search: open and closed lists
 
 
     def _gen(self, current):
@@ -57,8 +62,8 @@ class Agent(object):
         index_start = 0
         if self.draw:
             # first move goes with open, closed and path list for drawing, then yield each move one-by-one
-            yield self.nextmove, ((self.closedlist.keys(), p4.COL_CL), \
-               (zip(*self.openlist)[2], p4.COL_OL), (self.path, p4.COL_PP))
+            openlist, closedlist = self._workings()
+            yield self.nextmove, ((closedlist, p4.COL_CL), (openlist, p4.COL_OL), (self.path, p4.COL_PP))
             index_start = 0
 
         for move in reverse_path[index_start:]:
@@ -71,42 +76,14 @@ class Agent(object):
             return []     # 0 steps, empty self.path
 
         self.path = []          # path as list of coordinates
-
-        # initialise self.openlist with start node
-        # node = (f, g, coord, parent)  and start node has g=0 and f = h and no parent
-        heappush(self.openlist, (mapref.getH(start, goal) , 0, start, None))
-
-        while self.openlist:
-            # pop best node from open list (lowest f)
-            node = heappop(self.openlist)
-            current_f, current_g, current, parent = node
-            if current in self.closedlist or current_g == float('inf'):
-                continue # node has to be ignored: blocked or already visited
-
-            # add node to closelist
-            self.closedlist[current] = node
-
-            # goal reached?
-            if current == goal:
-                # yes! so rewind using parent links from self.closedlist to get self.path
-                self._reconstruct(current, start)
-                return
-
-            # expand current node by getting all successors and adding them to open list
-            adjacents = (mapref.getAdjacents(current))
-            for a in adjacents:
-                adjg = current_g + mapref.getCost(a, current)
-                adjf = adjg + mapref.getH(a, goal)
-                adjnode = (adjf, adjg, a, current)
-                if a not in self.closedlist:
-                    heappush(self.openlist, adjnode)
-
-    def _reconstruct(self, current, start):
-        """
-           Reconstruct backwards path from current to start by following parent links
-        """
-        self.path = [current]
-        while not current == start:
-            current = self.closedlist[current][p4.P_POS]
-            self.path.append(current)
-        return
+        if not mapref.isReachable(start, goal):
+            return              # goal in another component: no path, empty self.path
+
+        # nodes are expanded in order of (f, g, cell); as with a heap of (f, g, coord, parent) nodes, a
+        # cell reached at equal g from several cells keeps the least as parent. Under cost models with
+        # near-integer f-values, the open list is a bucket queue, with f ordered only to the bucket
+        getH = mapref.getH
+        self.search = p4_search.BestFirst(mapref, lambda g, coord, cell: (g + getH(coord, goal), g, cell),
+                                          tiebreak=True, queue=p4_search.openList(mapref))
+        if self.search.run(start, goal):
+            self.path = self.search.path(goal)[::-1]    # goal to start
@@ -0,0 +1,65 @@
+# Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
+#
+
+import logging
+import p4_search
+from agents import agent_astar
+
+
+class Agent(agent_astar.Agent):
+    """
+    Bidirectional heuristic search meeting in the middle (MM: Holte et al., 2016), on p4_search.
+    A forward search from the start and a backward one from the goal (over the moves into each
+    cell, so asymmetric costs, e.g. under the mixed cost model, are those of forward moves) each
+    expand cells in order of max(g + h, 2g), lower g first, and the one with the lower such
+    priority goes next. Stops once the cheapest path through a cell reached by both costs no more
+    than the lower priority. Expansions per direction are logged and kept in self.expansions.
+    """
+
+    def reset(self, **kwargs):
+        agent_astar.Agent.reset(self, **kwargs)
+        self.backward = None        # p4_search.BestFirst of the backward half of the last search
+        self.expansions = (0, 0)    # (forward, backward) expansions of the last search
+
+    def _workings(self):
+        """Returns the coordinates on the open and closed lists of both halves of the last search"""
+        if self.backward is None:
+            return agent_astar.Agent._workings(self)
+        return (self.search.openCells() + self.backward.openCells(),
+                self.search.closedCells() + self.backward.closedCells())
+
+    def _planpath(self, mapref, start, goal, all=False):
+        """ Performs bidirectional search from start to goal on map mapref """
+        if start == goal:
+            return []     # 0 steps, empty self.path
+
+        self.path = []          # path as list of coordinates
+        if not mapref.isReachable(start, goal):
+            return              # goal in another component: no path, empty self.path
+
+        # the backward heuristic bounds the cost from start to a cell, as the landmark heuristic is not symmetric
+        getH = mapref.getH
+        forward = p4_search.BestFirst(mapref, lambda g, coord, cell: (max(g + getH(coord, goal), 2 * g), g, cell),
+                                      tiebreak=True)
+        backward = p4_search.BestFirst(mapref, lambda g, coord, cell: (max(g + getH(start, coord), 2 * g), g, cell),
+                                       tiebreak=True, successors=mapref.getCellPredecessors)
+        self.search, self.backward = forward, backward
+        forward.begin(start)
+        backward.begin(goal)
+        while forward.open and backward.open:
+            fkey, bkey = forward.topKey(), backward.topKey()
+            if min(forward.meetcost, backward.meetcost) <= min(fkey[0], bkey[0]):
+                break   # no path left to find is cheaper than the best one through a meeting cell
+            if fkey <= bkey:
+                forward.expand(backward)
+            else:
+                backward.expand(forward)
+
+        self.expansions = (forward.expanded, backward.expanded)
+        logging.info("agent_bidir: {} forward and {} backward expansions".format(*self.expansions))
+        meet = forward.meetcell if forward.meetcost <= backward.meetcost else backward.meetcell
+        if meet < 0:
+            return              # no path, empty self.path
+        meet = forward.coord(meet)
+        # start to meeting cell, then meeting cell to goal, kept goal to start
+        self.path = (forward.path(meet) + backward.path(meet)[-2::-1])[::-1]
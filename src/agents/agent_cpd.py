@@ -0,0 +1,82 @@
+# Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
+#
+
+import logging
+import p4_cpd
+import p4_utils as p4
+from agents import agent_astar
+
+
+class Agent(agent_astar.Agent):
+    """
+    Uses a compressed path database (see p4_cpd): each call to getNext() looks up the first move
+    from the current cell towards the goal, with no search. The database is loaded by preprocess()
+    (or the first call) from the .p4cpd cache of the map if the map cache is on (-mc) and the
+    database was built ahead of time with p4_cpd.py, and otherwise built then, which takes a
+    Dijkstra search from every cell of the map. It is rebuilt when the terrain or costs change
+    between problems (told from the map version, see LogicalMap.changesSince()). Falls back to A*
+    on maps with doors and when start or goal is impassable.
+    """
+
+    def __init__(self, **kwargs):
+        agent_astar.Agent.__init__(self, **kwargs)
+        self.database = None    # p4_cpd.PathDatabase
+        self.settings = None    # map, size and move costs the database is for
+        self.classes = None     # terrain classes the database is for (see LogicalMap.getCellClasses())
+        self.version = None     # (map, its version) the database is up to date with
+        self.lookup = False     # whether steps of the current problem are read from the database
+
+    def preprocess(self, mapref):
+        """ Loads, or builds, the path database of mapref """
+        self.classes, costs = mapref.getCellClasses()
+        self.settings = (mapref.mappath, mapref.width, mapref.height, costs)
+        self.version = (mapref, mapref.version)
+        self.database = p4_cpd.loadDatabase(mapref)
+        logging.info("agent_cpd: {:,d} runs, {:,d} bytes".format(len(self.database.runs), self.database.size()))
+
+    def _update(self, mapref):
+        """ Brings the database up to date with mapref: in O(1) if its terrain has not changed since, from
+            the changes journalled otherwise (comparing all classes only if they have left the journal) """
+        if self.database is None or \
+                not self.settings == (mapref.mappath, mapref.width, mapref.height, mapref.getMoveCosts()):
+            return self.preprocess(mapref)
+        changes = mapref.changesSince(self.version[1]) if self.version[0] is mapref else None
+        if changes == []:
+            return
+        if changes is None:
+            unchanged = mapref.getCellClasses()[0] == self.classes
+        else:
+            # edits since undone leave the database good: compare each cell changed with its terrain before
+            before = {}
+            for change in changes:
+                for cell, old in zip(p4.getBlock(change.topleft, change.botright), change.old):
+                    before.setdefault(cell, old)
+            unchanged = all(mapref.getCell(cell) == old for cell, old in before.iteritems())
+        if unchanged:
+            self.version = (mapref, mapref.version)
+        else:
+            self.preprocess(mapref)
+
+    def _workings(self):
+        """Returns the coordinates on the open and closed lists of the last search (none for lookups)"""
+        if self.search is None:
+            return [], []
+        return agent_astar.Agent._workings(self)
+
+    def getNext(self, mapref, current, goal, timeremaining):
+        """called by SimController, returns next step towards goal from the database (from a path
+        planned by A*, where the database does not apply)."""
+        if not mapref == self.mapref or not goal == self.goal or not current == self.nextmove:
+            self.reset()
+            self.goal = goal
+            self.mapref = mapref
+            self.lookup = not mapref.doors and mapref.isPassable(current) and mapref.isPassable(goal) \
+                and mapref.isReachable(current, goal)
+            if self.lookup:
+                self._update(mapref)
+            else:
+                self.stepgen = self._gen(current)
+        if not self.lookup:
+            return self.stepgen.next()
+        self.nextmove = self.database.nextStep(current, goal)
+        return self.nextmove
@@ -0,0 +1,174 @@
+# Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
+#
+
+import logging
+from heapq import heappush, heappop
+from agents import agent_astar
+
+INF = float('inf')
+
+
+class Agent(agent_astar.Agent):
+    """
+    Uses D* Lite (Koenig and Likhachev, 2002): a search backwards from the goal, over the moves into
+    each cell, keeps for every cell it reaches the cost to the goal (g) and a one-step lookahead of it
+    (rhs). Each step moves to the successor with the lowest move cost plus g. The agent registers with
+    the map (see LogicalMap.addListener()) for the cells changed by setPoints() (e.g. by script.py
+    TERRAIN_CHANGE entries); before the next step it recomputes rhs of the cells whose moves they
+    affect and expands only the cells whose costs to the goal changed. Moves of the agent by script
+    are taken in stride; a new goal or map starts a new search. Expansions of each search and repair
+    are logged. Falls back to A* on maps with doors, and when the goal cannot be reached.
+    """
+
+    def __init__(self, **kwargs):
+        agent_astar.Agent.__init__(self, **kwargs)
+        self.g = None           # cost to goal of each cell (index col * height + row), INF if unknown
+        self.changed = []       # coordinates of cells changed since the last step
+
+    def reset(self, **kwargs):
+        if self.g is not None and self.mapref is not None:
+            self.mapref.removeListener(self._terrainChanged)
+        agent_astar.Agent.reset(self, **kwargs)
+        self.g = None
+        self.rhs = None         # one-step lookahead of g: cheapest move cost plus g of a successor
+        self.queue = []         # heap of (key, key tie-break, cell), current only if in self.keys
+        self.keys = {}          # inconsistent cell (g not equal to rhs): its key
+        self.km = 0             # key modifier: sum of heuristic distances the start has moved
+        self.start = None       # current position of the agent
+        self.changed = []
+        self.expanded = set()   # cells expanded by the last search or repair, for drawing
+
+    def _terrainChanged(self, change):
+        """ Listener registered with the map: keeps the coordinates of changed cells until the next step """
+        self.changed.extend(change.cells())
+
+    def _workings(self):
+        """Returns the coordinates on the open and closed lists of the last search or repair"""
+        if self.g is None:
+            return agent_astar.Agent._workings(self)  # fell back to A*
+        h = self.height
+        return [divmod(cell, h) for cell in self.keys], [divmod(cell, h) for cell in self.expanded]
+
+    def getNext(self, mapref, current, goal, timeremaining):
+        """called by SimController, returns next step towards goal after bringing the search up to date
+        with the start and terrain changes."""
+        if self.g is None or not mapref == self.mapref or not goal == self.goal:
+            if mapref.doors or not mapref.isReachable(current, goal):
+                return agent_astar.Agent.getNext(self, mapref, current, goal, timeremaining)
+            self.reset()
+            self._begin(mapref, current, goal)
+        if not current == self.start:
+            # the start moved: keys in the queue stay lower bounds if raised by its heuristic distance
+            self.km += mapref.getH(self.start, current)
+            self.start = current
+        if self.changed:
+            self._repair()
+        self._computePath()
+
+        h = self.height
+        startcell = current[0] * h + current[1]
+        g = self.g
+        best, bestcost = None, INF
+        for cell, cost in mapref.getCellSuccessors(startcell):
+            if cost + g[cell] < bestcost:
+                best, bestcost = cell, cost + g[cell]
+        # no way to the goal left: stay
+        self.nextmove = current if best is None else divmod(best, h)
+        return self.nextmove
+
+    def _begin(self, mapref, current, goal):
+        """ Starts the search backwards from goal, to current """
+        self.mapref = mapref
+        self.goal = goal
+        self.start = current
+        self.height = mapref.height
+        size = mapref.width * mapref.height
+        self.g = [INF] * size
+        self.rhs = [INF] * size
+        self.goalcell = goal[0] * self.height + goal[1]
+        self.rhs[self.goalcell] = 0
+        self._updateCell(self.goalcell)
+        mapref.addListener(self._terrainChanged)
+        self._computePath()
+        logging.info("agent_dstarlite: {} expansions to plan".format(len(self.expanded)))
+
+    def _repair(self):
+        """ Recomputes rhs of the cells whose moves out of them the changed cells may affect (those
+            next to them, as moves may cut corners) and requeues those made inconsistent """
+        mapref = self.mapref
+        h, w = self.height, mapref.width
+        affected = set()
+        for col, row in self.changed:
+            affected.update(c * h + r for c in xrange(max(col - 1, 0), min(col + 2, w))
+                            for r in xrange(max(row - 1, 0), min(row + 2, h)))
+        count = len(self.changed)
+        self.changed = []
+        for cell in affected:
+            if not cell == self.goalcell:
+                self.rhs[cell] = self._lookahead(cell)
+            self._updateCell(cell)
+        self._computePath()
+        logging.info("agent_dstarlite: {} expansions to repair {} changed cells".format(len(self.expanded), count))
+
+    def _lookahead(self, cell):
+        """ Returns the cheapest cost of a move out of cell plus the cost to goal of where it leads """
+        g = self.g
+        best = INF
+        for other, cost in self.mapref.getCellSuccessors(cell):
+            if cost + g[other] < best:
+                best = cost + g[other]
+        return best
+
+    def _key(self, cell):
+        """ Returns the key of cell: the least of its g and rhs, plus the heuristic from the start """
+        m = min(self.g[cell], self.rhs[cell])
+        return m + self.mapref.getH(self.start, divmod(cell, self.height)) + self.km, m
+
+    def _updateCell(self, cell):
+        """ Queues cell with its current key if inconsistent, dequeues it otherwise """
+        if self.g[cell] == self.rhs[cell]:
+            self.keys.pop(cell, None)
+        else:
+            key = self._key(cell)
+            self.keys[cell] = key
+            heappush(self.queue, (key[0], key[1], cell))
+
+    def _computePath(self):
+        """ Expands cells in order of key until the start is consistent and no key is lower than its own """
+        queue, keys, g, rhs = self.queue, self.keys, self.g, self.rhs
+        predecessors = self.mapref.getCellPredecessors
+        startcell = self.start[0] * self.height + self.start[1]
+        self.expanded = set()
+        while queue:
+            k1, k2, cell = queue[0]
+            if not keys.get(cell) == (k1, k2):
+                heappop(queue)      # outdated entry
+                continue
+            if not ((k1, k2) < self._key(startcell) or rhs[startcell] > g[startcell]):
+                break
+            heappop(queue)
+            key = self._key(cell)
+            if (k1, k2) < key:
+                keys[cell] = key
+                heappush(queue, (key[0], key[1], cell))
+                continue
+            self.expanded.add(cell)
+            if g[cell] > rhs[cell]:
+                # cost to goal fell (or first found): predecessors may now go through cell
+                g[cell] = rhs[cell]
+                del keys[cell]
+                for other, cost in predecessors(cell):
+                    if cost + g[cell] < rhs[other] and not other == self.goalcell:
+                        rhs[other] = cost + g[cell]
+                        self._updateCell(other)
+            else:
+                # cost to goal rose: cells whose lookahead went through cell, and cell, look again
+                old = g[cell]
+                g[cell] = INF
+                for other, cost in predecessors(cell):
+                    if rhs[other] == cost + old and not other == self.goalcell:
+                        rhs[other] = self._lookahead(other)
+                        self._updateCell(other)
+                if not cell == self.goalcell:
+                    rhs[cell] = self._lookahead(cell)
+                self._updateCell(cell)
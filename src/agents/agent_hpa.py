@@ -0,0 +1,294 @@
+# Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
+#
+
+from heapq import heappush, heappop
+import p4_cache
+import p4_utils as p4
+from agents import agent_astar
+
+CLUSTER = 16        # side of the square clusters the map is divided into
+INF = float('inf')
+
+
+class Agent(agent_astar.Agent):
+    """
+    Uses HPA* (Botea, Mueller and Schaeffer, 2004). The map is divided into square clusters; each
+    stretch of passable cells along the border of two clusters gets one crossing (two if 6 or more
+    long), whose cells are the nodes of an abstract graph, joined by the crossing moves and, within
+    each cluster, by the costs of the cheapest paths inside it. A query searches the abstract graph
+    from start to goal, linked to the nodes of their clusters, and refines each abstract edge by
+    a search inside its cluster. Paths are near-optimal: they cross borders only at nodes.
+    The abstraction is built by preprocess() (or on first search), kept across problems, written,
+    if the map cache is on (-mc), next to the map (or in the map cache directory) for the terrain,
+    costs and cluster size, and repaired cluster by cluster when terrain changes (e.g. by setPoints()).
+    Falls back to A* on maps with doors, when start or goal is impassable, and when both are in the
+    same cluster.
+    """
+
+    def __init__(self, **kwargs):
+        agent_astar.Agent.__init__(self, **kwargs)
+        self.size = CLUSTER
+        self.settings = None    # map, size and move costs the abstraction is for
+        self.version = None     # (map, its version) the abstraction is up to date with (see LogicalMap.changesSince())
+        self.borders = {}       # (cluster, east or south neighbour): [(cell, neighbour cell, cost, back cost)]
+        self.intra = {}         # node: [(node of the same cluster, cost of cheapest path inside it)]
+        self.nodes = {}         # cluster: set of its nodes
+        self.inter = {}         # node: [(node across a border, cost)]
+        self.abstract = []      # abstract nodes expanded by the last search, for drawing
+
+    def reset(self, **kwargs):
+        agent_astar.Agent.reset(self, **kwargs)
+        self.abstract = []
+
+    def _workings(self):
+        """Returns the coordinates on the open and closed lists of the last search (abstract nodes
+        expanded, if the abstract graph was searched)"""
+        if self.search is not None:
+            return agent_astar.Agent._workings(self)  # fell back to A*
+        return [], [divmod(node, self.height) for node in self.abstract]
+
+    def preprocess(self, mapref):
+        """ Builds, or loads from disk, the abstraction of mapref """
+        classes, costs = mapref.getCellClasses()
+        self.settings = (mapref.mappath, mapref.width, mapref.height, self.size, costs)
+        self.version = (mapref, mapref.version)
+        self.height = mapref.height
+        self.rows = -(-mapref.height // self.size)    # clusters per column of clusters
+        self.cols = -(-mapref.width // self.size)
+        digest = p4_cache.extendDigest(p4_cache.dataDigest(classes), mapref.width, mapref.height, costs, self.size)
+        cachefile = None
+        if mapref.cache and mapref.mappath is not None:
+            cachefile = p4_cache.cachePath(mapref.mappath, digest, "p4hpa", mapref.cachedir)
+            cached = p4_cache.readCache(cachefile, p4_cache.HPA_MAGIC, digest)
+            if cached is not None:
+                self.borders = dict(((k1, k2), crossings) for k1, k2, crossings in cached[0]["borders"])
+                self.intra = dict(cached[0]["intra"])
+                self._index()
+                return
+        self.borders = {}
+        for k in xrange(self.rows * self.cols):
+            for n in self._neighbours(k):
+                if n > k:
+                    self.borders[k, n] = self._crossings(mapref, k, n)
+        self._index()
+        self.intra = {}
+        for k in xrange(self.rows * self.cols):
+            self._linkCluster(mapref, k)
+        if cachefile is not None:
+            p4_cache.writeCache(cachefile, p4_cache.HPA_MAGIC,
+                                {"digest": digest, "borders": [(k1, k2, crossings) for (k1, k2), crossings
+                                                               in self.borders.iteritems()],
+                                 "intra": self.intra.items()})
+
+    def _update(self, mapref):
+        """ Brings the abstraction up to date with mapref: rebuilt for another map or cost model, or if
+            the changes since it was built have left the journal, repaired around changed cells otherwise """
+        changes = None
+        if self.version is not None and self.version[0] is mapref and \
+                self.settings == (mapref.mappath, mapref.width, mapref.height, self.size, mapref.getMoveCosts()):
+            changes = mapref.changesSince(self.version[1])     # [] if up to date: O(1)
+        if changes is None:
+            self.preprocess(mapref)
+        elif changes:
+            # changed cells alter moves out of their neighbours, so the clusters of those are rebuilt
+            h = mapref.height
+            dirty = set()
+            for change in changes:
+                for (col, row), old, new in zip(p4.getBlock(change.topleft, change.botright), change.old, change.new):
+                    if not old == new:
+                        dirty.update(self._cluster(c * h + r) for c in xrange(max(col - 1, 0), min(col + 2, mapref.width))
+                                     for r in xrange(max(row - 1, 0), min(row + 2, h)))
+            self.version = (mapref, mapref.version)
+            affected = set(dirty)
+            for k in dirty:
+                for n in self._neighbours(k):
+                    self.borders[min(k, n), max(k, n)] = self._crossings(mapref, min(k, n), max(k, n))
+                    affected.add(n)
+            stale = set(node for k in affected for node in self.nodes.get(k, ()))
+            self._index()
+            for node in stale:
+                self.intra.pop(node, None)
+            for k in affected:
+                self._linkCluster(mapref, k)
+
+    def _cluster(self, cell):
+        """ Returns the cluster of cell """
+        col, row = divmod(cell, self.height)
+        return col // self.size * self.rows + row // self.size
+
+    def _box(self, k):
+        """ Returns the cells of cluster k as (first col, last col + 1, first row, last row + 1) """
+        ci, cj = divmod(k, self.rows)
+        width = self.settings[1]
+        return (ci * self.size, min((ci + 1) * self.size, width),
+                cj * self.size, min((cj + 1) * self.size, self.height))
+
+    def _neighbours(self, k):
+        """ Returns the clusters sharing a border with cluster k """
+        ci, cj = divmod(k, self.rows)
+        return ([k - self.rows] if ci else []) + ([k + self.rows] if ci + 1 < self.cols else []) + \
+               ([k - 1] if cj else []) + ([k + 1] if cj + 1 < self.rows else [])
+
+    def _crossings(self, mapref, k1, k2):
+        """ Returns the crossings of the border from cluster k1 to k2 (east or south of it), as
+            (cell of k1, cell of k2, cost from one to the other, cost back): the middle of each
+            stretch of cells with moves across both ways, or its two ends if 6 or more long """
+        c0, c1, r0, r1 = self._box(k1)
+        h = self.height
+        if k2 == k1 + self.rows:
+            pairs = [((c1 - 1, row), (c1, row)) for row in xrange(r0, r1)]
+        else:
+            pairs = [((col, r1 - 1), (col, r1)) for col in xrange(c0, c1)]
+        crossings = []
+        stretch = []
+        for a, b in pairs + [(None, None)]:
+            if a is not None:
+                there, back = mapref.getCost(b, a), mapref.getCost(a, b)
+                if there < INF and back < INF:
+                    stretch.append((a[0] * h + a[1], b[0] * h + b[1], there, back))
+                    continue
+            if stretch:
+                crossings.extend([stretch[len(stretch) // 2]] if len(stretch) < 6 else [stretch[0], stretch[-1]])
+                stretch = []
+        return crossings
+
+    def _index(self):
+        """ Rebuilds the nodes of each cluster and the edges between clusters from the crossings """
+        self.nodes = {}
+        self.inter = {}
+        for (k1, k2), crossings in self.borders.iteritems():
+            for a, b, there, back in crossings:
+                self.nodes.setdefault(k1, set()).add(a)
+                self.nodes.setdefault(k2, set()).add(b)
+                self.inter.setdefault(a, []).append((b, there))
+                self.inter.setdefault(b, []).append((a, back))
+
+    def _linkCluster(self, mapref, k):
+        """ Computes the costs between the nodes of cluster k, by paths inside it """
+        nodes = self.nodes.get(k, ())
+        box = self._box(k)
+        for a in nodes:
+            dist = self._distances(mapref.getCellSuccessors, a, box, nodes)
+            self.intra[a] = [(b, dist[b]) for b in nodes if not b == a and b in dist]
+
+    def _distances(self, successors, source, box, targets):
+        """ Dijkstra from source over the cells of box, until the targets are settled: returns the costs
+            from source (to source, given getCellPredecessors as successors) of the cells reached """
+        c0, c1, r0, r1 = box
+        h = self.height
+        dist = {source: 0}
+        left = len(targets) - (source in targets)
+        heap = [(0, source)]
+        while heap and left:
+            d, i = heappop(heap)
+            if d > dist[i]:
+                continue
+            if not i == source and i in targets:
+                left -= 1
+            for j, cost in successors(i):
+                col, row = divmod(j, h)
+                if c0 <= col < c1 and r0 <= row < r1 and d + cost < dist.get(j, INF):
+                    dist[j] = d + cost
+                    heappush(heap, (d + cost, j))
+        return dist
+
+    def _localPath(self, mapref, source, target, box):
+        """ A* from source to target over the cells of box: returns the path as a list of cells """
+        c0, c1, r0, r1 = box
+        h = self.height
+        getH, getSucc = mapref.getH, mapref.getCellSuccessors
+        goal = divmod(target, h)
+        g = {source: 0}
+        parent = {source: None}
+        closed = set()
+        openlist = [(getH(divmod(source, h), goal), 0, source)]
+        while openlist:
+            f, gi, i = heappop(openlist)
+            if i in closed:
+                continue
+            closed.add(i)
+            if i == target:
+                path = []
+                while i is not None:
+                    path.append(i)
+                    i = parent[i]
+                return path[::-1]
+            for j, cost in getSucc(i):
+                col, row = divmod(j, h)
+                if c0 <= col < c1 and r0 <= row < r1 and gi + cost < g.get(j, INF):
+                    g[j] = gi + cost
+                    parent[j] = i
+                    heappush(openlist, (gi + cost + getH((col, row), goal), gi + cost, j))
+        return None
+
+    def _planpath(self, mapref, start, goal, all=False):
+        """ Performs HPA* from start to goal on map mapref """
+        if start == goal:
+            return []     # 0 steps, empty self.path
+
+        self.path = []          # path as list of coordinates
+        if not mapref.isReachable(start, goal):
+            return              # goal in another component: no path, empty self.path
+
+        if mapref.doors or not (mapref.isPassable(start) and mapref.isPassable(goal)):
+            return agent_astar.Agent._planpath(self, mapref, start, goal, all)
+        self._update(mapref)
+        h = self.height
+        scell, gcell = start[0] * h + start[1], goal[0] * h + goal[1]
+        ks, kg = self._cluster(scell), self._cluster(gcell)
+        if ks == kg:
+            return agent_astar.Agent._planpath(self, mapref, start, goal, all)
+        self.search = None
+
+        # start and goal join the abstract graph through the nodes of their clusters
+        startnodes, goalnodes = self.nodes.get(ks, set()), self.nodes.get(kg, set())
+        tostart = self._distances(mapref.getCellSuccessors, scell, self._box(ks), startnodes)
+        togoal = self._distances(mapref.getCellPredecessors, gcell, self._box(kg), goalnodes)
+        startlinks = [(node, cost) for node, cost in tostart.iteritems() if node in startnodes and not node == scell]
+
+        getH = mapref.getH
+        g = {scell: 0}
+        parent = {scell: None}
+        closed = set()
+        openlist = [(getH(start, goal), 0, scell)]
+        while openlist:
+            f, gn, node = heappop(openlist)
+            if node in closed:
+                continue
+            closed.add(node)
+            if node == gcell:
+                break
+            edges = self.inter.get(node, [])
+            if node == scell:
+                edges = edges + startlinks
+            else:
+                edges = edges + self.intra.get(node, [])
+            if node in togoal and node in goalnodes:
+                edges = edges + [(gcell, togoal[node])]
+            for other, cost in edges:
+                if gn + cost < g.get(other, INF):
+                    g[other] = gn + cost
+                    parent[other] = node
+                    heappush(openlist, (gn + cost + getH(divmod(other, h), goal), gn + cost, other))
+        self.abstract = list(closed)
+        if gcell not in closed:
+            return agent_astar.Agent._planpath(self, mapref, start, goal, all)
+
+        abstract = []
+        node = gcell
+        while node is not None:
+            abstract.append(node)
+            node = parent[node]
+        abstract.reverse()
+        # refine: crossings are single moves, other edges paths inside a cluster
+        cells = [scell]
+        for a, b in zip(abstract, abstract[1:]):
+            k = self._cluster(a)
+            if not k == self._cluster(b):
+                cells.append(b)
+                continue
+            segment = self._localPath(mapref, a, b, self._box(k))
+            if segment is None:
+                return agent_astar.Agent._planpath(self, mapref, start, goal, all)
+            cells.extend(segment[1:])
+        self.path = [divmod(cell, h) for cell in reversed(cells)]   # goal to start
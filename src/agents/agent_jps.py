@@ -0,0 +1,157 @@
+# Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
+#
+
+from heapq import heappush, heappop
+import  p4_utils as p4               #contains colours and constants
+from agents import agent_astar
+
+
+class Agent(agent_astar.Agent):
+    """
+    Uses Jump Point Search (Harabor and Grastien, 2011) to calculate and return open list, closed list,
+    and path. Diagonal moves never cut a corner (see LogicalMap.cutsCorner()), so jumps stop next to
+    obstacles accordingly. Only applies where moves cost the same all over the map: falls back to A*
+    on non-uniform maps, maps with doors, 4-way movement, or when start or goal is impassable.
+    """
+
+    def _uniformCosts(self, mapref, start, goal):
+        """ Returns the (straight, diagonal) move costs if jump points apply to this search, None otherwise """
+        if not mapref.uniform or not mapref.diagonal or mapref.doors:
+            return None
+        if not (mapref.isPassable(start) and mapref.isPassable(goal)):
+            return None
+        return mapref.getUniformCosts()
+
+    def _gridVersion(self, mapref):
+        """ Returns what the passability grid of mapref (see LogicalMap.getPassableGrid()) depends on: the
+        map, its version (terrain edits) and its passable terrains, to tell in O(1) whether tables built
+        from the grid are still good """
+        return mapref, mapref.version, frozenset(c for c, cost in mapref.costs.iteritems() if cost < float('inf'))
+
+    def _planpath(self, mapref, start, goal, all=False):
+        """ Performs jump point search from start to goal on map mapref """
+        costs = self._uniformCosts(mapref, start, goal)
+        if costs is None:
+            return agent_astar.Agent._planpath(self, mapref, start, goal, all)
+        if start == goal:
+            return []     # 0 steps, empty self.path
+
+        self.path = []          # path as list of coordinates
+        if not mapref.isReachable(start, goal):
+            return              # goal in another component: no path, empty self.path
+
+        # cells are indices into the padded passability grid: coord (col, row) is (col + 1) * H + row + 1
+        self.search = None
+        H = mapref.height + 2
+        self.walk = mapref.getPassableGrid()
+        self.goalcell = (goal[0] + 1) * H + goal[1] + 1
+        straight, diagonal = costs
+        getH = mapref.getH
+        coord = lambda i: (i // H - 1, i % H - 1)
+
+        # node = (f, g, cell, parent cell, direction of arrival from parent or None)
+        startcell = (start[0] + 1) * H + start[1] + 1
+        openlist = [(getH(start, goal), 0, startcell, None, None)]
+        closed = {}
+        while openlist:
+            node = heappop(openlist)
+            current_f, current_g, current, parent, direction = node
+            if current in closed:
+                continue # node has to be ignored: already visited
+
+            closed[current] = node
+
+            if current == self.goalcell:
+                self._reconstruct_jumps(closed, current, H)
+                break
+
+            for dx, dy in self._prune(current, direction, H):
+                jump = self._jump(current, dx, dy, H)
+                if jump < 0 or jump in closed:
+                    continue
+                steps = max(abs(jump // H - current // H), abs(jump % H - current % H))
+                adjg = current_g + steps * (diagonal if dx and dy else straight)
+                heappush(openlist, (adjg + getH(coord(jump), goal), adjg, jump, current, (dx, dy)))
+
+        self._keepWorkings(closed, openlist, H)
+
+    def _workings(self):
+        """Returns the coordinates on the open and closed lists of the last search (jump points only)"""
+        if self.search is not None:
+            return agent_astar.Agent._workings(self)  # fell back to A*
+        return [node[2] for node in self.openlist], self.closedlist.keys()
+
+    def _keepWorkings(self, closed, openlist, H):
+        """ Stores the closed and open lists of jump points in the format of agent_astar, for drawing """
+        coord = lambda i: (i // H - 1, i % H - 1)
+        self.closedlist = dict((coord(cell), (node[0], node[1], coord(cell), node[3] and coord(node[3])))
+                               for cell, node in closed.iteritems())
+        self.openlist = [(node[0], node[1], coord(node[2]), node[3] and coord(node[3])) for node in openlist]
+
+    def _prune(self, current, direction, H):
+        """ Returns the directions to jump in from current, having arrived along direction (None at start):
+            the natural neighbours of the move plus its forced ones. A diagonal move needs both cells
+            beside it to be passable. """
+        walk = self.walk
+        if direction is None:
+            return [(dx, dy) for dx, dy in p4.DIRECTIONS
+                    if walk[current + dx * H + dy] and walk[current + dx * H] and walk[current + dy]]
+        dx, dy = direction
+        dirs = []
+        if dx and dy:
+            if walk[current + dy]:
+                dirs.append((0, dy))
+            if walk[current + dx * H]:
+                dirs.append((dx, 0))
+                if walk[current + dy]:
+                    dirs.append((dx, dy))
+        else:
+            # sideways steps are forced (reachable from the previous cell only through current);
+            # diagonals ahead need the cell ahead and the one beside current
+            ahead = walk[current + dx * H + dy]
+            for sx, sy in ((dy, dx), (-dy, -dx)):
+                if walk[current + sx * H + sy]:
+                    dirs.append((sx, sy))
+                    if ahead:
+                        dirs.append((dx + sx, dy + sy))
+            if ahead:
+                dirs.append((dx, dy))
+        return dirs
+
+    def _jump(self, current, dx, dy, H):
+        """ Returns the cell of the next jump point from current along (dx, dy), or -1 if there is none """
+        walk = self.walk
+        goalcell = self.goalcell
+        step = dx * H + dy
+        if dx and dy:
+            while walk[current + dx * H] and walk[current + dy]:
+                current += step
+                if not walk[current]:
+                    return -1
+                if current == goalcell or self._jump(current, dx, 0, H) >= 0 or self._jump(current, 0, dy, H) >= 0:
+                    return current
+            return -1
+        # straight: stop where a side cell is passable but the one behind it is not (a forced neighbour)
+        side1, side2 = dy * H + dx, -dy * H - dx
+        while True:
+            current += step
+            if not walk[current]:
+                return -1
+            if current == goalcell or (walk[current + side1] and not walk[current - step + side1]) or \
+                    (walk[current + side2] and not walk[current - step + side2]):
+                return current
+
+    def _reconstruct_jumps(self, closed, current, H):
+        """
+           Reconstruct backwards path from current to start by following parent links between jump
+           points, filling in the cells in between
+        """
+        self.path = [(current // H - 1, current % H - 1)]
+        while closed[current][3] is not None:
+            parent = closed[current][3]
+            dx, dy = closed[current][4]
+            step = dx * H + dy
+            while not current == parent:
+                current -= step
+                self.path.append((current // H - 1, current % H - 1))
+        return
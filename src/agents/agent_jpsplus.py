@@ -0,0 +1,158 @@
+# Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
+#
+
+from array import array
+from heapq import heappush, heappop
+import  p4_utils as p4               #contains colours and constants
+import p4_cache
+from agents import agent_astar, agent_jps
+
+# directions to jump in (indices into p4.DIRECTIONS) after arriving along each direction, and from the start:
+# straight ahead, the diagonals ahead and the sides after a straight move; the two straight components
+# and the diagonal itself after a diagonal move
+NEXT_DIRECTIONS = [tuple((d + k) % 8 for k in ((0, 1, 7, 2, 6) if not d & 1 else (0, 1, 7))) for d in xrange(8)]
+ALL_DIRECTIONS = tuple(xrange(8))
+
+
+class Agent(agent_jps.Agent):
+    """
+    Uses JPS+ (Rabin, 2015): Jump Point Search with the distance to the next jump point (or to the wall)
+    precomputed for every cell and direction, so that finding a successor is a table read instead of a scan.
+    The tables are built by preprocess() (or on first search) and, if the map cache is on (-mc), written next
+    to the map (or in the map cache directory), keyed by a hash of the passable cells, to be loaded on later runs.
+    Falls back to A* where agent_jps does.
+    """
+
+    def __init__(self, **kwargs):
+        agent_jps.Agent.__init__(self, **kwargs)
+        self.jumps = None       # jump distances, at 8 * cell + direction (see preprocess())
+        self.grid = None        # passability grid (see LogicalMap.getPassableGrid()) jumps are for
+        self.gridversion = None  # _gridVersion() of the map the grid was read from
+
+    def preprocess(self, mapref):
+        """
+        Builds, or loads from disk, the jump distances of mapref: for each passable cell (index into the
+        padded passability grid) and direction d, jumps[8 * cell + d] is k > 0 if the k-th cell along d
+        is a jump point, and -k if only k cells can be moved along d before an obstacle (0: none).
+        """
+        self.grid = mapref.getPassableGrid()
+        self.gridversion = self._gridVersion(mapref)
+        H = mapref.height + 2
+        digest = p4_cache.dataDigest(self.grid, str(H))
+        cachefile = None
+        if mapref.cache and mapref.mappath is not None:
+            cachefile = p4_cache.cachePath(mapref.mappath, digest, "p4jps", mapref.cachedir)
+            cached = p4_cache.readCache(cachefile, p4_cache.JUMP_MAGIC, digest)
+            if cached is not None and cached[2] == 16 * len(self.grid):
+                self.jumps = array('h')
+                self.jumps.fromstring(buffer(cached[1])[:])
+                return
+        self.jumps = self._jumpDistances(self.grid, H)
+        if cachefile is not None:
+            p4_cache.writeCache(cachefile, p4_cache.JUMP_MAGIC, {"digest": digest}, self.jumps.tostring())
+
+    def _jumpDistances(self, walk, H):
+        """ Computes the jump distances (see preprocess()) over the padded passability grid walk.
+            Cells are swept against each direction, so the distances of the next cell are known. """
+        jumps = array('h', [0]) * (8 * len(walk))
+        offsets = [dx * H + dy for dx, dy in p4.DIRECTIONS]
+        for d in (0, 2, 4, 6, 1, 3, 5, 7):  # diagonals use the straight distances
+            dx, dy = p4.DIRECTIONS[d]
+            step = offsets[d]
+            cells = xrange(len(walk) - H - 2, H, -1) if step > 0 else xrange(H + 1, len(walk) - H - 1)
+            if not d & 1:
+                # straight: the next cell is a jump point if a side cell is passable but the one behind it is not
+                side1, side2 = dy * H + dx, -dy * H - dx
+                for i in cells:
+                    if not walk[i]:
+                        continue
+                    j = i + step
+                    if not walk[j]:
+                        continue
+                    if (walk[j + side1] and not walk[i + side1]) or (walk[j + side2] and not walk[i + side2]):
+                        jumps[8 * i + d] = 1
+                    else:
+                        k = jumps[8 * j + d]
+                        jumps[8 * i + d] = k + 1 if k > 0 else k - 1
+            else:
+                # diagonal (never cutting a corner): the next cell is a jump point if a straight jump
+                # from it along either component finds one
+                ox, oy = dx * H, dy
+                dirx, diry = p4.DIRECTION_INDEX[dx, 0], p4.DIRECTION_INDEX[0, dy]
+                for i in cells:
+                    if not walk[i]:
+                        continue
+                    j = i + step
+                    if not (walk[j] and walk[i + ox] and walk[i + oy]):
+                        continue
+                    if jumps[8 * j + dirx] > 0 or jumps[8 * j + diry] > 0:
+                        jumps[8 * i + d] = 1
+                    else:
+                        k = jumps[8 * j + d]
+                        jumps[8 * i + d] = k + 1 if k > 0 else k - 1
+        return jumps
+
+    def _planpath(self, mapref, start, goal, all=False):
+        """ Performs JPS+ from start to goal on map mapref """
+        costs = self._uniformCosts(mapref, start, goal)
+        if costs is None:
+            return agent_astar.Agent._planpath(self, mapref, start, goal, all)
+        if start == goal:
+            return []     # 0 steps, empty self.path
+
+        self.path = []          # path as list of coordinates
+        if not mapref.isReachable(start, goal):
+            return              # goal in another component: no path, empty self.path
+
+        if self.jumps is None or not self._gridVersion(mapref) == self.gridversion:
+            self.preprocess(mapref)  # not preprocessed, or the map has changed since
+        self.search = None
+        H = mapref.height + 2
+        jumps = self.jumps
+        straight, diagonal = costs
+        getH = mapref.getH
+        offsets = [dx * H + dy for dx, dy in p4.DIRECTIONS]
+        gcol, grow = goal[0] + 1, goal[1] + 1
+        goalcell = gcol * H + grow
+
+        # node = (f, g, cell, parent cell, direction of arrival as (dx, dy), and as an index, or None)
+        startcell = (start[0] + 1) * H + start[1] + 1
+        openlist = [(getH(start, goal), 0, startcell, None, None, None)]
+        closed = {}
+        while openlist:
+            node = heappop(openlist)
+            current_f, current_g, current, parent, direction, d = node
+            if current in closed:
+                continue # node has to be ignored: already visited
+
+            closed[current] = node
+
+            if current == goalcell:
+                self._reconstruct_jumps(closed, current, H)
+                break
+
+            ccol, crow = divmod(current, H)
+            dcol, drow = gcol - ccol, grow - crow
+            for d in ALL_DIRECTIONS if d is None else NEXT_DIRECTIONS[d]:
+                dist = jumps[8 * current + d]
+                dx, dy = p4.DIRECTIONS[d]
+                if d & 1:
+                    # the goal row or column, if the goal lies ahead and it is reached before the jump point or wall
+                    steps = min(dcol * dx, drow * dy)
+                    if not 0 < steps <= abs(dist):
+                        steps = dist
+                    cost = diagonal
+                else:
+                    # the goal, if straight ahead before the jump point or wall
+                    ahead = dcol * dx + drow * dy
+                    steps = ahead if dcol * dy == drow * dx and 0 < ahead <= abs(dist) else dist
+                    cost = straight
+                if steps <= 0:
+                    continue
+                jump = current + steps * offsets[d]
+                if jump in closed:
+                    continue
+                adjg = current_g + steps * cost
+                heappush(openlist, (adjg + getH((jump // H - 1, jump % H - 1), goal), adjg, jump, current, (dx, dy), d))
+
+        self._keepWorkings(closed, openlist, H)
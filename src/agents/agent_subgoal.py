@@ -0,0 +1,235 @@
+# Copyright (C) 2015-17 Peta Masters and Sebastian Sardina
+#
+
+from array import array
+from heapq import heappush, heappop
+import  p4_utils as p4               #contains colours and constants
+import p4_cache
+from agents import agent_astar, agent_jps
+
+DIAGONALS = (1, 3, 5, 7)            # indices into p4.DIRECTIONS
+CARDINALS = (0, 2, 4, 6)
+
+
+class Agent(agent_jps.Agent):
+    """
+    Uses Simple Subgoal Graphs (Uras, Koenig and Hernandez, 2013). Subgoals are the passable cells
+    diagonally next to an obstacle corner they can move around; two subgoals are joined if one is
+    direct-h-reachable from the other (an octile-length path joins them, with no subgoal on it).
+    A query joins start and goal to the graph the same way and searches the graph only; each edge
+    is then walked diagonal moves first (or last). Costs are optimal.
+    preprocess() (or the first search) finds the subgoals, the clearance of every cell in every
+    direction (moves up to an obstacle or a subgoal) and the edges, written, if the map cache is on
+    (-mc), next to the map (or in the map cache directory), keyed by a hash of the passable cells, to be
+    loaded on later runs.
+    Falls back to A* where agent_jps does.
+    """
+
+    def __init__(self, **kwargs):
+        agent_jps.Agent.__init__(self, **kwargs)
+        self.grid = None        # passability grid (see LogicalMap.getPassableGrid()) the graph is for
+        self.gridversion = None  # _gridVersion() of the map the grid was read from
+        self.subgoal = None     # 1 for each subgoal, over the padded grid
+        self.clear = None       # clearances, at 8 * cell + direction
+        self.edges = None       # subgoal: subgoals joined to it
+        self.costs = None       # (straight, diagonal) move costs adjacent is for
+        self.adjacent = None    # subgoal: [(subgoal joined to it, cost)]
+
+    def preprocess(self, mapref):
+        """ Builds, or loads from disk, the subgoal graph of mapref """
+        self.grid = mapref.getPassableGrid()
+        self.gridversion = self._gridVersion(mapref)
+        self.H = H = mapref.height + 2
+        self.offsets = [dx * H + dy for dx, dy in p4.DIRECTIONS]
+        self.adjacent = None
+        digest = p4_cache.dataDigest(self.grid, str(H))
+        cachefile = None
+        if mapref.cache and mapref.mappath is not None:
+            cachefile = p4_cache.cachePath(mapref.mappath, digest, "p4ssg", mapref.cachedir)
+            cached = p4_cache.readCache(cachefile, p4_cache.SUBGOAL_MAGIC, digest)
+            if cached is not None and cached[2] == 17 * len(self.grid):
+                payload = buffer(cached[1])
+                self.subgoal = bytearray(payload[:len(self.grid)])
+                self.clear = array('h')
+                self.clear.fromstring(payload[len(self.grid):])
+                self.edges = dict(cached[0]["edges"])
+                return
+        walk = self.grid
+        self.subgoal = bytearray(len(walk))
+        for i in xrange(H + 1, len(walk) - H - 1):
+            if walk[i]:
+                for d in DIAGONALS:
+                    dx, dy = p4.DIRECTIONS[d]
+                    if not walk[i + dx * H + dy] and walk[i + dx * H] and walk[i + dy]:
+                        self.subgoal[i] = 1
+                        break
+        self.clear = self._clearances(walk, self.subgoal, H)
+        self.edges = {}
+        for s in xrange(len(walk)):
+            if self.subgoal[s]:
+                for t in self._reachable(s):
+                    self.edges.setdefault(s, []).append(t)
+                    if s not in self.edges.get(t, ()):
+                        self.edges.setdefault(t, []).append(s)
+        if cachefile is not None:
+            p4_cache.writeCache(cachefile, p4_cache.SUBGOAL_MAGIC, {"digest": digest, "edges": self.edges.items()},
+                                str(self.subgoal) + self.clear.tostring())
+
+    def _clearances(self, walk, subgoal, H):
+        """ Returns, for each cell and direction d, the number of moves along d before an obstacle,
+            a cut corner or a subgoal. Cells are swept against each direction, as in agent_jpsplus. """
+        clear = array('h', [0]) * (8 * len(walk))
+        for d, (dx, dy) in enumerate(p4.DIRECTIONS):
+            step = dx * H + dy
+            cells = xrange(len(walk) - H - 2, H, -1) if step > 0 else xrange(H + 1, len(walk) - H - 1)
+            ox, oy = dx * H, dy
+            for i in cells:
+                j = i + step
+                if not walk[i] or not walk[j] or subgoal[j] or (d & 1 and not (walk[i + ox] and walk[i + oy])):
+                    continue
+                clear[8 * i + d] = clear[8 * j + d] + 1
+        return clear
+
+    def _ray(self, cell, d, extra):
+        """ Returns (k, hit): the moves along d from cell before an obstacle or subgoal (extra counting as
+            one), and the subgoal a legal move after them, or -1 """
+        k = self.clear[8 * cell + d]
+        H = self.H
+        dx, dy = p4.DIRECTIONS[d]
+        if extra >= 0:
+            ex, ey = extra // H - cell // H, extra % H - cell % H
+            steps = ex * dx if dx else ey * dy
+            if 0 < steps <= k and ex == steps * dx and ey == steps * dy:
+                return steps - 1, extra
+            if steps == k + 1 and ex == steps * dx and ey == steps * dy:
+                hit = extra
+            else:
+                hit = cell + (k + 1) * self.offsets[d]
+                if not self.subgoal[hit]:
+                    return k, -1
+        else:
+            hit = cell + (k + 1) * self.offsets[d]
+            if not self.subgoal[hit]:
+                return k, -1
+        # the clearance may have stopped at a cut corner rather than at the subgoal
+        last = hit - self.offsets[d]
+        if not self.grid[hit] or (d & 1 and not (self.grid[last + dx * H] and self.grid[last + dy])):
+            return k, -1
+        return k, hit
+
+    def _reachable(self, cell, extra=-1):
+        """ Returns the subgoals (and extra, as if one) direct-h-reachable from cell """
+        offsets = self.offsets
+        found = []
+        for d in CARDINALS:
+            k, hit = self._ray(cell, d, extra)
+            if hit >= 0:
+                found.append(hit)
+        for d in DIAGONALS:
+            sides = ((d - 1) % 8, (d + 1) % 8)
+            bound = [self._ray(cell, c, extra)[0] for c in sides]
+            diag, hit = self._ray(cell, d, extra)
+            if hit >= 0:
+                found.append(hit)
+            for i in xrange(1, diag + 1):
+                corner = cell + i * offsets[d]
+                for n, c in enumerate(sides):
+                    j, hit = self._ray(corner, c, extra)
+                    if j <= bound[n] and hit >= 0:
+                        found.append(hit)
+                        j -= 1
+                    if j < bound[n]:
+                        bound[n] = j
+        return found
+
+    def _walk(self, a, b, diagfirst):
+        """ Returns the cells from a to b (excluded) moving diagonally first (or last), or None if blocked """
+        H = self.H
+        walk = self.grid
+        dx, dy = b // H - a // H, b % H - a % H
+        sx, sy = (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+        diag = min(abs(dx), abs(dy))
+        straight = (sx * H if abs(dx) > abs(dy) else sy, max(abs(dx), abs(dy)) - diag)
+        legs = [(sx * H + sy, diag), straight] if diagfirst else [straight, (sx * H + sy, diag)]
+        cells = []
+        current = a
+        for step, count in legs:
+            for k in xrange(count):
+                if not walk[current + step]:
+                    return None
+                if step == sx * H + sy and not (walk[current + sx * H] and walk[current + sy]):
+                    return None
+                current += step
+                cells.append(current)
+        return cells[:-1]
+
+    def _planpath(self, mapref, start, goal, all=False):
+        """ Searches the subgoal graph from start to goal on map mapref """
+        costs = self._uniformCosts(mapref, start, goal)
+        if costs is None:
+            return agent_astar.Agent._planpath(self, mapref, start, goal, all)
+        if start == goal:
+            return []     # 0 steps, empty self.path
+
+        self.path = []          # path as list of coordinates
+        if not mapref.isReachable(start, goal):
+            return              # goal in another component: no path, empty self.path
+
+        if self.clear is None or not self._gridVersion(mapref) == self.gridversion:
+            self.preprocess(mapref)  # not preprocessed, or the map has changed since
+        self.search = None
+        H = self.H
+        straight, diagonal = costs
+        octile = lambda a, b: (lambda dx, dy: diagonal * min(dx, dy) + straight * abs(dx - dy))(
+            abs(a // H - b // H), abs(a % H - b % H))
+        if self.adjacent is None or not costs == self.costs:
+            self.costs = costs
+            self.adjacent = dict((s, [(t, octile(s, t)) for t in ts]) for s, ts in self.edges.iteritems())
+        getH = mapref.getH
+        coord = lambda i: (i // H - 1, i % H - 1)
+        startcell = (start[0] + 1) * H + start[1] + 1
+        goalcell = (goal[0] + 1) * H + goal[1] + 1
+
+        fromstart = [(t, octile(startcell, t)) for t in self._reachable(startcell, goalcell)]
+        togoal = dict((t, octile(t, goalcell)) for t in self._reachable(goalcell, startcell))
+        g = {startcell: 0}
+        parent = {startcell: None}
+        closed = {}
+        openlist = [(getH(start, goal), 0, startcell)]
+        while openlist:
+            f, gn, node = heappop(openlist)
+            if node in closed:
+                continue
+            closed[node] = (f, gn, coord(node), parent[node] and coord(parent[node]))
+            if node == goalcell:
+                break
+            edges = fromstart if node == startcell else self.adjacent.get(node, [])
+            if node in togoal:
+                edges = edges + [(goalcell, togoal[node])]
+            for other, cost in edges:
+                if gn + cost < g.get(other, float('inf')):
+                    g[other] = gn + cost
+                    parent[other] = node
+                    heappush(openlist, (gn + cost + getH(coord(other), goal), gn + cost, other))
+        self.closedlist = dict((node[2], node) for node in closed.itervalues())
+        self.openlist = [(f, gn, coord(node), None) for f, gn, node in openlist]
+        if goalcell not in closed:
+            return agent_astar.Agent._planpath(self, mapref, start, goal, all)
+
+        # walk each edge, goal to start
+        path = [goalcell]
+        node = goalcell
+        while parent[node] is not None:
+            cells = self._walk(parent[node], node, True)
+            if cells is None:
+                cells = self._walk(parent[node], node, False)
+            path.extend(reversed(cells))
+            path.append(parent[node])
+            node = parent[node]
+        self.path = [coord(cell) for cell in path]
+
+    def _workings(self):
+        """Returns the coordinates on the open and closed lists of the last search (start, goal and subgoals)"""
+        if self.search is not None:
+            return agent_astar.Agent._workings(self)  # fell back to A*
+        return [node[2] for node in self.openlist], self.closedlist.keys()
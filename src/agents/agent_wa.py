@@ -1,7 +1,5 @@
-from heapq import heappush, heappop, heapify
-from time import time
+import p4_search
 
-INF = float('inf')
 X_POS = 0
 Y_POS = 1
 
@@ -20,7 +18,7 @@ class Agent(object):
         self.start = None           # starting point
         self.goal = None            # goal
         self.mapref = None          # logic map
-        self.parents = {}           # parents
+        self.search = None          # p4_search.BestFirst of the last search
         self.stepgen = self.step_gen()
         
     def getPath(self, model, start, goal):
@@ -42,74 +40,20 @@ class Agent(object):
         for step in path:
             yield step
 
-    def reconstruct_path(self, current, parents):
-        path = []
-        while current in parents:
-            path.insert(0, current)
-            current = parents[current]
-        return path
-
     def astar(self, mapref, start, goal, flag = False):
-        open = []
-        self.open_dict = {}
-        heapify(open)
-        closed = {}
-        self.g_score = {start: 0}
-        heappush(open, (0, start, 0))
-        self.open_dict[start] = None
-        g_child = 0
-        
-        # avoid "."
-        getH = mapref.getH
-        getAdj = mapref.getAdjacents
-        getCost = mapref.getCost
-        closed_has = closed.has_key
-        open_has = self.open_dict.has_key
-        getCell = mapref.getCell
-        matrix = mapref.matrix
-        
         # Check if goal has already been reached
         if start == goal:
             return start
-            
-        # Astar
-        while(open):
-            # pop first in queue
-            current = heappop(open)[1]
-            del self.open_dict[current]
-            if current == goal:
-                if flag:    #just need cost, not path
-                    return self.g_score[current]
-                return self.reconstruct_path(current, self.parents)
-            # Add to closed list
-            closed[current] = None
-            # Get and check all adjacent nodes from current position
-            for n in getAdj(current):
-                # Check if it is an obstacle
-                if matrix[n[X_POS]][n[Y_POS]] == '@':
-                    continue
-                # Check if it is passable
-                g_child = getCost(n, current)
-                if g_child == INF:
-                    continue
-                g = self.g_score[current] + g_child
-                # Is it in closed list with a smaller value?
-                if closed_has(n): #and g >= self.g_score[n]:
-                    continue
-                if not open_has(n) or g < self.g_score[n]:
-                    # Assign current as the parent of n
-                    self.parents[n] = current
-                    # Update g score
-                    self.g_score[n] = g
-                    if not open_has(n):
-                        #f(n) = (1 - w) * g(n) + w * h(n) - g increases as h decreases and vice versa
-                        try:
-                            f = (1 - self.w) * g + self.w * getH(goal, n)
-                        except: 
-                            print self.w, g, getH(goal, n)
-                            f = (1 - self.w) * g + self.w * getH(goal, n)
-                        heappush(open, (f, n))
-                        self.open_dict[n] = None
-        #path not found
-        return None
+        # goal in another component: no path
+        if not mapref.isReachable(start, goal):
+            return None
 
+        # f(n) = (1 - w) * g(n) + w * h(n) - g increases as h decreases and vice versa
+        w = self.w
+        getH = mapref.getH
+        self.search = p4_search.BestFirst(mapref, lambda g, coord, cell: ((1 - w) * g + w * getH(goal, coord), cell))
+        if not self.search.run(start, goal):
+            return None     # path not found
+        if flag:    # just need cost, not path
+            return self.search.g[self.search.cell(goal)]
+        return self.search.path(goal)[1:]
@@ -25,12 +25,16 @@ GOAL      = (409,93)             #coordinates of goal location in (col,row) form
 GUI = False                      #True = show GUI, False = run on command line
 SPEED = 0.0                     #delay between displayed moves in seconds
 DEADLINE = 15                   #Number of seconds to reach goal
-HEURISTIC = 'octile'            #may be 'euclid' or 'manhattan' or 'octile' (default = 'euclid')
+HEURISTIC = 'octile'            #may be 'euclid' or 'manhattan' or 'octile' or 'landmark' (default = 'euclid')
+LANDMARKS = 16                  #Number of landmarks used by the 'landmark' heuristic (default = 16)
 DIAGONAL = True                 #Only allows 4-way movement when False (default = True)
 FREE_TIME = 0.000               #Step times > FREE_TIME are timed iff REALTIME = True
 DYNAMIC = False                 #Implements runtime changes found in script.py when True
 STRICT = True                   #Allows traversal of impassable cells when False (default = True)
 PREPROCESS = False              #Gives agent opportunity to preprocess map (default = False)
+COMPACT = False                 #Stores map terrain in a flat byte array to save memory (default = False)
+MAP_CACHE = False               #Loads/writes binary .p4grid map caches; True (next to map) or a directory (default = False)
 #COST_MODEL = 'mixed_real'      #May be 'mixed' (default), 'mixed_real', 'mixed_opt1' or 'mixed_opt2'
+COST_SCALE = 0                  #Integer costs, scaled by COST_SCALE (e.g. 1000: 1000 straight, 1414 diagonal); 0 = float costs (default = 0)
 COST_FILE = "../costs/G1-W5-S10.cost"
 
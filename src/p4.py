@@ -87,8 +87,14 @@ parser.add_argument('-e', '--heuristic',
                     action='store',
                     dest='HEURISTIC',
                     default="euclid",
-                    choices=['euclid', 'manhattan', 'octile'],
+                    choices=['euclid', 'manhattan', 'octile', 'landmark'],
                     help="heuristic to use (default: %(default)s).")
+parser.add_argument('-lm', '--landmarks',
+                    action='store',
+                    dest='LANDMARKS',
+                    type=int,
+                    default=16,
+                    help="number of landmarks for the 'landmark' heuristic (default: %(default)s).")
 parser.add_argument('-r', '--speed',
                     action='store',
                     dest='SPEED',
@@ -105,6 +111,13 @@ parser.add_argument('-cm', '--cost',
                     default="mixed",
                     choices = COST_MODELS,
                     help="cost model to use (default: %(default)s).")
+parser.add_argument('-cs', '--cost-scale',
+                    action='store',
+                    dest='COST_SCALE',
+                    type=int,
+                    default=0,
+                    help="integer costs: scale costs by this and round, e.g. 1000 for 1000 straight and 1414 diagonal "
+                         "(default: %(default)s, float costs).")
 parser.add_argument('-c', '--cost-file',
                     action='store',
                     dest='COST_FILE',
@@ -124,11 +137,55 @@ parser.add_argument('-pre', '--preprocess',
                     dest='PREPROCESS',
                     default=False,
                     help="calls agent.preprocess() before starting search (default: %(default)s).")
+parser.add_argument('-cmp', '--compact',
+                    action='store_true',
+                    dest='COMPACT',
+                    default=False,
+                    help="store map terrain in a flat byte array to save memory (default: %(default)s).")
+parser.add_argument('-mc', '--map-cache',
+                    nargs='?',
+                    const=True,
+                    dest='MAP_CACHE',
+                    default=False,
+                    help="load maps from binary .p4grid caches, kept next to the map or in the given "
+                         "directory, and write them when missing or stale (default: %(default)s).")
 parser.add_argument('-rt', '-realtime', '--realtime',
                     action='store_true',
                     dest='REALTIME',
                     default=False,
                     help="time every step instead of just first step (default: %(default)s).")
+parser.add_argument('-j', '--jobs',
+                    action='store',
+                    dest='JOBS',
+                    type=int,
+                    default=1,
+                    help="batch mode: run problems on this many worker processes, each loading map and agent once "
+                         "and timing steps by its own CPU time; rows are written in scenario order "
+                         "(default: %(default)s).")
+parser.add_argument('-rs', '--resume',
+                    action='store_true',
+                    dest='RESUME',
+                    default=False,
+                    help="batch mode: skip problems whose rows (same agent, number and map) are already in the output "
+                         "file, e.g. to carry on after the run was killed (default: %(default)s).")
+parser.add_argument('-t', '--timer',
+                    action='store',
+                    dest='TIMER',
+                    default=p4_utils.TIMER,
+                    choices=("cpu", "wall"),
+                    help="clock steps are timed by: CPU time of the process, or monotonic wall time "
+                         "(default: %(default)s).")
+parser.add_argument('-sy', '--sync',
+                    action='store',
+                    dest='SYNC_ROWS',
+                    type=int,
+                    default=100,
+                    help="batch mode: flush and fsync the output file every this many rows (default: %(default)s).")
+parser.add_argument('-db', '--results-db',
+                    action='store',
+                    dest='RESULTS_DB',
+                    help="batch mode: also record the run, its settings and its results in this SQLite database "
+                         "(see p4_results.py).")
 parser.add_argument('-b', '-batch', '--batch',
                     nargs='*',
                     dest='BATCH',
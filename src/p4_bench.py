@@ -0,0 +1,188 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmarks for the simulator internals. Run from src/, e.g.
+
+    python p4_bench.py storage ../maps/dao/ost100d.map ../maps/mazes/maze512-1-0.map
+
+Each benchmark prints one line per map.
+"""
+
+import argparse
+import sys
+from heapq import heappush, heappop
+from random import randint, seed
+from time import time as timer
+
+import p4_search
+from p4_model import LogicalMap
+
+LOOKUPS = 200000
+SEARCHES = 20
+
+
+def _matrixSize(lmap):
+    """Bytes held by the terrain storage of lmap (chars are interned, so not counted)"""
+    if lmap.compact:
+        return sys.getsizeof(lmap.grid) + sys.getsizeof(lmap._columns) + \
+            sum(sys.getsizeof(col) for col in lmap._columns)
+    return sys.getsizeof(lmap.matrix) + sum(sys.getsizeof(col) for col in lmap.matrix)
+
+
+def _passableCoords(lmap, count):
+    """Returns count random passable coordinates of lmap (repeatable)"""
+    seed(0)
+    coords = []
+    while len(coords) < count:
+        c = (randint(0, lmap.width - 1), randint(0, lmap.height - 1))
+        if lmap.isPassable(c):
+            coords.append(c)
+    return coords
+
+
+def benchStorage(mappath, costpath=None):
+    """Compares load time, memory and getCell() throughput of list and compact storage."""
+    print("{}:".format(mappath))
+    for compact in (False, True):
+        start = timer()
+        lmap = LogicalMap(mappath, costpath, compact=compact)
+        loadtime = timer() - start
+
+        seed(0)
+        coords = [(randint(0, lmap.width - 1), randint(0, lmap.height - 1)) for i in xrange(LOOKUPS)]
+        getCell = lmap.getCell
+        start = timer()
+        for c in coords:
+            getCell(c)
+        elapsed = timer() - start
+        print("  {:8} {:4}x{:<4} load {:7.3f}s  terrain {:10,d} bytes  getCell {:6.2f} M/s".format(
+            "compact" if compact else "list", lmap.width, lmap.height, loadtime, _matrixSize(lmap),
+            LOOKUPS / elapsed / 1e6))
+
+
+def benchSuccessors(mappath, costpath=None):
+    """Times the successor table build and neighbour expansion through getAdjacents()/getCost()
+    and getSuccessors()."""
+    lmap = LogicalMap(mappath, costpath)
+    start = timer()
+    lmap._buildMoves()
+    buildtime = timer() - start
+
+    coords = _passableCoords(lmap, LOOKUPS // 20)
+    getAdjacents, getCost, getSuccessors = lmap.getAdjacents, lmap.getCost, lmap.getSuccessors
+    start = timer()
+    for c in coords:
+        [getCost(a, c) for a in getAdjacents(c)]
+    adjtime = timer() - start
+    start = timer()
+    for c in coords:
+        getSuccessors(c)
+    succtime = timer() - start
+    print("{}: build {:6.3f}s  getAdjacents+getCost {:6.3f} M/s  getSuccessors {:6.3f} M/s".format(
+        mappath, buildtime, len(coords) / adjtime / 1e6, len(coords) / succtime / 1e6))
+
+
+def benchCache(mappath, costpath=None):
+    """Compares map load time from text and from a warm .p4grid cache (in a temporary directory)."""
+    import shutil
+    import tempfile
+    cachedir = tempfile.mkdtemp()
+    try:
+        LogicalMap(mappath, costpath, cache=cachedir)  # warm the cache
+        times = []
+        for compact in (False, True):
+            for cache in (False, cachedir):
+                start = timer()
+                LogicalMap(mappath, costpath, compact=compact, cache=cache)
+                times.append(timer() - start)
+        print("{}: list text {:6.4f}s cache {:6.4f}s  compact text {:6.4f}s cache {:6.4f}s".format(mappath, *times))
+    finally:
+        shutil.rmtree(cachedir)
+
+
+class _HeapqQueue(object):
+    """Open list on a plain heapq: a key decrease pushes the cell again, and stale entries are skipped
+    when popped (as agent_astar did before p4_search)"""
+
+    def __init__(self, size):
+        self.heap = []
+        self.keys = {}      # key of each cell on the queue
+
+    def __len__(self):
+        return len(self.keys)
+
+    def push(self, cell, key):
+        old = self.keys.get(cell)
+        if old is not None and not key < old:
+            return False
+        self.keys[cell] = key
+        heappush(self.heap, (key, cell))
+        return True
+
+    def pop(self):
+        heap, keys = self.heap, self.keys
+        while True:
+            key, cell = heappop(heap)
+            if keys.get(cell) == key:
+                del keys[cell]
+                return key, cell
+
+
+def benchQueues(mappath, costpath=None):
+    """Times A* (p4_search.BestFirst, octile heuristic) with the open list on heapq, an IndexedHeap
+    and a BucketQueue, under each cost model, on the same random problems."""
+    lmap = LogicalMap(mappath, costpath)
+    coords = _passableCoords(lmap, 4 * SEARCHES)
+    problems = [(a, b) for a, b in zip(coords[::2], coords[1::2]) if lmap.isReachable(a, b)][:SEARCHES]
+    for cm in ("mixed", "mixed_opt1", "mixed_opt2"):
+        lmap.setCostModel(cm)
+        width = p4_search.BUCKET_WIDTHS.get(cm, lmap.OCT_CONST)
+        getH = lmap.getH
+        results = []
+        for queue in (_HeapqQueue, p4_search.IndexedHeap, lambda size: p4_search.BucketQueue(size, width)):
+            expanded = 0
+            total = 0.0
+            start = timer()
+            for a, b in problems:
+                search = p4_search.BestFirst(lmap, lambda g, coord, cell: (g + getH(coord, b), g, cell),
+                                             queue=queue)
+                search.run(a, b)
+                expanded += search.expanded
+                total += search.g[search.cell(b)]
+            results.append((timer() - start, expanded, total))
+        print("{}: {:10} heapq {:6.2f}s  indexed {:6.2f}s  bucket {:6.2f}s  expanded {:,d}/{:,d}/{:,d}  "
+              "costs {}".format(mappath, cm, results[0][0], results[1][0], results[2][0],
+                                results[0][1], results[1][1], results[2][1],
+                                "equal" if len(set(round(r[2], 6) for r in results)) == 1 else "DIFFER"))
+
+
+BENCHMARKS = {
+    "cache": benchCache,
+    "queues": benchQueues,
+    "storage": benchStorage,
+    "successors": benchSuccessors,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="P4 micro-benchmarks")
+    parser.add_argument("BENCH", choices=sorted(BENCHMARKS.keys()), help="benchmark to run")
+    parser.add_argument("MAPS", nargs='+', help="map files to benchmark on")
+    parser.add_argument('-c', '--cost-file', dest='COST_FILE', help="file with cost of cells")
+    args = parser.parse_args()
+    for mappath in args.MAPS:
+        BENCHMARKS[args.BENCH](mappath, args.COST_FILE)
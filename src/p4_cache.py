@@ -0,0 +1,126 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+On-disk caches of data derived from a map (and its cost file).
+
+Cache files are named <map file>.<digest>.<suffix>, where digest is a hash of the contents of
+the map and cost files, and live next to the map or in a given cache directory. A change to
+either file changes the digest, so a stale cache is simply never found.
+
+Binary caches share one layout: an 8-byte magic string, a 4-byte little-endian length, a
+marshalled metadata dict (which always holds the digest) and, at an 8-byte aligned offset, a
+raw payload. Payloads are read through a private (copy-on-write) mmap, so processes loading the
+same cache share its pages until they modify them.
+"""
+
+import ctypes
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+
+GRID_MAGIC = "P4GRID\x01\n"    # terrain codes, column-major, one byte per cell
+LANDMARK_MAGIC = "P4ALT\x01\n\0"  # landmark distance tables, float32 per cell and table
+JUMP_MAGIC = "P4JPS+\x01\n"   # JPS+ jump distances, int16 per padded cell and direction
+HPA_MAGIC = "P4HPA\x01\n\0"   # HPA* abstraction: entrances and intra-cluster costs, all in the header
+SUBGOAL_MAGIC = "P4SSG\x01\n\0" # subgoal graph: subgoal flags and int16 clearances per padded cell, edges in the header
+CPD_MAGIC = "P4CPD\x01\n\0"   # path database: uint32 target ranks, run offsets per cell, then the runs
+
+
+def fileDigest(*paths):
+    """Returns hex digest of the contents of the given files (None entries are skipped)"""
+    sha = hashlib.sha1()
+    for path in paths:
+        sha.update("\0")
+        if path is not None:
+            with open(path, "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()[:16]
+
+
+def dataDigest(*blobs):
+    """Returns hex digest of the given strings or buffers (e.g. a grid a cached table is derived from)"""
+    sha = hashlib.sha1()
+    for blob in blobs:
+        sha.update("\0")
+        sha.update(blob)
+    return sha.hexdigest()[:16]
+
+
+def extendDigest(digest, *values):
+    """Returns hex digest of digest together with values (e.g. the settings a cached table depends on)"""
+    return hashlib.sha1(digest + repr(values)).hexdigest()[:16]
+
+
+def cachePath(mappath, digest, suffix, cachedir=None):
+    """Returns path of cache file for map mappath. If cachedir is None, it sits next to the map."""
+    if cachedir is None:
+        cachedir = os.path.dirname(mappath)
+    return os.path.join(cachedir, "{}.{}.{}".format(os.path.basename(mappath), digest, suffix))
+
+
+def writeCache(path, magic, meta, payload=""):
+    """Writes a binary cache file. Written under a temporary name and renamed into place,
+    so concurrent readers never see a partial file. Returns False if it cannot be written."""
+    header = marshal.dumps(meta)
+    offset = len(magic) + 4 + len(header)
+    padding = "\0" * (-offset % 8)
+    tmppath = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(tmppath, "wb") as f:
+            f.write(magic)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(padding)
+            f.write(payload)
+        os.rename(tmppath, path)
+    except EnvironmentError:
+        try:
+            os.remove(tmppath)
+        except EnvironmentError:
+            pass
+        return False
+    return True
+
+
+def readCache(path, magic, digest):
+    """
+    Maps a binary cache file written by writeCache(). Returns (meta, view, size) where view is
+    a writable ctypes.c_ubyte array over the size payload bytes, or None if the file is missing,
+    of another format or for another digest.
+    """
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (EnvironmentError, ValueError):  # ValueError: empty file
+        return None
+    try:
+        if mm[:len(magic)] != magic:
+            return None
+        start = len(magic) + 4
+        (length,) = struct.unpack("<I", mm[len(magic):start])
+        meta = marshal.loads(mm[start:start + length])
+        offset = start + length
+        offset += -offset % 8
+        if not isinstance(meta, dict) or meta.get("digest") != digest:
+            return None
+    except (struct.error, EOFError, ValueError, TypeError):
+        return None
+    size = len(mm) - offset
+    return meta, (ctypes.c_ubyte * size).from_buffer(mm, offset), size
@@ -25,15 +25,8 @@ import traceback
 import csv
 import copy
 import logging
-
-if p4.TIMER == "time":
-    from time import time as timer
-
-    logging.info("Using other timer")
-else:
-    from time import clock as timer
-
-    logging.info("Using internal timer")
+import multiprocessing
+import p4_timing
 
 # For speed, rather than if/else statements at runtime, load
 # whichever class is appropriate to os but call them by same alias.
@@ -47,6 +40,11 @@ else:
 from time import sleep
 from p4_model import LogicalMap
 
+BATCH_CHUNK = 4     # problems handed to a batch worker at a time
+# columns of batch results, as returned by SimController.runProblem()
+BATCH_HEADER = ['agent', 'no', 'map', 'startx', 'starty', 'goalx', 'goaly', 'optimum', 'actual', 'steps',
+                'time_taken', 'quality', 'epsilon', 'expansions', 'step_p50', 'step_p95', 'step_p99', 'step_max']
+
 
 class SimController(object):
     """
@@ -64,24 +62,7 @@ class SimController(object):
         :type args: dict[string,object]
         """
         logging.info("Initialising SimController")
-        # set defaults
-        self.lmap = None  # Ref to LogicalMap object
-        self.gui = None  # Ref to Gui object
-        self.agent = None  # Ref to Agent object
-        self.gen = None  # Ref to step generator
-        self.current = None  # current search coordinates
-        self.pathcost, self.pathsteps, self.pathtime = 0, 0, 0
-        self.timeremaining = float('inf')
-        self.timeout = float('inf')
-
-        self.path = set()  # set of all coordinates displayed as part of path
-        self.keptpath = None
-        self.fullsearchflag = False  # set to True if map is populated with extra coords
-        self.coordsets = None  # sets of coordinates that will need to be reset
-
-        self.cfg = args  # Default params as modified via CLI
-        self.gotscript = False
-        self.script = {}  # Allows for dynamic changes
+        self._initState(args)
 
         # we distinguish 3 modes - config file, CLI or batch
         if cfgfile is not None:
@@ -125,6 +106,29 @@ class SimController(object):
         else:
             self.search()
 
+    def _initState(self, args):
+        """Sets defaults, with args as the config"""
+        self.lmap = None  # Ref to LogicalMap object
+        self.gui = None  # Ref to Gui object
+        self.agent = None  # Ref to Agent object
+        self.gen = None  # Ref to step generator
+        self.current = None  # current search coordinates
+        self.pathcost, self.pathsteps, self.pathtime = 0, 0, 0
+        self.timeremaining = float('inf')
+        self.timeout = float('inf')
+        # clock steps are timed by (TIMER: "cpu" time of this process, or monotonic "wall" time)
+        self.timer = p4_timing.getClock(args.get("TIMER") or p4.TIMER)
+        self.latency = p4_timing.LatencyHistogram()  # latency of each call to the agent, of this search
+
+        self.path = set()  # set of all coordinates displayed as part of path
+        self.keptpath = None
+        self.fullsearchflag = False  # set to True if map is populated with extra coords
+        self.coordsets = None  # sets of coordinates that will need to be reset
+
+        self.cfg = args  # Default params as modified via CLI
+        self.gotscript = False
+        self.script = {}  # Allows for dynamic changes
+
     def processMap(self):
         # may throw BadMapException
         try:
@@ -139,7 +143,8 @@ class SimController(object):
             if self.cfg["COST_FILE"] and os.path.exists(self.cfg["COST_FILE"]):
                 costpath = os.path.join(self.cfg["COST_FILE"])
             # create logical map object
-            self.lmap = LogicalMap(mappath, costpath)
+            self.lmap = LogicalMap(mappath, costpath, compact=self.cfg.get("COMPACT"),
+                                   cache=self.cfg.get("MAP_CACHE"))
         except:
             raise p4.BadMapException()
 
@@ -147,11 +152,13 @@ class SimController(object):
         self.cfg["DEADLINE"] = float(self.cfg.get("DEADLINE"))
         self.cfg["FREE_TIME"] = float(self.cfg.get("FREE_TIME"))
         # pass preferences to lmap
+        self.lmap.setCostScale(self.cfg.get("COST_SCALE"))
         self.lmap.setCostModel(self.cfg.get("COST_MODEL"))
         self.lmap.setDiagonal(self.cfg.get("DIAGONAL"))
-        self.lmap.setHeuristic(self.cfg.get("HEURISTIC"))
+        self.lmap.setHeuristic(self.cfg.get("HEURISTIC"), self.cfg.get("LANDMARKS"))
 
         if self.cfg["PREPROCESS"]:
+            self.lmap.preprocessMap()
             try:
                 self.agent.preprocess(self.lmap)
             except AttributeError:
@@ -231,6 +238,7 @@ class SimController(object):
     def resetVars(self):
         """Resets tracked variables based on current self.cfg settings"""
         self.pathcost, self.pathsteps, self.pathtime = 0, 0, 0
+        self.latency = p4_timing.LatencyHistogram()
         self.path.clear()
         self.timeremaining = self.cfg.get("DEADLINE")
         # if a DEADLINE has been set, timeout will occur at 2* that DEADLINE if Agent
@@ -382,12 +390,14 @@ class SimController(object):
                     current = self.lmap.nearestPassable(newpos)
                     yield newpos  # scripted move is not costed or counted
             try:
-                clockstart = timer()  # start timer
+                clockstart = self.timer()  # start timer
                 nextreturn = self.agent.getNext(self.lmap, current, target, self.timeremaining)
+                clockend = self.timer()
                 logging.debug(nextreturn)
-                clockend = timer()
             except:
                 raise p4.BadAgentException()
+            # every step goes in the latency histogram, whether or not it counts towards the time taken
+            self.latency.record(clockend - clockstart)
 
             # Only time first step unless operating in 'realtime' mode. If this is realtime, and the step involved no reasoning (took less than FREE_TIME) do not count its time
             if ((not self.cfg.get("REALTIME") and self.pathtime) or (
@@ -411,8 +421,7 @@ class SimController(object):
 
                 # We now consider every door open. In fact, we are just computing the final path cost, we are not
                 # searching for it. So is reasonable to assume that I have all the keys along the path.
-                allkeys = [k for k in self.lmap.key_and_doors.keys()]
-                cost = self.lmap.getCost(current, previous, allkeys)
+                cost = self.lmap.getCost(current, previous, self.lmap.allkeys)
                 # self.pathcost += self.lmap.getCost(current, previous, allkeys)
                 if not self.lmap.isAdjacent(current, previous):
                     cost = float('inf')
@@ -431,7 +440,8 @@ class SimController(object):
     def hdlReset(self, msg="OK"):
         """Button handler. Clears map, resets gui and calls setVars"""
         if self.gotscript:
-            self.lmap = LogicalMap("../maps/" + self.cfg["MAP_FILE"])
+            self.lmap = LogicalMap("../maps/" + self.cfg["MAP_FILE"], compact=self.cfg.get("COMPACT"),
+                                   cache=self.cfg.get("MAP_CACHE"))
             self.gui.setLmap(self.lmap)
             self.gui.vmap.drawMap(self.lmap)
             self.cfg["GOAL"] = self.gc["ORIGIN"]
@@ -462,11 +472,12 @@ class SimController(object):
         self.updateStatus("", False)  # clears statusbar R
 
     def hdlStop(self):
-        """Button handler. Displays totals."""
-        if isinstance((self.pathcost), int):
-            totalcost = str(self.pathcost)
+        """Button handler. Displays totals (in real cost units, in integer cost mode too)."""
+        pathcost = self.lmap.realCost(self.pathcost)
+        if isinstance((pathcost), int):
+            totalcost = str(pathcost)
         else:
-            totalcost = '{0:.4f}'.format(self.pathcost)
+            totalcost = '{0:.4f}'.format(pathcost)
 
         message = "Total Cost : " + totalcost + \
                   " | Total Steps : " + str(self.pathsteps) + \
@@ -526,10 +537,11 @@ class SimController(object):
                 self.gui.vmap.drawPoint(nextstep, "white")
                 self.current = nextstep
                 self.path.add(nextstep)
-                if isinstance((self.pathcost), int):
-                    currcost = str(self.pathcost)
+                pathcost = self.lmap.realCost(self.pathcost)
+                if isinstance((pathcost), int):
+                    currcost = str(pathcost)
                 else:
-                    currcost = '{0:.2f}'.format(self.pathcost)
+                    currcost = '{0:.2f}'.format(pathcost)
                 message = str(nextstep) + " | Cost : " + currcost + \
                           " | Steps : " + str(self.pathsteps)
                 if self.cfg.get("DEADLINE"):
@@ -548,7 +560,8 @@ class SimController(object):
         """
         try:
             self.updateStatus("Loading map...")
-            self.lmap = LogicalMap(mapfile)
+            self.lmap = LogicalMap(mapfile, compact=self.cfg.get("COMPACT"),
+                                   cache=self.cfg.get("MAP_CACHE"))
 
             # pass new LogicalMap references to Gui and MapCanvas (vmap)
             self.gui.setLmap(self.lmap)
@@ -657,68 +670,186 @@ class SimController(object):
 
     def runBatch(self, infile, outfile, reps=1):
         # assumes MAP_FILE, AGENT_FILE set in self.cfg
-        # initialise map and agent
         logging.info("\nRunning batch...")
-        times_taken = []
         reps = int(reps)
-        self.processMap()
-        self.initAgent()
-        self.processPrefs()
-        # open scenario file and read into problems list
-        scenario = open(infile)
-        problems = [line.strip().split() for line in scenario if len(line) > 20]
-        scenario.close
+        jobs = int(self.cfg.get("JOBS") or 1)
+        syncrows = max(int(self.cfg.get("SYNC_ROWS") or 1), 1)
+        # problems are read from the scenario file as they are run, skipping those already in outfile
+        # when resuming
+        done = self._completedRows(outfile) if self.cfg.get("RESUME") else set()
+        agent = os.path.basename(self.cfg["AGENT_FILE"])
+        if agent[-3:] == ".py":
+            agent = agent[:-3]
+        tasks = ((count, problem, reps) for count, problem in readScenario(infile)
+                 if (agent, str(count), os.path.basename(problem[1])) not in done)
 
         # If csv file doesn't exist, create and write header, then close
         if not os.path.isfile(outfile):
             with open(outfile, 'wb') as csvfile:
                 fcsv = csv.writer(csvfile, delimiter=',',
                                   quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                fcsv.writerow(['agent', 'no', 'map', 'startx', 'starty', 'goalx', 'goaly', 'optimum', 'actual', 'steps',
-                               'time_taken', 'quality'])
+                fcsv.writerow(BATCH_HEADER)
+        # optionally, rows also go to a results database (see p4_results), written as the csv file is synced
+        store = None
+        if self.cfg.get("RESULTS_DB"):
+            import p4_results
+            store = p4_results.ResultsStore(self.cfg["RESULTS_DB"])
+            run = store.beginRun(dict(self.cfg, REPS=reps), infile)
         # Open existing csv file, process each problem and append results     
         with open(outfile, 'ab') as csvfile:
             fcsv = csv.writer(csvfile, delimiter=',',
                               quotechar='|', quoting=csv.QUOTE_MINIMAL)
-            count = 0
-            # for each problem
-            for problem in problems:
+            if jobs > 1:
+                rows = self._parallelRows(tasks, jobs)
+            else:
+                # initialise map and agent
+                self.processMap()
+                self.initAgent()
+                self.processPrefs()
+                rows = (self.runProblem(*task) for task in tasks)
+            # rows reach the disk every syncrows rows, so a killed run loses no more than those
+            for count, row in enumerate(rows, 1):
+                fcsv.writerow(row)
+                if store is not None:
+                    store.addRow(run, row)
+                if not count % syncrows:
+                    csvfile.flush()
+                    os.fsync(csvfile.fileno())
+                    if store is not None:
+                        store.flush()
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+        if store is not None:
+            store.endRun(run)
+            store.close()
+
+    def _completedRows(self, outfile):
+        """Returns the (agent, no, map) of the rows of batch results in outfile, if it exists. A last
+        row left incomplete by a killed run is cut off the file, to be run again."""
+        if not os.path.isfile(outfile):
+            return set()
+        with open(outfile, 'rb+') as csvfile:
+            data = csvfile.read()
+            end = data.rfind('\n') + 1
+            if end < len(data):
+                csvfile.truncate(end)
+        rows = csv.reader(data[:end].splitlines(), delimiter=',', quotechar='|')
+        done = set((row[0], row[1], row[2]) for row in rows if len(row) >= 12 and not row[0] == 'agent')
+        logging.info("Resuming batch: {} problems already in {}".format(len(done), outfile))
+        return done
+
+    def _parallelRows(self, tasks, jobs):
+        """Generator. Runs the batch tasks over a pool of jobs worker processes, each loading map and
+        agent once (see BatchWorker), and yields their rows in the order of tasks."""
+        logging.info("Running batch on {} worker processes".format(jobs))
+        if self.timer == p4_timing.wallClock:
+            logging.warning("Steps timed by wall clock: workers running side by side slow each other's steps")
+        pool = multiprocessing.Pool(jobs, _initBatchWorker, (self.cfg,))
+        try:
+            for row in pool.imap(_runBatchTask, tasks, BATCH_CHUNK):
+                yield row
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def runProblem(self, count, problem, reps):
+        """Runs problem (the fields of a .scen line) reps times on the loaded map and agent, and returns
+        its row of batch results, count being its number in the scenario."""
+        skip, mappath, size1, size2, scol, srow, gcol, grow, optimum = problem
+        logging.info(
+            "========> Running problem {}: from ({},{}) to ({},{}) - Optimal: {}".format(count, scol, srow,
+                                                                                            gcol, grow,
+                                                                                            optimum))
+        pathname, map = os.path.split(mappath)
+        self.cfg["START"] = (int(scol), int(srow))
+        self.cfg["GOAL"] = (int(gcol), int(grow))
+
+        times_taken = []
+        steps_taken = []
+        costs_taken = []
+        epsilon = ""    # suboptimality bound reached, for agents reporting one (e.g. agent_ara)
+        expansions = ""  # cells expanded by the last search, for agents searching with p4_search
+        latency = p4_timing.LatencyHistogram()  # latency of the steps of all runs
+        # no search needed if start and goal are in different components: the measured columns are left
+        # empty, so the row is told from a failed search (cost 0) and left out of averages
+        if not self.lmap.isReachable(self.cfg["START"], self.cfg["GOAL"]):
+            logging.info("Goal not reachable from start: problem skipped")
+            return [self.cfg["AGENT_FILE"], count, map, str(scol), srow, gcol, grow, optimum] + \
+                [""] * (len(BATCH_HEADER) - 8)
+        # run the number of repetitions specified (on the same problem)
+        for i in xrange(reps):
+            try:
+                self.agent.reset()
+                self.resetVars()
+                total_cost, total_steps, time_left, time_taken = self.search()
+                times_taken.append(float(time_taken))
+                latency.merge(self.latency)
+                steps_taken.append(total_steps)
+                costs_taken.append(float(total_cost))
+                if getattr(self.agent, "epsilon", None) is not None:
+                    epsilon = round(self.agent.epsilon, 3)
+                if getattr(self.agent, "search", None) is not None:
+                    # both halves of a bidirectional search (agent_bidir)
+                    backward = getattr(self.agent, "backward", None)
+                    expansions = self.agent.search.expanded + (backward.expanded if backward is not None else 0)
+            except SystemExit:
+                # search() failed (e.g. the agent raised an exception, logged by it): count it as no path
+                logging.warning("Problem {} failed".format(count))
+
+        time_taken = round(sum(times_taken) / reps, 5)  # calculate average
+        total_steps = sum(steps_taken) / reps  # calculate average
+        total_cost = sum(costs_taken) / reps  # calculate average -  precision to compare with movingai costs
+
+        try:
+            quality = round(float(optimum) / float(total_cost), 2)
+        except ZeroDivisionError:
+            quality = 0
+        return [self.cfg["AGENT_FILE"], count, map, str(scol), srow, gcol, grow, optimum, total_cost,
+                total_steps, time_taken, quality, epsilon, expansions] + \
+               [round(latency.percentile(p), 7) for p in (50, 95, 99)] + [round(latency.max, 7)]
+
+
+def readScenario(path):
+    """Generator. Yields (number, fields) for each problem line of the .scen file at path, numbered from 1"""
+    with open(path) as scenario:
+        count = 0
+        for line in scenario:
+            if len(line) > 20:
                 count += 1
-                skip, mappath, size1, size2, scol, srow, gcol, grow, optimum = problem
-                logging.info(
-                    "========> Running problem {}: from ({},{}) to ({},{}) - Optimal: {}".format(count, scol, srow,
-                                                                                                    gcol, grow,
-                                                                                                    optimum))
-                pathname, map = os.path.split(mappath)
-                self.cfg["START"] = (int(scol), int(srow))
-                self.cfg["GOAL"] = (int(gcol), int(grow))
-
-                times_taken = []
-                steps_taken = []
-                costs_taken = []
-                # run the number of repetitions specified (on the same problem)
-                for i in xrange(reps):
-                    try:
-                        self.agent.reset()
-                        self.resetVars()
-                        total_cost, total_steps, time_left, time_taken = self.search()
-                        times_taken.append(float(time_taken))
-                        steps_taken.append(total_steps)
-                        costs_taken.append(float(total_cost))
-                    except:
-                        pass
+                yield count, line.strip().split()
+
+
+class BatchWorker(SimController):
+    """
+    SimController of a batch worker process (see SimController.runBatch()): loads map and agent
+    once, then runs the problems it is handed with runProblem(). If lmap is given, the map is not
+    loaded but shared (see p4_matrix): settings are then applied again with processPrefs() before
+    each run of problems.
+    """
+
+    def __init__(self, args, lmap=None):
+        self._initState(args)
+        if lmap is None:
+            self.processMap()
+        else:
+            self.lmap = lmap
+        self.initAgent()
+        self.processPrefs()
+
+
+_worker = None      # BatchWorker of this process, in batch worker processes
+
+
+def _initBatchWorker(args):
+    """Pool initializer: sets up the BatchWorker of this process"""
+    global _worker
+    _worker = BatchWorker(dict(args, BATCH=None))
+
 
-                time_taken = round(sum(times_taken) / reps, 5)  # calculate average
-                total_steps = sum(steps_taken) / reps  # calculate average
-                total_cost = sum(costs_taken) / reps  # calculate average -  precision to compare with movingai costs
-
-                try:
-                    quality = round(float(optimum) / float(total_cost), 2)
-                except ZeroDivisionError:
-                    quality = 0
-                fcsv.writerow(
-                    [self.cfg["AGENT_FILE"], count, map, str(scol), srow, gcol, grow, optimum, total_cost,
-                     total_steps, time_taken, quality])
+def _runBatchTask(task):
+    """Runs a batch task, (count, problem, reps), in a worker process and returns its row"""
+    return _worker.runProblem(*task)
 
 
 if __name__ == '__main__':
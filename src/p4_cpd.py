@@ -0,0 +1,260 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compressed path databases (Botea, 2011): for every cell of a map, the first move of a cheapest
+path from it to every other cell, so that the next step towards a goal is a lookup, not a search.
+
+Targets are ranked in depth-first order of the map, so that nearby targets, which mostly share
+a first move, are next to each other; the first moves from each source are then stored as runs
+over the ranks, each a uint32 (first rank << 3 | direction, an index into p4_utils.DIRECTIONS).
+Targets not reachable from the source extend the run before them. A lookup is a binary search
+among the runs of the source.
+
+Building takes a Dijkstra search from every cell, spread over a process pool. Databases are
+kept in binary .p4cpd caches (see p4_cache), keyed by the terrain classes and move costs of the
+map, and are read through mmap, so all processes using one share a single copy. The simulator
+reads and writes them only with a map cache (-mc); run from src/ to build them ahead of time, e.g.
+
+    python p4_cpd.py ../maps/den001d.map -j 4
+"""
+
+import argparse
+import ctypes
+import multiprocessing
+from array import array
+from bisect import bisect_right
+from heapq import heappush, heappop
+from time import time as timer
+
+import p4_cache
+import p4_utils as p4
+from p4_model import LogicalMap
+
+INF = float('inf')
+NOMOVE = 255        # first move to targets not reachable from the source, in build workers
+CHUNK = 32          # sources per task sent to build workers
+
+_graph = None       # in build workers: moves out of each cell, as ((neighbour, cost, direction), ...)
+_order = None       # in build workers: cells in order of rank
+
+
+class PathDatabase(object):
+    """
+    First moves between all cells of a map, as built by buildDatabase(). rank, offsets and runs are
+    sequences of ints (arrays, or ctypes arrays over a mapped cache file): rank of each target cell,
+    first of the runs of each source cell (offsets[cell + 1] is one past its last), and the runs.
+    """
+
+    def __init__(self, height, rank, offsets, runs):
+        self.height = height
+        self.rank = rank
+        self.offsets = offsets
+        self.runs = runs
+
+    def firstMove(self, source, target):
+        """ Returns the direction (index into p4_utils.DIRECTIONS) of the first move from cell source
+            towards cell target, or -1 if there is no move out of source """
+        lo, hi = self.offsets[source], self.offsets[source + 1]
+        if lo == hi:
+            return -1
+        return self.runs[bisect_right(self.runs, self.rank[target] << 3 | 7, lo, hi) - 1] & 7
+
+    def nextStep(self, current, goal):
+        """ Returns the coordinates of the first step from current towards goal, or None """
+        h = self.height
+        d = self.firstMove(current[0] * h + current[1], goal[0] * h + goal[1])
+        if d < 0:
+            return None
+        dx, dy = p4.DIRECTIONS[d]
+        return current[0] + dx, current[1] + dy
+
+    def size(self):
+        """ Returns the number of bytes of the tables """
+        return 4 * (len(self.rank) + len(self.offsets) + len(self.runs))
+
+
+def databaseDigest(mapref):
+    """ Returns the digest of the terrain classes and move costs of mapref the database depends on """
+    classes, costs = mapref.getCellClasses()
+    return p4_cache.extendDigest(p4_cache.dataDigest(classes), mapref.width, mapref.height, costs)
+
+
+def _moveGraph(mapref):
+    """ Returns the legal moves out of each cell of mapref, as ((neighbour, cost, direction), ...) """
+    h = mapref.height
+    graph = []
+    for cell in xrange(mapref.width * h):
+        col, row = divmod(cell, h)
+        graph.append(tuple((j, cost, p4.DIRECTION_INDEX[j // h - col, j % h - row])
+                           for j, cost in mapref.getCellSuccessors(cell)))
+    return graph
+
+
+def _targetOrder(graph):
+    """ Returns the cells in depth-first order over graph (cells without moves last) """
+    seen = bytearray(len(graph))
+    order = []
+    for root in xrange(len(graph)):
+        if seen[root] or not graph[root]:
+            continue
+        stack = [root]
+        while stack:
+            i = stack.pop()
+            if seen[i]:
+                continue
+            seen[i] = 1
+            order.append(i)
+            stack.extend(j for j, cost, d in reversed(graph[i]) if not seen[j])
+    order.extend(i for i in xrange(len(graph)) if not seen[i])
+    return order
+
+
+def _initWorker(graph, order):
+    """ Sets up a build worker """
+    global _graph, _order
+    _graph, _order = graph, order
+
+
+def _sourceRuns(source):
+    """ Dijkstra from cell source: returns the runs of first moves from source, as a string of uint32 """
+    graph = _graph
+    dist = [INF] * len(graph)
+    first = bytearray([NOMOVE]) * len(graph)
+    dist[source] = 0
+    heap = []
+    for j, cost, d in graph[source]:
+        if cost < dist[j]:
+            dist[j] = cost
+            first[j] = d
+            heappush(heap, (cost, j))
+    while heap:
+        di, i = heappop(heap)
+        if di > dist[i]:
+            continue
+        move = first[i]
+        for j, cost, d in graph[i]:
+            if di + cost < dist[j]:
+                dist[j] = di + cost
+                first[j] = move
+                heappush(heap, (di + cost, j))
+    runs = array('I')
+    last = NOMOVE
+    for rank, target in enumerate(_order):
+        move = first[target]
+        if not move == NOMOVE and not move == last:
+            runs.append(rank << 3 | move)
+            last = move
+    if runs:
+        runs[0] &= 7    # the first run starts at rank 0
+    return runs.tostring()
+
+
+def _sourceBatch(sources):
+    """ Returns the runs of each of sources (see _sourceRuns()) """
+    return [_sourceRuns(source) for source in sources]
+
+
+def buildDatabase(mapref, jobs=None):
+    """
+    Computes the path database of mapref, under its current cost model and DIAGONAL setting, with
+    jobs worker processes (default: one per CPU; 1 builds in this process). Moves are those of
+    getCellSuccessors() with no keys. Returns a PathDatabase over arrays.
+    """
+    graph = _moveGraph(mapref)
+    order = _targetOrder(graph)
+    rank = array('I', [0]) * len(graph)
+    for k, cell in enumerate(order):
+        rank[cell] = k
+    sources = [cell for cell in xrange(len(graph)) if graph[cell]]
+    batches = [sources[k:k + CHUNK] for k in xrange(0, len(sources), CHUNK)]
+    pool = None
+    if jobs == 1:
+        _initWorker(graph, order)
+        results = (_sourceBatch(batch) for batch in batches)
+    else:
+        pool = multiprocessing.Pool(jobs, _initWorker, (graph, order))
+        results = pool.imap(_sourceBatch, batches)
+    offsets = array('I', [0]) * (len(graph) + 1)
+    runs = array('I')
+    try:
+        perSource = (run for batch in results for run in batch)
+        for cell in xrange(len(graph)):
+            if graph[cell]:
+                runs.fromstring(next(perSource))
+            offsets[cell + 1] = len(runs)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _initWorker(None, None)
+    return PathDatabase(mapref.height, rank, offsets, runs)
+
+
+def loadDatabase(mapref, jobs=None):
+    """
+    Returns the path database of mapref: mapped from its .p4cpd cache if there is a current one,
+    otherwise built (see buildDatabase()) and, if mapref has a map file and the map cache is on
+    (LogicalMap cache, -mc), written to the cache.
+    """
+    digest = databaseDigest(mapref)
+    cells = mapref.width * mapref.height
+    cachefile = None
+    if mapref.cache and mapref.mappath is not None:
+        cachefile = p4_cache.cachePath(mapref.mappath, digest, "p4cpd", mapref.cachedir)
+        cached = p4_cache.readCache(cachefile, p4_cache.CPD_MAGIC, digest)
+        if cached is not None and cached[2] == 4 * (2 * cells + 1 + cached[0]["runs"]):
+            meta, view, size = cached
+            rank = (ctypes.c_uint32 * cells).from_buffer(view)
+            offsets = (ctypes.c_uint32 * (cells + 1)).from_buffer(view, 4 * cells)
+            runs = (ctypes.c_uint32 * meta["runs"]).from_buffer(view, 4 * (2 * cells + 1))
+            return PathDatabase(mapref.height, rank, offsets, runs)
+    database = buildDatabase(mapref, jobs)
+    if cachefile is not None:
+        p4_cache.writeCache(cachefile, p4_cache.CPD_MAGIC, {"digest": digest, "runs": len(database.runs)},
+                            database.rank.tostring() + database.offsets.tostring() + database.runs.tostring())
+    return database
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Builds compressed path databases of maps")
+    parser.add_argument("MAPS", nargs='+', help="map files to build databases of")
+    parser.add_argument('-c', '--cost-file', dest='COST_FILE', help="file with cost of cells")
+    parser.add_argument('-cm', '--cost', dest='COST_MODEL', default="mixed",
+                        choices=("mixed", "mixed_real", "mixed_opt1", "mixed_opt2"),
+                        help="cost model to use (default: %(default)s).")
+    parser.add_argument('-cs', '--cost-scale', dest='COST_SCALE', type=int, default=0,
+                        help="integer costs: scale costs by this and round (default: %(default)s, float costs).")
+    parser.add_argument('-nd', '--no-diagonals', action='store_false', dest='DIAGONAL', default=True,
+                        help="only straight moves.")
+    parser.add_argument('-mc', '--map-cache', dest='MAP_CACHE',
+                        help="directory to keep databases (and .p4grid map caches) in (default: next to each map).")
+    parser.add_argument('-j', '--jobs', dest='JOBS', type=int,
+                        help="worker processes (default: one per CPU).")
+    args = parser.parse_args()
+    for mappath in args.MAPS:
+        lmap = LogicalMap(mappath, args.COST_FILE, cache=args.MAP_CACHE or True)
+        lmap.setCostScale(args.COST_SCALE)
+        lmap.setCostModel(args.COST_MODEL)
+        lmap.setDiagonal(args.DIAGONAL)
+        start = timer()
+        database = loadDatabase(lmap, args.JOBS)
+        sources = sum(1 for cell in xrange(lmap.width * lmap.height)
+                      if database.offsets[cell + 1] > database.offsets[cell])
+        print("{}: {:.1f}s  {:,d} sources  {:,d} runs ({:.1f} per source)  {:,d} bytes".format(
+            mappath, timer() - start, sources, len(database.runs), float(len(database.runs)) / max(sources, 1),
+            database.size()))
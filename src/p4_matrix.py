@@ -0,0 +1,210 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark matrix: runs every scenario with every agent, cost model, cost file and heuristic listed
+in a manifest, and writes the rows of all of them (as in batch mode, see SimController.runBatch())
+to one table. Run from src/, e.g.
+
+    python p4_matrix.py matrix.py ../results/matrix.csv -j 4
+
+The manifest is a python file setting lists (only SCENARIOS and AGENTS are needed), e.g.
+
+    SCENARIOS = ["../maps/dao/arena.map.scen", "../maps/dao/den001d.map.scen"]
+    AGENTS = ["agent_astar.py", "agent_jps.py"]
+    COST_MODELS = ["mixed", "mixed_opt1"]
+    COST_FILES = [None, "../costs/G1-W5-S10.cost"]
+    HEURISTICS = ["octile", "euclid"]
+
+and, optionally, any setting of p4.py by its name (e.g. PREPROCESS = True, DEADLINE = 5, REPS = 3).
+Problems of each cell (one combination) are handed in runs of CHUNK to a pool of worker processes.
+Each worker parses each map (with its cost file) once, keeping the MAPS_KEPT it used last, and keeps
+one controller, with its agent, per agent and map, so maps and agent preprocessing are shared by
+all the cells that can share them. With -db, each cell is also recorded as a run in a results database
+(see p4_results).
+"""
+
+import argparse
+import csv
+import itertools
+import logging
+import multiprocessing
+import os
+import re
+from collections import OrderedDict
+
+import p4_controller
+import p4_results
+
+CHUNK = 16          # problems of a cell handed to a worker at a time
+MAPS_KEPT = 4       # parsed maps kept by each worker, least recently used dropped first
+SYNC_ROWS = 100     # rows between syncs of the table to disk
+
+# settings of the controller (see p4.py), which the manifest may override
+DEFAULTS = {"DEADLINE": 0, "FREE_TIME": 0, "REALTIME": False, "DYNAMIC": False, "STRICT": True,
+            "PREPROCESS": False, "COMPACT": False, "MAP_CACHE": False, "COST_SCALE": 0, "DIAGONAL": True,
+            "LANDMARKS": 16, "GUI": False, "BATCH": None, "SPEED": 0, "REPS": 1, "TIMER": "cpu",
+            "COST_MODELS": ["mixed"], "COST_FILES": [None], "HEURISTICS": ["octile"]}
+# settings applied again (see SimController.processPrefs()) whenever a controller runs another cell
+CELL_KEYS = ("COST_MODEL", "HEURISTIC")
+
+HEADER = ['scenario', 'cost_model', 'cost_file', 'heuristic'] + p4_controller.BATCH_HEADER
+
+_maps = OrderedDict()   # in workers: (map, cost file): LogicalMap, least recently used first
+_controllers = {}       # in workers: (map, cost file, agent): BatchWorker
+_applied = {}           # in workers: (map, cost file): settings its LogicalMap was last given
+
+
+def readManifest(path):
+    """Returns the settings of the manifest at path, over DEFAULTS"""
+    manifest = dict(DEFAULTS)
+    execfile(path, manifest)
+    for key in ("SCENARIOS", "AGENTS"):
+        if not manifest.get(key):
+            raise ValueError("manifest {} lists no {}".format(path, key))
+    if manifest["DYNAMIC"]:
+        raise ValueError("DYNAMIC is not supported: maps are shared between cells")
+    return manifest
+
+
+def matrixCells(manifest):
+    """Returns the cells of the matrix, as (labels, cfg) with labels the first columns of their rows,
+    ordered so that cells sharing a map (and then a cost model) are next to each other"""
+    settings = dict((key, value) for key, value in manifest.iteritems() if key.isupper())
+    cells = []
+    for scen, costfile, model, heuristic, agent in itertools.product(
+            manifest["SCENARIOS"], manifest["COST_FILES"], manifest["COST_MODELS"], manifest["HEURISTICS"],
+            manifest["AGENTS"]):
+        match = re.match(r'(.*\.map).*', scen)
+        cfg = dict(settings, MAP_FILE=match.group(1) if match else '', COST_FILE=costfile, AGENT_FILE=agent,
+                   COST_MODEL=model.replace("-", "_"), HEURISTIC=heuristic, JOBS=1)
+        cells.append(((scen, model, costfile or "", heuristic), cfg))
+    return cells
+
+
+def matrixTasks(cells):
+    """Generator. Yields the tasks of cells, each (index of the cell, labels, cfg, problems) with up to
+    CHUNK problems"""
+    for index, (labels, cfg) in enumerate(cells):
+        problems = []
+        for problem in p4_controller.readScenario(labels[0]):
+            problems.append(problem)
+            if len(problems) == CHUNK:
+                yield index, labels, cfg, problems
+                problems = []
+        if problems:
+            yield index, labels, cfg, problems
+
+
+def _controller(cfg):
+    """Returns the controller of this worker for the map, cost file and agent of cfg, set up for cfg"""
+    mapkey = (cfg["MAP_FILE"], cfg["COST_FILE"])
+    key = mapkey + (cfg["AGENT_FILE"],)
+    settings = tuple(cfg[k] for k in CELL_KEYS)
+    lmap = _maps.pop(mapkey, None)
+    worker = _controllers.get(key)
+    if worker is None:
+        worker = p4_controller.BatchWorker(dict(cfg), lmap)
+        _controllers[key] = worker
+        lmap = worker.lmap
+    elif not _applied.get(mapkey) == settings or not worker.settings == settings:
+        # the map was set up for another cell, or the agent preprocessed for other settings
+        worker.cfg.update((k, cfg[k]) for k in CELL_KEYS)
+        worker.processPrefs()
+    worker.settings = _applied[mapkey] = settings
+    _maps[mapkey] = lmap
+    if len(_maps) > MAPS_KEPT:
+        dropped = _maps.popitem(last=False)[0]
+        del _applied[dropped]
+        for other in [other for other in _controllers if other[:2] == dropped]:
+            del _controllers[other]
+    return worker
+
+
+def _runMatrixTask(task):
+    """Runs a task of matrixTasks() and returns (index of its cell, its rows)"""
+    index, labels, cfg, problems = task
+    worker = _controller(cfg)
+    return index, [list(labels) + worker.runProblem(count, problem, cfg["REPS"]) for count, problem in problems]
+
+
+def runMatrix(manifest, outfile, jobs=None, database=None):
+    """Runs the cells of manifest over jobs worker processes (default: one per CPU; 1 runs them in this
+    process) and writes their rows, in the order of the cells, to the csv file outfile and, if given, to
+    the results database at path database"""
+    cells = matrixCells(manifest)
+    store = p4_results.ResultsStore(database) if database else None
+    run = None          # run in store of the cell whose rows are being written
+    current = None      # index of that cell
+    logging.info("Running matrix of {} cells".format(len(cells)))
+    tasks = matrixTasks(cells)
+    pool = None
+    if jobs == 1:
+        results = (_runMatrixTask(task) for task in tasks)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(_runMatrixTask, tasks)
+    try:
+        with open(outfile, 'wb') as csvfile:
+            fcsv = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+            fcsv.writerow(HEADER)
+            count = 0
+            for index, rows in results:
+                if store is not None and not index == current:
+                    if run is not None:
+                        store.endRun(run)
+                    labels, cfg = cells[index]
+                    run, current = store.beginRun(cfg, labels[0]), index
+                for row in rows:
+                    fcsv.writerow(row)
+                    if store is not None:
+                        store.addRow(run, row[len(HEADER) - len(p4_controller.BATCH_HEADER):])
+                    count += 1
+                    if not count % SYNC_ROWS:
+                        csvfile.flush()
+                        os.fsync(csvfile.fileno())
+                        if store is not None:
+                            store.flush()
+        if store is not None:
+            if run is not None:
+                store.endRun(run)
+            store.close()
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs a benchmark matrix of scenarios, agents, cost models, "
+                                                 "cost files and heuristics")
+    parser.add_argument("MANIFEST", help="python file listing SCENARIOS, AGENTS, COST_MODELS, COST_FILES and "
+                                         "HEURISTICS")
+    parser.add_argument("OUTFILE", help="csv file to write the results to")
+    parser.add_argument('-j', '--jobs', dest='JOBS', type=int,
+                        help="worker processes (default: one per CPU).")
+    parser.add_argument('-mc', '--map-cache', dest='MAP_CACHE',
+                        help="directory to keep map caches in (default: as set by the manifest).")
+    parser.add_argument('-db', '--results-db', dest='RESULTS_DB',
+                        help="also record each cell as a run in this SQLite database (see p4_results.py).")
+    args = parser.parse_args()
+    manifest = readManifest(args.MANIFEST)
+    if args.MAP_CACHE:
+        manifest["MAP_CACHE"] = args.MAP_CACHE
+    runMatrix(manifest, args.OUTFILE, args.JOBS, args.RESULTS_DB)
@@ -15,10 +15,31 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
+import re
+from collections import Counter, deque, namedtuple
+from heapq import heappush, heappop
 from math import fabs, sqrt 
+from operator import itemgetter, sub
 from random import randint
-from collections import deque
+from array import array
 import p4_utils as p4
+import p4_cache
+
+JOURNAL_LENGTH = 64     # terrain changes kept in LogicalMap.journal
+
+
+class MapChange(namedtuple("MapChange", "version topleft botright old new")):
+    """
+    One change of terrain, as journalled by LogicalMap (see changesSince()): the version it brought the
+    map to, the top left and bottom right corners of the rectangle enclosing the changed cells, and the
+    terrain of the rectangle before and after, as strings of characters in the order of p4_utils.getBlock().
+    """
+    __slots__ = ()
+
+    def cells(self):
+        """Returns the coordinates of the cells whose terrain changed"""
+        return [each for each, old, new in zip(p4.getBlock(self.topleft, self.botright), self.old, self.new)
+                if not old == new]
 
 
 class LogicalMap(object):
@@ -27,19 +48,30 @@ class LogicalMap(object):
     This version returns float('inf') for non-traversable cells.
     """
 
-    def __init__(self, mappath=None, costpath=None):
+    def __init__(self, mappath=None, costpath=None, compact=False, cache=False):
         """Constructor. Sets default method calls, initialises class attributes,
-           calls _readMap()"""
+           calls _readMap(). If compact is True, terrain is held in a flat bytearray
+           (column-major) instead of a list of lists. If cache is True, or names a
+           directory, the parsed map is kept in a binary .p4grid file (see p4_cache)."""
         self.SQRT2 = p4.SQRT2
         self.SQRT05 = sqrt(.5)
         self.OCT_CONST = self.SQRT2 - 1
+        # integer cost mode (see setCostScale()): costs are multiplied by costscale and rounded,
+        # with diagonals from the exact sqrt(2); 0 for float costs
+        self.costscale = 0
         DEFAULT_HEIGHT = 512
         DEFAULT_WIDTH = 512
         self.uniform = True
-        
-        self.cellWithinBoundaries = self.isMapped  # for backward compatibility
+        self.compact = compact
+        self.matrix = None      # list of columns of terrain characters (default storage)
+        self.grid = None        # flat bytearray of terrain codes, index col * height + row (compact storage)
+        self.mappath = mappath
+        self.costpath = costpath
+        self.cache = bool(cache)
+        self.cachedir = cache if isinstance(cache, basestring) else None
+        self.digest = None      # hash of map and cost files, set when caching
 
-        self.neighbours = []
+        self.cellWithinBoundaries = self.isMapped  # for backward compatibility
 
         # terrain types and default costs as per http://movingai.com/benchmarks/formats.html
         # water is untraversable in general, unless coming from water itself (see below)
@@ -48,24 +80,62 @@ class LogicalMap(object):
                       
         # dictionary to hold precalculated costs for straight and diagonal moves between terrain types
         self.mixedmatrix = {}
-        
-        self.neighbourDic = {}
+
+        # successor table, built lazily by _buildMoves() and dropped whenever the cost model,
+        # diagonal setting or terrain costs change (see getSuccessors(), getCost())
+        self.diagonal = True
+        self.moves = None
+        # reverse of the successor table, built by getCellPredecessors(): revmoves[i] has bit d set iff
+        # the neighbour of cell i along p4.DIRECTIONS[d] has a legal move into i
+        self.revmoves = None
+        # cost-boundary table, built by preprocessMap(): diffmask[i] has bit d set iff the neighbour of
+        # cell i along p4.DIRECTIONS[d] (one of 4 or 8, as per DIAGONAL) is on the map and costs differently
+        self.diffmask = None
+        # connected components of passable cells, built by _buildComponents() for isReachable():
+        # components[i] is the label of cell i (0 if impassable); changed cells wait in _compdirty
+        self.components = None
+        self._compdirty = set()
+        # nearest passable cell of each impassable one, built by _buildNearest() for nearestPassable():
+        # indices are over the map padded by a ring of off-map cells (see _padBytes()); changed cells
+        # wait in _neardirty
+        self.nearest = None
+        self._neardirty = set()
+        # landmark (ALT) heuristic table, built by _buildLandmarks() when HEURISTIC is 'landmark':
+        # exact costs from each of landmarkcount landmarks to every cell (and back, unless all moves
+        # cost the same both ways), as float32. Not persisted once the terrain is edited. Edits that
+        # only raise costs leave its bounds admissible; after others it is stale (_altstale), and
+        # getH() falls back to octile until setHeuristic() rebuilds it.
+        self.landmarkcount = 16
+        self.landmarks = None
+        self._altstale = False
+        self._edited = False
+        # terrain changes: version counts them, journal keeps the latest as MapChange entries (see
+        # changesSince()), and listeners are called with each (see addListener())
+        self.version = 0
+        self.journal = deque(maxlen=JOURNAL_LENGTH)
+        self.listeners = []
 
         # Each key is store in the map as (key_location) : [ d1, d2, ... ] where d1, d2, ... are the location of
         # the door.
         self.key_and_doors = {}
+        # Reverse index built from key_and_doors by _indexDoors(): each key gets a bit, so a set of keys
+        # is an int mask; doors maps each door location to the mask of keys that open it. Both are
+        # empty on maps without keys, which lets door checks be skipped altogether.
+        self.keybits = {}
+        self.doors = {}
+        self.allkeys = 0
+        self._neardoor = set()
 
         if mappath is not None:
             # print("Opening " + mappath)
             self._readMap(mappath, costpath)
             # if readMap fails, SystemExit reports to command line and quits
-            if self.matrix is None:
+            if self.matrix is None and self.grid is None:
                 print("Failed to load file!\n")
                 raise SystemExit
         else:
             # if mappath == None, readMap not attempted and default-sized matrix is all set to '.'
-            self.matrix = [["." for col in range(DEFAULT_WIDTH)]
-                           for row in range(DEFAULT_HEIGHT)]
+            self._storeTerrain(["." * DEFAULT_HEIGHT for col in range(DEFAULT_WIDTH)])
             self.info = {"height": DEFAULT_HEIGHT, "width": DEFAULT_WIDTH}
             self.costs["."] = 1
             self.mixedmatrix[".",".",True] = self.SQRT2
@@ -75,6 +145,7 @@ class LogicalMap(object):
         # n.b. these settings only retained when p4_model is called from free-standing scripts,
         # that is, outside p4_controller.
         self.getH = self._octile
+        self.heuristic = "octile"
         self.setCostModel()
         self.setDiagonal()
             
@@ -102,27 +173,114 @@ class LogicalMap(object):
         return False
 
     def hasDiffAdj(self, coord):
-        """ precondition: must have run preprocessMap. Returns result by direct query
-        to neighbours"""
-        return self.neighbours[coord[0]][coord[1]]
+        """ Same as _hasDiffAdj(), by direct query to diffmask (runs preprocessMap if needed)"""
+        if self.diffmask is None:
+            self.preprocessMap()
+        return self.diffmask[coord[0] * self._height + coord[1]] > 0
 
     def getDiffAdjs(self, coord):
-        """  precondition: must have run preprocessMap. Returns result by direct query
-        to neighbourDic"""
-        return filter(self.isPassable, self.neighbourDic[coord])
+        """ Passable adjacents with different cost from coord, by direct query to diffmask
+        (runs preprocessMap if needed)"""
+        if self.diffmask is None:
+            self.preprocessMap()
+        (col, row) = coord
+        return [(col + dx, row + dy)
+                for dx, dy, diag, offset in self._maskmoves[self.diffmask[col * self._height + row]]
+                if self.isPassable((col + dx, row + dy))]
+
+    def getCostBoundary(self):
+        """ Returns the cells with an adjacent of different cost, i.e. those for which
+        hasDiffAdj() is True (runs preprocessMap if needed)"""
+        if self.diffmask is None:
+            self.preprocessMap()
+        h = self._height
+        return [divmod(i, h) for i, mask in enumerate(self.diffmask) if mask]
 
-    def setHeuristic(self, h="octile"):
-        """Explicitly set method used when getH() is called."""
+    def preprocessMap(self):
+        """
+        Builds the tables the model otherwise builds on first use: the successor table (see
+        _buildMoves()), the connected components used by isReachable() and the cost-boundary
+        table diffmask used by hasDiffAdj(), getDiffAdjs() and getCostBoundary(). All are kept
+        up to date by setCell()/setPoints().
+        """
+        if self.moves is None:
+            self._buildMoves()
+        if self.components is None:
+            self._buildComponents()
+        h = self._height
+        inf = float('inf')
+        # cost class per terrain class: one per distinct cost, 15 for the padding ring (off-map)
+        costvalues = sorted(set(self.costs.values()) | set([inf]))
+        self._costclass = [costvalues.index(self.costs[c] if c else inf) for c in self._classchars]
+        classes = str(self._tclass).translate(
+            "".join(chr(self._costclass[b] if b < len(self._costclass) else 15) for b in xrange(256)))
+        differ = ["".join(chr(a != b and a != 15 and b != 15) for a in xrange(16) for b in xrange(16))] * 2
+        directions = [d for d in xrange(8) if self.diagonal or not d & 1]
+        padded = self._padBytes(classes, "\x0f")
+        self.diffmask = bytearray(self._unpadBytes(
+            p4.intToBytes(self._directionMask(padded, differ, directions), len(padded))))
+
+    def _cellDiffs(self, col, row):
+        """Internal. Recomputes diffmask[] for the single cell (col, row), as preprocessMap() does"""
+        h = self._height
+        costclass = self._costclass
+        tclass = self._tclass
+        i = col * h + row
+        mask = 0
+        for d, (dx, dy) in enumerate(p4.DIRECTIONS):
+            if d & 1 and not self.diagonal:
+                continue
+            if 0 <= col + dx < self._width and 0 <= row + dy < h and \
+                    not costclass[tclass[i]] == costclass[tclass[i + dx * h + dy]]:
+                mask |= 1 << d
+        self.diffmask[i] = mask
+
+    def setHeuristic(self, h="octile", landmarks=None):
+        """Explicitly set method used when getH() is called. For 'landmark', landmarks is the
+        number of landmarks to use; their tables are built (or loaded from disk) here, so call
+        after setCostModel() and setDiagonal(). In integer cost mode, the heuristic returns ints."""
+        self.heuristic = h if h in ("euclid", "octile", "landmark") else "manhattan"
+        scaled = bool(self.costscale)
         if h == "euclid":  
-            self.getH = self._euclid
+            self.getH = self._euclidInt if scaled else self._euclid
         elif h == "octile":
-            self.getH = self._octile
+            self.getH = self._octileInt if scaled else self._octile
+        elif h == "landmark":
+            if landmarks and not int(landmarks) == self.landmarkcount:
+                self.landmarkcount = int(landmarks)
+                self.landmarks = None
+            self.getH = self._landmarkInt if scaled else self._landmark
+            if self.landmarks is None or self._altstale:
+                self._buildLandmarks()
         else:
-            self.getH = self._manhattan
+            self.getH = self._manhattanInt if scaled else self._manhattan
+
+    def setCostScale(self, scale=0):
+        """
+        Sets integer cost mode if scale is a positive int: move costs become ints, scale per unit of
+        cost, rounded (straight 1000 and diagonal 1414 for scale 1000, with diagonals from the exact
+        sqrt(2) rather than p4_utils.SQRT2), as do heuristic values, rounded down, so g and f are
+        ints throughout a search. Costs from getCost(), validator() and searches are then in these
+        units: realCost() converts them back. 0 or None returns to float costs.
+        Rebuilds the costs of the current cost model and heuristic.
+        """
+        self.costscale = int(scale or 0)
+        self.setCostModel(self.costmodel)
+        self.setHeuristic(self.heuristic)
+
+    def realCost(self, cost):
+        """Returns cost (from getCost(), validator() or a search) in real units: divided by the
+        cost scale in integer cost mode (see setCostScale()), as is otherwise"""
+        if self.costscale:
+            return cost / float(self.costscale)
+        return cost
             
     def setCostModel(self, cm="mixed"):
         """Sets straight and diagonal multipliers based on whichever cost model is in use.
-        Builds mixedmatrix to check costs from terrain type to terrain type based on cost model. """
+        Builds mixedmatrix to check costs from terrain type to terrain type based on cost model.
+        In integer cost mode (see setCostScale()), the costs are scaled and rounded to ints. """
+        self.costmodel = cm if cm in ("mixed_real", "mixed_opt1", "mixed_opt2") else "mixed"
+        sqrt2 = sqrt(2) if self.costscale else self.SQRT2
         if cm == "mixed_real":
             for x in self.costs:
                 for y in self.costs:
@@ -132,7 +290,7 @@ class LogicalMap(object):
                         self.mixedmatrix[x, y, False] = float('inf')  
                     else:
                         # diagonal moves
-                        self.mixedmatrix[x, y, True] = (self.costs[y] + self.costs[x])/2 * self.SQRT2
+                        self.mixedmatrix[x, y, True] = (self.costs[y] + self.costs[x])/2 * sqrt2
                         # straight moves
                         self.mixedmatrix[x, y, False] = (self.costs[y] + self.costs[x])/2
         else:
@@ -145,7 +303,7 @@ class LogicalMap(object):
             else:
                 # default: "mixed"
                 self.straightmulti = 1
-                self.diagmulti = self.SQRT2
+                self.diagmulti = sqrt2
             for x in self.costs:
                 for y in self.costs:
                     # diagonal moves
@@ -161,16 +319,28 @@ class LogicalMap(object):
                         self.mixedmatrix[x, y, True] = self.costs[y] * self.diagmulti
                         # straight moves
                         self.mixedmatrix[x, y, False] = self.costs[y] * self.straightmulti
+        if self.costscale:
+            scale = self.costscale
+            for k, cost in self.mixedmatrix.iteritems():
+                if cost < float('inf'):
+                    self.mixedmatrix[k] = int(round(cost * scale))
+            # integer octile: scale per straight step, and the extra of a diagonal step
+            self._octstraight = scale
+            self._octextra = int(round(scale * sqrt2)) - scale
+        self._dropTables()
 
     def setCostCells(self, costCells={}):
         """Sets the cost of cells as per costCells- if missing, leave existing cost """
         for terrain in (set(costCells.keys()).intersection(self.terrains.keys())):
             abbrev = self.terrains[terrain]
             self.costs[abbrev] = costCells[terrain]
+        self._dropTables()
 
     def setDiagonal(self, d = True):
         """Explicitly set methods to be used when getAdjacents() or isAdjacent() called.
         Modifies mixedmatrix if diagonals set to False. """
+        self.diagonal = bool(d)
+        self._dropTables()
         if d:  # default
             self.getAdjacents = self._getDiagAdjacents
             self.isAdjacent = self._isDiagAdjacent
@@ -182,8 +352,34 @@ class LogicalMap(object):
                 for y in self.costs:
                     self.mixedmatrix[x, y, True] = float('inf')
                     
-    def getCell(self, (col, row)):
-        """Returns character at (col, row) representing type of terrain there. Returns @ (oob) if call fails
+    def _storeTerrain(self, columns):
+        """Internal. Stores terrain given as a sequence of columns (each a sequence of
+        characters, top to bottom) in the matrix or, if compact, in the flat grid.
+        Binds getCell() to the accessor for whichever storage is in use."""
+        width = len(columns)
+        height = len(columns[0]) if columns else 0
+        if self.compact:
+            self._storeGrid(bytearray("".join("".join(col) for col in columns)), width, height)
+        else:
+            self._width, self._height = width, height
+            self.matrix = [list(col) for col in columns]
+            self.grid = None
+            self._columns = None
+            self.getCell = self._getMatrixCell
+
+    def _storeGrid(self, grid, width, height):
+        """Internal. Stores terrain given as a flat, writable byte array of terrain codes
+        (index col * height + row) as the compact grid, and binds getCell() to it."""
+        self._width, self._height = width, height
+        self.matrix = None
+        self.grid = grid
+        # read-only per-column views onto grid: indexing them yields characters without copying
+        self._columns = [buffer(self.grid, col * height, height) for col in xrange(width)]
+        self.getCell = self._getGridCell
+
+    def _getMatrixCell(self, (col, row)):
+        """Internal. Called as getCell() with list storage. Returns character at (col, row)
+        representing type of terrain there. Returns @ (oob) if call fails
         :type col: int
         :type row: int
         """
@@ -191,6 +387,17 @@ class LogicalMap(object):
             return self.matrix[col][row]
         except:
             return '@'
+
+    def _getGridCell(self, (col, row)):
+        """Internal. Called as getCell() with compact storage. Returns character at (col, row)
+        representing type of terrain there. Returns @ (oob) if call fails
+        :type col: int
+        :type row: int
+        """
+        try:
+            return self._columns[col][row]
+        except:
+            return '@'
         
     def isKey(self, position):
         """
@@ -200,8 +407,7 @@ class LogicalMap(object):
         :rtype : bool
         :return:
         """
-        (col, row) = position
-        return (col, row) in self.key_and_doors.keys()
+        return tuple(position) in self.key_and_doors
 
     def isDoor(self, position):
         """
@@ -211,24 +417,43 @@ class LogicalMap(object):
         :type col: int
         :return:
         """
-        (col, row) = position
-        for k in self.key_and_doors:
-            if (col, row) in self.key_and_doors[k]:
-                return True
-        return False
+        return tuple(position) in self.doors
 
     def hasKeyForDoor(self, door, keys):
         """
         :param door: The door coordinate.
-        :param keys: The list of available keys.
+        :param keys: The list of available keys, or their mask as returned by keyMask().
         :return: True iff agent has the key for the door.
         """
-        if keys is None:
-            return False
+        return bool(self.doors.get(door, 0) & self.keyMask(keys))
+
+    def keyMask(self, keys):
+        """
+        Returns the int mask of a collection of key locations (one bit per key of the map).
+        An int is taken to be a mask already and returned as is; None means no keys.
+        :type keys: list of (int,int) or int
+        :rtype : int
+        """
+        if not keys:
+            return 0
+        if isinstance(keys, (int, long)):
+            return keys
+        mask = 0
         for k in keys:
-            if door in self.key_and_doors[k]:
-                return True
-        return False      
+            mask |= self.keybits.get(k, 0)
+        return mask
+
+    def _indexDoors(self):
+        """Internal. Builds keybits, doors, allkeys and _neardoor (the cells whose moves may
+        involve a door, as destination or cut corner) from key_and_doors."""
+        self.keybits = dict((k, 1 << bit) for bit, k in enumerate(sorted(self.key_and_doors)))
+        self.allkeys = (1 << len(self.keybits)) - 1
+        self.doors = {}
+        for k, doorlist in self.key_and_doors.iteritems():
+            for door in doorlist:
+                self.doors[door] = self.doors.get(door, 0) | self.keybits[k]
+        self._neardoor = set((col + dx, row + dy) for (col, row) in self.doors
+                             for dx in (-1, 0, 1) for dy in (-1, 0, 1))
     
     def getCost(self, coord, previous=None, keys=None):
         """
@@ -238,9 +463,22 @@ class LogicalMap(object):
         cost based on terrain type, read from mixed cost dictionary.
         """
 
-        if self.isDoor(coord) and not self.hasKeyForDoor(coord, keys):
+        if self.doors and coord in self.doors and not self.doors[coord] & self.keyMask(keys):
             return float('inf')
 
+        if previous:
+            # adjacent move from a cell on the map: read it from the successor table
+            d = p4.DIRECTION_INDEX.get((coord[0] - previous[0], coord[1] - previous[1]))
+            if d is not None and 0 <= previous[0] < self._width and 0 <= previous[1] < self._height:
+                if self.moves is None:
+                    self._buildMoves()
+                i = previous[0] * self._height + previous[1]
+                if not self.moves[i] >> d & 1:
+                    return float('inf')
+                if d & 1 and previous in self._neardoor and self.cutsCorner(previous, coord, keys):
+                    return float('inf')
+                return self._movecost[d & 1][self._tclass[i]][self._tclass[coord[0] * self._height + coord[1]]]
+
         # get the terrain type for coord
         coord_type = self.getCell(coord)
  
@@ -251,6 +489,8 @@ class LogicalMap(object):
             else:
                 previous_type = self.getCell(previous)
                 return self.getMixedCost(previous_type, coord_type, isDiagonalMove)
+        elif self.costscale and self.costs[coord_type] < float('inf'):
+            return int(round(self.costs[coord_type] * self.costscale))
         else:
             return self.costs[coord_type]
         
@@ -273,7 +513,7 @@ class LogicalMap(object):
         differ from map header. Note characters are reorganised to read back as col,row
         :rtype : int
         """
-        return len(self.matrix[0])
+        return self._height
 
     @property
     def width(self):
@@ -282,7 +522,7 @@ class LogicalMap(object):
         map header. Note characters are reorganised to read back as col,row
         :rtype : int
         """
-        return len(self.matrix)
+        return self._width
 
     @staticmethod
     def isDiag(a, b):
@@ -309,7 +549,7 @@ class LogicalMap(object):
         Returns whether coord cell is traversable by itself or not
         """
         # if there is a door in coord but we don't have the key, then it is not traversable
-        if self.isDoor(coord) and not self.hasKeyForDoor(coord, keys):
+        if self.doors and coord in self.doors and not self.doors[coord] & self.keyMask(keys):
             return False
         else:
             return self.costs[self.getCell(coord)] < float('inf')
@@ -327,25 +567,25 @@ class LogicalMap(object):
             return self.isCellTraversable(coord, keys)
 
     def nearestPassable(self, current=None):
-        """Tests coordinate passed in as current to make sure it's passable. If not,
-           conducts breadth first search to identify nearest passable and returns that.
+        """Tests coordinate passed in as current to make sure it's passable. If not, returns
+           the nearest passable coordinate (in number of king moves, ignoring terrain on the way),
+           read from a lookup built on first use and repaired locally after setCell().
            If no coord passed in, generates one randomly."""
         if not current:
             return self.generateCoord()
         if not self.cellWithinBoundaries(current):
-            current = self.placeOnMap(current);
-        q = deque()  # fastest append/pop
-        L = []  # ordinary list
-        closed = set()  # fastest membership test
-        closed.add(current)
-        while not self.isPassable(current):
-            L = self.getAllAdjacents(current)
-            for adj in L:
-                if adj not in closed and adj not in q:
-                    q.append(adj)
-            current = q.popleft()
-            closed.add(current)
-        return current
+            current = self.placeOnMap(current)
+        if self.isPassable(current):
+            return current
+        if self.nearest is None:
+            self._buildNearest()
+        elif self._neardirty:
+            self._repairNearest()
+        H = self._height + 2
+        i = self.nearest[(current[0] + 1) * H + current[1] + 1]
+        if i < 0:
+            return None  # nothing passable on the map
+        return (i // H - 1, i % H - 1)
 
     def generateCoord(self):
         """Randomly generate new coordinate and return nearest passable."""
@@ -356,11 +596,11 @@ class LogicalMap(object):
     def placeOnMap(self, coord):
         """Return coordinate moved onto map"""
         col, row = coord
-        if col > self.width:
+        if col >= self.width:
             col = self.width - 1
         elif col < 0:
             col = 0
-        if row > self.height:
+        if row >= self.height:
             row = self.height - 1
         elif row < 0:
             row = 0
@@ -379,8 +619,583 @@ class LogicalMap(object):
                 L.append((x, y))
         return L
 
+    def getSuccessors(self, position, keys=None):
+        """
+        Returns the legal moves out of position as a list of (neighbour, cost) pairs: those of
+        getAdjacents() (which returns every neighbour on the map, legal or not) whose
+        getCost(neighbour, position, keys) is finite, but read from the successor table.
+        Preferred by agents in their expansion loop.
+        :type position: (int,int)
+        :rtype : list of ((int,int), float)
+        """
+        if self.moves is None:
+            self._buildMoves()
+        (col, row) = position
+        if not (0 <= col < self._width and 0 <= row < self._height):
+            return []
+        i = col * self._height + row
+        tclass = self._tclass
+        straight, diagonal = self._movecost[0][tclass[i]], self._movecost[1][tclass[i]]
+        succ = [((col + dx, row + dy), (diagonal if diag else straight)[tclass[i + offset]])
+                for dx, dy, diag, offset in self._maskmoves[self.moves[i]]]
+        if position in self._neardoor:
+            succ = [(n, self.getCost(n, position, keys)) for n, cost in succ]
+            succ = [(n, cost) for n, cost in succ if cost < float('inf')]
+        return succ
+
+    def getCellSuccessors(self, cell, keys=None):
+        """
+        As getSuccessors(), for the cell with index cell = col * height + row: returns the legal
+        moves out of it as a list of (neighbour index, cost) pairs. For agents that keep their
+        search state in arrays indexed by cell (see p4_search).
+        :type cell: int
+        :rtype : list of (int, float)
+        """
+        if self.moves is None:
+            self._buildMoves()
+        if self._neardoor:
+            h = self._height
+            position = divmod(cell, h)
+            if position in self._neardoor:
+                return [(col * h + row, cost) for (col, row), cost in self.getSuccessors(position, keys)]
+        tclass = self._tclass
+        straight, diagonal = self._movecost[0][tclass[cell]], self._movecost[1][tclass[cell]]
+        return [(cell + offset, (diagonal if diag else straight)[tclass[cell + offset]])
+                for dx, dy, diag, offset in self._maskmoves[self.moves[cell]]]
+
+    def getCellPredecessors(self, cell, keys=None):
+        """
+        The reverse of getCellSuccessors(): returns the legal moves into the cell with index cell,
+        as a list of (neighbour index, cost of the move from the neighbour) pairs. For searches
+        backwards from the goal, as costs depend on the direction of a move (under the mixed
+        cost models, on the destination terrain).
+        :type cell: int
+        :rtype : list of (int, float)
+        """
+        if self.moves is None:
+            self._buildMoves()
+        if self.revmoves is None:
+            padded = self._padBytes(str(self.moves), "\0")
+            N = len(padded)
+            self.revmoves = bytearray(self._unpadBytes(p4.intToBytes(
+                self._reverseMoves(p4.bytesToInt(padded), N), N)))
+        h = self._height
+        if self._neardoor:
+            position = divmod(cell, h)
+            if position in self._neardoor:
+                col, row = position
+                preds = []
+                for dx, dy in p4.DIRECTIONS:
+                    previous = (col + dx, row + dy)
+                    if 0 <= previous[0] < self._width and 0 <= previous[1] < h:
+                        cost = self.getCost(position, previous, keys)
+                        if cost < float('inf'):
+                            preds.append((previous[0] * h + previous[1], cost))
+                return preds
+        tclass = self._tclass
+        to = tclass[cell]
+        movecost = self._movecost
+        return [(cell + offset, movecost[diag][tclass[cell + offset]][to])
+                for dx, dy, diag, offset in self._maskmoves[self.revmoves[cell]]]
+
+    def getPassableGrid(self):
+        """
+        Returns a bytearray with 1 for each passable cell (doors counting as their underlying
+        terrain) and 0 otherwise, over the map padded by a ring of impassable cells: cell (col, row)
+        is at index (col + 1) * (height + 2) + row + 1, so neighbour offsets never leave the array.
+        For agents that scan the grid themselves (e.g., jump point search). A new copy per call.
+        :rtype : bytearray
+        """
+        if self.moves is None:
+            self._buildMoves()
+        table = "".join(chr(b < len(self._passclass) and self._passclass[b]) for b in xrange(256))
+        return bytearray(self._padBytes(str(self._tclass).translate(table), "\0"))
+
+    def getCellClasses(self):
+        """
+        Returns (classes, costs): a copy of the terrain class of every cell (bytearray, index
+        col * height + row; 0 off-map or unknown), and the costs of moves between classes,
+        costs[diagonal][from class][to class], under the current cost model and DIAGONAL setting.
+        A copy, so O(map): to tell whether terrain has changed since, keep version and read
+        changesSince() (see agents/agent_hpa.py), and getMoveCosts() for changes of costs.
+        """
+        costs = self.getMoveCosts()  # builds the classes on first use
+        return bytearray(self._tclass), costs
+
+    def getMoveCosts(self):
+        """
+        Returns the costs of moves between terrain classes, costs[diagonal][from class][to class], as
+        getCellClasses() does, without copying the classes of the cells. They change only with the
+        costs, cost model or DIAGONAL setting.
+        """
+        if self.moves is None:
+            self._buildMoves()
+        return self._movecost
+
+    def getUniformCosts(self):
+        """
+        Returns (straight, diagonal), the costs of straight and diagonal moves, if every legal move
+        costs one of them and moves are legal exactly between passable cells (under the current cost
+        model and DIAGONAL setting, save for corner cutting), or None otherwise (e.g., mixed costs,
+        or water on uniform-cost maps).
+        :rtype : (float, float)
+        """
+        if self.moves is None:
+            self._buildMoves()
+        present = [k for k in set(self._tclass) if self._passclass[k]]
+        costs = []
+        for diag in (0, 1):
+            if diag and not self.diagonal:
+                costs.append(float('inf'))
+                continue
+            values = set(self._movecost[diag][a][b] for a in present for b in present)
+            if not len(values) == 1 or not min(values) < float('inf'):
+                return None
+            costs.append(values.pop())
+        return tuple(costs)
+
+    def _terrainString(self):
+        """Internal. Returns the whole map as one string of terrain characters, column by column"""
+        if self.compact:
+            return buffer(self.grid)[:]
+        return "".join("".join(col) for col in self.matrix)
+
+    def _buildMoves(self):
+        """
+        Internal. Builds the successor table used by getSuccessors() and getCost():
+         - moves[i]: 8-bit mask for cell i = col * height + row, bit d set iff moving along
+           p4.DIRECTIONS[d] is legal (on map, finite cost under the current cost model,
+           diagonals allowed and no corner cut). Doors count as their underlying terrain.
+         - _tclass[i]: terrain class of cell i (0 = off-map or unknown terrain).
+         - _movecost[diagonal][from class][to class]: cost of a move, from mixedmatrix.
+        The whole-map masks are computed byte-parallel (see _directionMask()) on a copy of the
+        classes padded with a ring of class 0, so no neighbour offset leaves the map.
+        """
+        inf = float('inf')
+        h = self._height
+        chars = sorted(self.costs)
+        if len(chars) > 15:  # each class, plus 0, must fit in half a byte
+            raise p4.BadMapException()
+        self._classchars = [None] + chars
+        self._classof = dict((c, k) for k, c in enumerate(self._classchars) if c)
+        nclasses = len(self._classchars)
+        self._movecost = [[[self.mixedmatrix.get((a, b, diag), inf) if a and b else inf
+                            for b in self._classchars] for a in self._classchars] for diag in (False, True)]
+        self._passclass = [bool(c) and self.costs[c] < inf for c in self._classchars]
+
+        tclass = self._terrainString().translate(
+            "".join(chr(self._classof.get(chr(b), 0)) for b in xrange(256)))
+        self._tclass = bytearray(tclass)
+
+        padded = self._padBytes(tclass, "\0")
+        H, N = h + 2, len(padded)
+        legal = ["".join(chr(a < nclasses and b < nclasses and self._movecost[diag][a][b] < inf)
+                         for a in xrange(16) for b in xrange(16)) for diag in (0, 1)]
+        directions = [d for d in xrange(8) if self.diagonal or not d & 1]
+        mask = self._directionMask(padded, legal, directions)
+        # diagonal moves must also not cut a corner; straight moves (bits 0, 2, 4, 6) are unaffected
+        passable = padded.translate("".join(chr(b < nclasses and self._passclass[b]) for b in xrange(256)))
+        corners = p4.bytesToInt("\x55" * N)
+        for d in directions[1::2] if self.diagonal else []:
+            dx, dy = p4.DIRECTIONS[d]
+            corners |= (p4.bytesToInt(p4.shiftBytes(passable, dx * H)) &
+                        p4.bytesToInt(p4.shiftBytes(passable, dy))) << d
+        self.moves = bytearray(self._unpadBytes(p4.intToBytes(mask & corners, N)))
+        # for each mask, the moves it allows as (dcol, drow, diagonal, index offset)
+        self._maskmoves = [tuple((dx, dy, d & 1, dx * h + dy) for d, (dx, dy) in enumerate(p4.DIRECTIONS) if m >> d & 1)
+                           for m in xrange(256)]
+        self._maskoffsets = [tuple(move[3] for move in moves) for moves in self._maskmoves]
+
+    def _dropTables(self):
+        """Internal. Discards the tables derived from costs, cost model and diagonal setting,
+        to be rebuilt on next use"""
+        self.moves = None
+        self.revmoves = None
+        self.diffmask = None
+        self.components = None
+        self._compdirty = set()
+        self.nearest = None
+        self._neardirty = set()
+        self.landmarks = None
+
+    def isReachable(self, a, b):
+        """
+        Returns False if there is certainly no path from a to b, by comparing the connected
+        components of a and b (under the current cost model, DIAGONAL setting and corner-cutting
+        rule, with all doors open). Components join cells connected by a legal move in either
+        direction, so True is exact wherever moves are reversible (i.e., except into water from
+        other terrain on uniform maps).
+        :type a: (int,int)
+        :type b: (int,int)
+        :rtype : bool
+        """
+        if a == b:
+            return True
+        if self.components is None:
+            self._buildComponents()
+        elif self._compdirty:
+            self._repairComponents()
+        if not (self.isMapped(a) and self.isMapped(b)):
+            return False
+        h = self._height
+        target = self.components[b[0] * h + b[1]]
+        if not target:
+            return False  # b is impassable: no move can end there
+        i = a[0] * h + a[1]
+        if self.components[i]:
+            return self.components[i] == target
+        # a is impassable (agents may stand there when not STRICT): reachable via its first move
+        return any(self.components[i + offset] == target for offset in self._maskoffsets[self.moves[i]])
+
+    def _passableMoves(self):
+        """Internal. Returns (moves, keep, N): the successor table restricted to moves out of passable
+        cells, and the mask with 0xff for passable cells and 0 otherwise, as byte-parallel integers
+        (see p4_utils.bytesToInt) over the padded map of N cells"""
+        passable = str(self._tclass).translate(
+            "".join(chr(b < len(self._passclass) and self._passclass[b]) for b in xrange(256)))
+        passable = self._padBytes(passable, "\0")
+        N = len(passable)
+        keep = p4.bytesToInt(passable) * 255
+        return p4.bytesToInt(self._padBytes(str(self.moves), "\0")) & keep, keep, N
+
+    def _reverseMoves(self, moves, N):
+        """Internal. Byte-parallel: returns moves (as from _passableMoves()) reversed, i.e. with bit d
+        set for a cell iff the neighbour along p4.DIRECTIONS[d] has a move into it"""
+        H = self._height + 2
+        ones = p4.bytesToInt("\x01" * N)
+        padded = p4.intToBytes(moves, N)
+        rev = 0
+        for d, (dx, dy) in enumerate(p4.DIRECTIONS):
+            back = p4.bytesToInt(p4.shiftBytes(padded, dx * H + dy))
+            rev |= ((back >> (d ^ 4)) & ones) << d
+        return rev
+
+    def _symmetricMoves(self):
+        """Internal. Returns, for every cell, the mask of directions in which it is joined by a legal
+        move, either way, to a passable cell (0 for impassable cells). Computed byte-parallel."""
+        moves, keep, N = self._passableMoves()
+        return bytearray(self._unpadBytes(p4.intToBytes((moves | self._reverseMoves(moves, N)) & keep, N)))
+
+    def _labelFrom(self, seeds, sym, label):
+        """Internal. Gives each unlabelled passable seed cell, and every cell joined to it, a new label"""
+        offsets = self._maskoffsets
+        for start in seeds:
+            if label[start] or not sym[start] and not self._passclass[self._tclass[start]]:
+                continue
+            self._nextlabel += 1
+            label[start] = self._nextlabel
+            stack = [start]
+            while stack:
+                i = stack.pop()
+                for offset in offsets[sym[i]]:
+                    j = i + offset
+                    if not label[j]:
+                        label[j] = self._nextlabel
+                        stack.append(j)
+
+    def _buildComponents(self):
+        """Internal. Labels the connected components of passable cells (see isReachable())"""
+        if self.moves is None:
+            self._buildMoves()
+        self._sym = self._symmetricMoves()
+        self.components = array('i', [0]) * len(self._sym)
+        self._nextlabel = 0
+        self._labelFrom(xrange(len(self._sym)), self._sym, self.components)
+        self._compdirty = set()
+
+    def _repairComponents(self):
+        """Internal. Relabels the components that contained, or were next to, cells changed
+        by setCell() since the last query. Costs time proportional to their size."""
+        h = self._height
+        label = self.components
+        self._sym = self._symmetricMoves()
+        seeds = set()
+        for i in self._compdirty:
+            col, row = divmod(i, h)
+            for c in xrange(max(col - 1, 0), min(col + 2, self._width)):
+                for r in xrange(max(row - 1, 0), min(row + 2, h)):
+                    seeds.add(c * h + r)
+        touched = set(label[i] for i in seeds)
+        touched.discard(0)
+        if touched:
+            for i in xrange(len(label)):
+                if label[i] in touched:
+                    label[i] = 0
+                    seeds.add(i)
+        for i in seeds:
+            label[i] = 0
+        self._labelFrom(seeds, self._sym, label)
+        self._compdirty = set()
+
+    def _landmarkDistances(self, source, reverse=None):
+        """Internal. Returns the costs of the cheapest paths from cell index source to every cell
+        (inf if none), by Dijkstra's algorithm over the successor table, i.e. with doors open.
+        Given reverse masks (see _reverseMoves()), returns the costs to source instead."""
+        inf = float('inf')
+        dist = array('d', [inf]) * len(self.moves)
+        dist[source] = 0.0
+        tclass, movecost, maskmoves = self._tclass, self._movecost, self._maskmoves
+        masks = self.moves if reverse is None else reverse
+        heap = [(0.0, source)]
+        while heap:
+            d, i = heappop(heap)
+            if d > dist[i]:
+                continue  # already settled at a lower cost
+            for dx, dy, diag, offset in maskmoves[masks[i]]:
+                j = i + offset
+                if reverse is None:
+                    nd = d + movecost[diag][tclass[i]][tclass[j]]
+                else:
+                    nd = d + movecost[diag][tclass[j]][tclass[i]]
+                if nd < dist[j]:
+                    dist[j] = nd
+                    heappush(heap, (nd, j))
+        return dist
+
+    def _buildLandmarks(self):
+        """
+        Internal. Builds the tables of the landmark heuristic. The first landmark is the cell of the
+        largest component farthest from one of its cells, and each next one the cell farthest from
+        all landmarks so far. If map caching is on, tables are kept in a .p4alt file next to the map
+        (or in the cache directory), keyed by the map and cost files and the move costs, and loaded
+        from there when up to date.
+        """
+        self._altstale = False
+        if self.moves is None:
+            self._buildMoves()
+        if self.components is None:
+            self._buildComponents()
+        elif self._compdirty:
+            self._repairComponents()
+        inf = float('inf')
+        N = len(self.moves)
+        moves, _, padN = self._passableMoves()
+        reverse = self._reverseMoves(moves, padN)
+        # moves cost the same both ways iff every move has its reverse, at the same cost
+        present = set(self._tclass)
+        symmetric = moves == reverse and all(
+            movecost[a][b] == movecost[b][a] for movecost in self._movecost for a in present for b in present)
+
+        cachefile = None
+        if self.cache and self.mappath is not None and not self._edited:
+            digest = p4_cache.extendDigest(p4_cache.fileDigest(self.mappath, self.costpath),
+                                           self._movecost, self.diagonal, self.landmarkcount)
+            cachefile = p4_cache.cachePath(self.mappath, digest, "p4alt", self.cachedir)
+            if self._loadLandmarks(cachefile, digest):
+                return
+
+        reverse = None if symmetric else bytearray(self._unpadBytes(p4.intToBytes(reverse, padN)))
+        self.landmarks = []
+        tables = []
+        maxcost = 0.0
+        largest = Counter(self.components)
+        del largest[0]
+        if largest:
+            mindist = self._landmarkDistances(self.components.index(largest.most_common(1)[0][0]))
+            while len(self.landmarks) < self.landmarkcount:
+                far = max(xrange(N), key=lambda i: mindist[i] if mindist[i] < inf else -1.0)
+                if not 0 < mindist[far] < inf:
+                    break  # fewer cells than landmarks
+                self.landmarks.append(far)
+                dist = self._landmarkDistances(far)
+                tables.append(dist)
+                if reverse is not None:
+                    # negated, so that every bound is (value at goal - value at current)
+                    tables.append(array('d', [-d for d in self._landmarkDistances(far, reverse)]))
+                mindist = array('d', map(min, mindist, dist))
+                maxcost = max(maxcost, max(d for d in dist if d < inf))
+        # interleaved: the values of cell i are at [i * len(tables), (i + 1) * len(tables))
+        self._alttable = array('f', [0.0]) * (N * len(tables))
+        for k, table in enumerate(tables):
+            self._alttable[k::len(tables)] = array('f', table)
+        self._altsymmetric = symmetric
+        self._setLandmarkError(len(tables), maxcost)
+        if cachefile is not None:
+            meta = {"digest": digest, "cells": N, "landmarks": self.landmarks, "symmetric": symmetric,
+                    "maxcost": maxcost}
+            p4_cache.writeCache(cachefile, p4_cache.LANDMARK_MAGIC, meta, self._alttable.tostring())
+
+    def _loadLandmarks(self, cachefile, digest):
+        """Internal. Loads the landmark table from a .p4alt cache file.
+        Returns False if there is no valid cache for the current map, costs and settings."""
+        cached = p4_cache.readCache(cachefile, p4_cache.LANDMARK_MAGIC, digest)
+        if cached is None:
+            return False
+        meta, payload, size = cached
+        N = meta["cells"]
+        width = len(meta["landmarks"]) * (1 if meta["symmetric"] else 2)
+        if not N == len(self.moves) or not size == width * N * 4:
+            return False
+        self._alttable = array('f')
+        self._alttable.fromstring(buffer(payload)[:])  # copied: indexing an array is faster than the mapping
+        self.landmarks = meta["landmarks"]
+        self._altsymmetric = meta["symmetric"]
+        self._setLandmarkError(width, meta["maxcost"])
+        return True
+
+    def _setLandmarkError(self, width, maxcost):
+        """Internal. Sets the width (values per cell) of the landmark table, and the margin taken off
+        its bounds to keep them admissible: float32 values are off by at most 2**-24 of each cost (all
+        below maxcost), so a difference of two by twice that."""
+        self._altwidth = width
+        self._alterror = maxcost * 2 ** -22
+        self._altgoal = None
+
+    def _passability(self, i):
+        """Internal. Returns the entry of padded cell i in _nearpass: 1 if passable (as per
+        isPassable() without keys), 0 if impassable, 2 if off the map"""
+        H = self._height + 2
+        col, row = i // H - 1, i % H - 1
+        if not self.isMapped((col, row)):
+            return 2
+        return 1 if self.isPassable((col, row)) else 0
+
+    def _buildNearest(self):
+        """Internal. Builds the nearest-passable lookup by breadth-first search out of all passable
+        cells at once, through impassable ones (see nearestPassable())"""
+        table = "".join("\1" if self.costs.get(chr(b), float('inf')) < float('inf') else "\0"
+                        for b in xrange(256))
+        H = self._height + 2
+        cells = bytearray(self._padBytes(self._terrainString().translate(table), "\2"))
+        for (col, row) in self.doors:
+            cells[(col + 1) * H + row + 1] = 0
+        self._nearpass = cells
+        self._nearoffsets = [dx * H + dy for dx, dy in p4.DIRECTIONS]
+        self.nearest = array('i', [-1]) * len(cells)
+        self._neardist = array('i', [0]) * len(cells)
+        # seeds: the passable cells next to an impassable one
+        blocked = p4.bytesToInt(str(cells).translate("\1\0\0" + "\0" * 253))
+        edge = 0
+        for offset in self._nearoffsets:
+            edge |= p4.bytesToInt(p4.shiftBytes(p4.intToBytes(blocked, len(cells)), offset))
+        edge = p4.intToBytes(edge & p4.bytesToInt(str(cells).translate("\0\1\0" + "\0" * 253)), len(cells))
+        self._spreadNearest([m.start() for m in re.finditer("\x01", edge)])
+        self._neardirty = set()
+
+    def _spreadNearest(self, seeds):
+        """Internal. Breadth-first search from the given labelled or passable padded cells, giving
+        each impassable cell it improves on the source (and distance) of the cell it is reached from"""
+        passable, nearest, dist = self._nearpass, self.nearest, self._neardist
+        offsets = self._nearoffsets
+        seeds = sorted(seeds, key=dist.__getitem__)
+        k = 0
+        layer = []
+        while layer or k < len(seeds):
+            if not layer:
+                d = dist[seeds[k]]
+            while k < len(seeds) and dist[seeds[k]] == d:
+                layer.append(seeds[k])
+                k += 1
+            nxt = []
+            for i in layer:
+                if dist[i] != d:
+                    continue  # improved since queued
+                source = i if passable[i] == 1 else nearest[i]
+                for offset in offsets:
+                    j = i + offset
+                    if not passable[j] and (nearest[j] < 0 or dist[j] > d + 1):
+                        nearest[j] = source
+                        dist[j] = d + 1
+                        nxt.append(j)
+            layer = nxt
+            d += 1
+
+    def _repairNearest(self):
+        """Internal. Brings the nearest-passable lookup up to date with the cells changed by
+        setCell(): cells that lost their source are searched again from the edge of the region
+        they form, and new passable cells are searched from. Costs time proportional to the
+        cells whose answer changes."""
+        passable, nearest, dist = self._nearpass, self.nearest, self._neardist
+        offsets = self._nearoffsets
+        lost = set()
+        seeds = set()
+        for i in self._neardirty:
+            was, now = passable[i], self._passability(i)
+            passable[i] = now
+            if was == 1 and now == 0:
+                # the region of cells answered with i is connected: each was reached from a neighbour
+                region = [i]
+                lost.add(i)
+                for j in region:
+                    for offset in offsets:
+                        n = j + offset
+                        if n not in lost and nearest[n] == i and not passable[n]:
+                            lost.add(n)
+                            region.append(n)
+            elif was == 0 and now == 1:
+                nearest[i] = -1
+                dist[i] = 0
+                seeds.add(i)
+        for i in lost:
+            nearest[i] = -1
+        for i in lost:
+            for offset in offsets:
+                n = i + offset
+                if n not in lost and (passable[n] == 1 or not passable[n] and nearest[n] >= 0):
+                    seeds.add(n)
+        self._spreadNearest(seeds)
+        self._neardirty = set()
+
+    def _padBytes(self, cells, fill):
+        """Internal. Returns cells (one byte per cell, column-major) surrounded by a ring of fill
+        bytes, i.e. as a (width + 2) x (height + 2) map"""
+        h = self._height
+        ring = fill * (h + 2)
+        return ring + "".join(fill + cells[c * h:(c + 1) * h] + fill for c in xrange(self._width)) + ring
+
+    def _unpadBytes(self, padded):
+        """Internal. Inverse of _padBytes()"""
+        h = self._height
+        return "".join(padded[(c + 1) * (h + 2) + 1:(c + 1) * (h + 2) + 1 + h] for c in xrange(self._width))
+
+    def _directionMask(self, padded, tables, directions):
+        """
+        Internal. Byte-parallel (see p4_utils.bytesToInt) direction masks over a padded map of
+        classes below 16: returns, as an integer with one byte per padded cell i, the mask with
+        bit d set, for each d in directions, iff tables[d & 1][16 * class(i) + class(neighbour)]
+        is chr(1). tables[0] is used for straight directions and tables[1] for diagonal ones.
+        """
+        H = self._height + 2
+        high = p4.bytesToInt(padded) << 4
+        mask = 0
+        for d in directions:
+            dx, dy = p4.DIRECTIONS[d]
+            pairs = p4.intToBytes(high | p4.bytesToInt(p4.shiftBytes(padded, dx * H + dy)), len(padded))
+            mask |= p4.bytesToInt(pairs.translate(tables[d & 1])) << d
+        return mask
+
+    def _cellMoves(self, col, row):
+        """Internal. Recomputes moves[] for the single cell (col, row), as _buildMoves() does"""
+        inf = float('inf')
+        h = self._height
+        tclass = self._tclass
+        i = col * h + row
+        mask = 0
+        for d, (dx, dy) in enumerate(p4.DIRECTIONS):
+            diag = d & 1
+            if diag and not self.diagonal:
+                continue
+            if not (0 <= col + dx < self._width and 0 <= row + dy < h):
+                continue
+            if self._movecost[diag][tclass[i]][tclass[i + dx * h + dy]] == inf:
+                continue
+            if diag and not (self._passclass[tclass[i + dx * h]] and self._passclass[tclass[i + dy]]):
+                continue
+            mask |= 1 << d
+        self.moves[i] = mask
+
+    def _cellReverse(self, col, row):
+        """Internal. Recomputes revmoves[] for the single cell (col, row) from moves[]"""
+        h = self._height
+        i = col * h + row
+        mask = 0
+        for d, (dx, dy) in enumerate(p4.DIRECTIONS):
+            if 0 <= col + dx < self._width and 0 <= row + dy < h and self.moves[i + dx * h + dy] >> (d ^ 4) & 1:
+                mask |= 1 << d
+        self.revmoves[i] = mask
+
     def _getDiagAdjacents(self, position):
-        """Internal. Returns 8 neighbours. Called as getAdjacents() when DIAGONAL set to True"""
+        """Internal. Returns 8 neighbours, passable or not. Called as getAdjacents() when DIAGONAL set to True"""
         (col, row) = position
         col = int(col)
         row = int(row)
@@ -393,16 +1208,16 @@ class LogicalMap(object):
         return L
 
     def _getNonDiagAdjacents(self, position):
-        """Internal. Returns 4 neighbours. Called as getAdjacents() when DIAGONAL set to False"""
+        """Internal. Returns 4 neighbours, passable or not. Called as getAdjacents() when DIAGONAL set to False"""
         (col, row) = position
         L = []
         if col > 0:
             L.append((col - 1, row))
-        if col + 1 < self.width - 1:
+        if col + 1 < self.width:
             L.append((col + 1, row))
         if row > 0:
             L.append((col, row - 1))
-        if row + 1 < self.height - 1:
+        if row + 1 < self.height:
             L.append((col, row + 1))
         return L
 
@@ -422,6 +1237,68 @@ class LogicalMap(object):
         ylen = fabs(current[1] - goal[1])
         return max(xlen, ylen) + self.OCT_CONST * min(xlen, ylen)
 
+    def _euclidInt(self, current, goal):
+        """Internal. Called as getH() if HEURISTIC set to 'euclid', in integer cost mode"""
+        xlen = current[0] - goal[0]
+        ylen = current[1] - goal[1]
+        return int(self.costscale * sqrt(xlen * xlen + ylen * ylen))
+
+    def _manhattanInt(self, current, goal):
+        """Internal. Called as getH() if HEURISTIC set to 'manhattan', in integer cost mode"""
+        return self.costscale * abs((current[0] - goal[0]) + (current[1] - goal[1]))
+
+    def _octileInt(self, current, goal):
+        """Internal. Called as getH() if HEURISTIC set to 'octile', in integer cost mode"""
+        xlen = abs(current[0] - goal[0])
+        ylen = abs(current[1] - goal[1])
+        if xlen < ylen:
+            return self._octstraight * ylen + self._octextra * xlen
+        return self._octstraight * xlen + self._octextra * ylen
+
+    def _landmarkInt(self, current, goal):
+        """Internal. Called as getH() if HEURISTIC set to 'landmark', in integer cost mode"""
+        return max(int(self._altBound(current, goal)), self._octileInt(current, goal))
+
+    def _landmark(self, current, goal):
+        """Internal. Called as getH() if HEURISTIC set to 'landmark'. Returns the larger of the octile
+        and landmark bounds on the cost from current to goal (both admissible, so the larger is too)"""
+        return max(self._altBound(current, goal), self._octile(current, goal))
+
+    def _altBound(self, current, goal):
+        """Internal. Returns the largest lower bound on the cost from current to goal given by the
+        triangle inequality over the landmark tables (0 while they are stale)"""
+        if self.landmarks is None:
+            self._buildLandmarks()
+        if self._altstale:
+            return 0.0
+        h = self._height
+        width = self._altwidth
+        if not goal == self._altgoal:
+            # each bound is (value at goal - value at current), for the landmarks the goal is connected
+            # with (others give no bound): picked out by _altpick when there are any others
+            j = (goal[0] * h + goal[1]) * width
+            values = self._alttable[j:j + width]
+            valid = [k for k, value in enumerate(values) if fabs(value) < float('inf')]
+            self._altpick = None
+            if len(valid) < width:
+                values = [values[k] for k in valid]
+                if valid:
+                    self._altpick = (lambda v: (v[valid[0]],)) if len(valid) == 1 else itemgetter(*valid)
+            self._altvalues = values
+            self._altgoal = goal
+        i = current[0] * h + current[1]
+        if not self._altvalues or not self._passclass[self._tclass[i]]:
+            return 0.0  # no landmark reaches the goal, or current is impassable (STRICT off)
+        values = self._alttable[i * width:(i + 1) * width]
+        if self._altpick is not None:
+            values = self._altpick(values)
+        bounds = map(sub, self._altvalues, values)
+        if self._altsymmetric:
+            bound = max(max(bounds), -min(bounds))  # costs either way: the bound is the absolute difference
+        else:
+            bound = max(bounds)
+        return max(bound - self._alterror, 0.0)
+
     def getMixedCost(self, terrain1, terrain2, diag=False):
         """
         Returns cost from mixedmatrix based on terrain types passed in.
@@ -441,9 +1318,16 @@ class LogicalMap(object):
         Called from init. Sets matrix to None if map load fails.
         Differentiates between uniform and non-uniform cost based on length
         map header.
+        If caching, loads the map from its .p4grid cache instead when there is an
+        up-to-date one, and writes one otherwise.
         """
         self.info = {}
         try:
+            if self.cache:
+                self.digest = p4_cache.fileDigest(mappath, costpath)
+                cachefile = p4_cache.cachePath(mappath, self.digest, "p4grid", self.cachedir)
+                if self._loadGrid(cachefile):
+                    return
             with open(mappath, "r") as f:
                 # print("Parsing")
                 for line in f:
@@ -466,9 +1350,8 @@ class LogicalMap(object):
                     else:   
                         self.info[key] = int(parsed[1]) 
                 # generate matrix - using 'zip' so that it reads back (col, row)
-                _matrix = [list(line.rstrip()) for line in f]
-                self.matrix = [list(x) for x in zip(*_matrix)]  # make it a list so can change it
-                # self.matrix = list(zip(*_matrix))
+                _matrix = [line.rstrip() for line in f]
+                self._storeTerrain(zip(*_matrix))
 
                 # if cost file specified, read it and overwrite whatever cost is so far
                 if costpath:
@@ -485,6 +1368,8 @@ class LogicalMap(object):
                 if "ground" in self.info and not "ground1" in self.info:
                     self.info['ground1'] = self.info['ground']
                 
+                self._indexDoors()
+
                 # replace terrain types with costs obtained from map (if any), then guess whether it is uniform or not
                 self.setCostCells(self.info)  # set cost as per read from the map file above
                 if len(set(self.costs.values()).difference(set([float('inf')]))) == 1:
@@ -493,23 +1378,149 @@ class LogicalMap(object):
                 else:
                     self.uniform = False
 
+            if self.cache:
+                self._saveGrid(cachefile)
+
         except EnvironmentError:
             print("Error parsing map file")
             self.matrix = None
+            self.grid = None
+
+    def _loadGrid(self, cachefile):
+        """Internal. Loads terrain, info, costs and keys from a .p4grid cache file.
+        Returns False if there is no valid cache for the current map and cost files."""
+        cached = p4_cache.readCache(cachefile, p4_cache.GRID_MAGIC, self.digest)
+        if cached is None:
+            return False
+        meta, terrain, size = cached
+        width, height = meta["width"], meta["height"]
+        if not size == width * height:
+            return False
+        self.info = meta["info"]
+        self.costs = meta["costs"]
+        self.key_and_doors = meta["key_and_doors"]
+        self.uniform = meta["uniform"]
+        if self.compact:
+            self._storeGrid(terrain, width, height)  # terrain is shared with other processes until written
+        else:
+            self._storeTerrain([buffer(terrain, col * height, height)[:] for col in xrange(width)])
+        self._indexDoors()
+        self._dropTables()
+        return True
+
+    def _saveGrid(self, cachefile):
+        """Internal. Writes terrain, info, costs and keys of the map just parsed to a .p4grid
+        cache file. Failure to write (e.g. read-only map directory) is ignored."""
+        meta = {"digest": self.digest, "width": self._width, "height": self._height,
+                "info": self.info, "costs": self.costs, "key_and_doors": self.key_and_doors,
+                "uniform": self.uniform}
+        p4_cache.writeCache(cachefile, p4_cache.GRID_MAGIC, meta, self._terrainString())
 
     def isMapped(self, node):
         """ returns True if node is on map """
         return 0 <= node[0] < self.width and 0 <= node[1] < self.height
         
+    def addListener(self, listener):
+        """Registers listener to be called as listener(change) by setCell() and setPoints() after they
+        change terrain, with change the MapChange journalled, e.g. so that an agent can repair its search
+        instead of starting over. Components that only need the changes now and then can instead keep
+        the version they are up to date with, and poll changesSince(). """
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def removeListener(self, listener):
+        """Unregisters listener (see addListener()), if registered"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def changesSince(self, version):
+        """Returns the changes of terrain (MapChange entries) after version, oldest first, or None if
+        some of them have been dropped from the journal, in which case the caller has to start over.
+        :type version: int
+        :rtype : list of MapChange
+        """
+        if version >= self.version:
+            return []
+        if not self.journal or self.journal[0].version > version + 1:
+            return None
+        return [change for change in self.journal if change.version > version]
+
+    def _record(self, previous):
+        """Internal. Journals the cells whose terrain changed, given as {(col, row): terrain before}, as
+        one MapChange over the rectangle enclosing them, advances the version and notifies listeners"""
+        if not previous:
+            return
+        cols = [col for col, row in previous]
+        rows = [row for col, row in previous]
+        topleft, botright = (min(cols), min(rows)), (max(cols), max(rows))
+        block = p4.getBlock(topleft, botright)
+        new = "".join(self.getCell(each) for each in block)
+        old = "".join(previous.get(each, char) for each, char in zip(block, new))
+        self.version += 1
+        change = MapChange(self.version, topleft, botright, old, new)
+        self.journal.append(change)
+        for listener in list(self.listeners):
+            listener(change)
+
     def setPoints(self, terrain, pointlist):
+        """Sets terrain at each point of pointlist (see setCell()), journalled as a single change"""
+        previous = {}
         for each in pointlist:
-            self.setCell(terrain, each)
-            
+            char = self.getCell(each)
+            if self._setCell(terrain, each):
+                previous.setdefault(tuple(each), char)
+        self._record(previous)
+
     def setCell(self, char, position):
-        """Modifies matrix. Ignores if char is invalid terrain type or position is off-map"""
-        if char in self.costs and self.cellWithinBoundaries(position):
+        """Modifies matrix. Ignores if char is invalid terrain type or position is off-map.
+        Changes of terrain are journalled (see changesSince()) and passed to listeners (see addListener())."""
+        previous = self.getCell(position)
+        if self._setCell(char, position):
+            self._record({tuple(position): previous})
+
+    def _setCell(self, char, position):
+        """Internal. As setCell(), without journalling the change. Returns True if the terrain changed."""
+        if char in self.costs and self.cellWithinBoundaries(position) and not self.getCell(position) == char:
             x, y = position
-            self.matrix[x][y] = char
+            if self.compact:
+                self.grid[x * self._height + y] = ord(char)
+            else:
+                self.matrix[x][y] = char
+            if self.moves is not None:
+                old, new = self._tclass[x * self._height + y], self._classof.get(char, 0)
+                if self.landmarks is not None and not self._raisesCosts(old, new):
+                    self._altstale = True
+                # only moves out of the 3x3 block around position can involve it (as source,
+                # destination or cut corner)
+                self._tclass[x * self._height + y] = new
+                for col in xrange(max(x - 1, 0), min(x + 2, self._width)):
+                    for row in xrange(max(y - 1, 0), min(y + 2, self._height)):
+                        self._cellMoves(col, row)
+                        if self.diffmask is not None:
+                            self._cellDiffs(col, row)
+                if self.components is not None:
+                    self._compdirty.add(x * self._height + y)
+                if self.revmoves is not None:
+                    # reverse masks of cells next to those whose moves were recomputed
+                    for col in xrange(max(x - 2, 0), min(x + 3, self._width)):
+                        for row in xrange(max(y - 2, 0), min(y + 3, self._height)):
+                            self._cellReverse(col, row)
+            if self.nearest is not None:
+                self._neardirty.add((x + 1) * (self._height + 2) + y + 1)
+            # landmark tables are no longer those of the map file
+            self._edited = True
+            return True
+        return False
+
+    def _raisesCosts(self, old, new):
+        """Internal. Returns True if changing a cell from terrain class old to new makes no move cheaper,
+        nor legal where it was not, so that costs between cells can only rise"""
+        if not self._passclass[new]:
+            return True  # moves into, out of or cutting past the cell can only be taken away
+        if not self._passclass[old]:
+            return False
+        return all(movecost[new][c] >= movecost[old][c] and movecost[c][new] >= movecost[c][old]
+                   for movecost in self._movecost for c in xrange(1, len(movecost)))
 
     def validator(self, path):
         """Checks validity of path and returns cost. Invalid path returns infinity.
@@ -0,0 +1,195 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+SQLite store of batch results (p4.py -db, p4_matrix.py -db), alongside the csv file: one row in runs
+per batch run (agent, scenario, settings, machine and time), one in problems per problem run (map,
+bucket, start, goal and optimum), shared by all runs of it, and one in measurements per problem run.
+Rows, and the problems they are of, are written in one transaction every sync of the csv file (see
+SimController.runBatch()). Run from
+src/ for the mean results per map and agent, e.g.
+
+    python p4_results.py ../results/results.db -m AR0011SR.map
+"""
+
+import argparse
+import datetime
+import os
+import platform
+import sqlite3
+from collections import OrderedDict
+
+import p4_controller
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started TEXT, finished TEXT, machine TEXT, platform TEXT,
+    agent TEXT, scenario TEXT, map TEXT, cost_model TEXT, cost_file TEXT, heuristic TEXT,
+    deadline REAL, reps INTEGER, jobs INTEGER, settings TEXT);
+CREATE TABLE IF NOT EXISTS problems (
+    id INTEGER PRIMARY KEY,
+    map TEXT, bucket INTEGER, startx INTEGER, starty INTEGER, goalx INTEGER, goaly INTEGER, optimum REAL,
+    UNIQUE (map, startx, starty, goalx, goaly));
+CREATE TABLE IF NOT EXISTS measurements (
+    run INTEGER REFERENCES runs (id), problem INTEGER REFERENCES problems (id), no INTEGER,
+    actual REAL, steps INTEGER, time_taken REAL, quality REAL, epsilon REAL, expansions INTEGER,
+    step_p50 REAL, step_p95 REAL, step_p99 REAL, step_max REAL);
+CREATE INDEX IF NOT EXISTS runs_map_agent ON runs (map, agent);
+CREATE INDEX IF NOT EXISTS problems_map_bucket ON problems (map, bucket);
+CREATE INDEX IF NOT EXISTS measurements_run ON measurements (run);
+CREATE INDEX IF NOT EXISTS measurements_problem ON measurements (problem);
+"""
+
+# fields of a batch row stored in measurements, after run and problem
+MEASURED = ("actual", "steps", "time_taken", "quality", "epsilon", "expansions", "step_p50", "step_p95", "step_p99",
+            "step_max")
+# settings of the controller not kept in runs.settings (they differ between problems or runs)
+TRANSIENT = ("START", "GOAL", "BATCH", "RESUME", "RESULTS_DB")
+
+SUMMARY = """
+SELECT runs.map, runs.agent, runs.cost_model, runs.heuristic, COUNT(*), AVG(quality), AVG(time_taken),
+    AVG(expansions), AVG(step_p99), MAX(step_max)
+FROM measurements JOIN runs ON measurements.run = runs.id JOIN problems ON measurements.problem = problems.id
+WHERE {}
+GROUP BY runs.map, runs.agent, runs.cost_model, runs.heuristic
+ORDER BY runs.map, runs.agent, runs.cost_model, runs.heuristic
+"""
+
+
+def _now():
+    """Returns the current UTC time, ISO formatted"""
+    return datetime.datetime.utcnow().isoformat()
+
+
+def _value(field):
+    """Returns a field of a batch row as stored: None if empty"""
+    return None if field == "" else field
+
+
+def _format(value, spec):
+    """Returns value formatted by spec, or empty if None (no measurement, e.g. unreachable problems only)"""
+    return "" if value is None else spec.format(value)
+
+
+class ResultsStore(object):
+    """
+    Batch results database at path, created if need be. Runs are added by beginRun(), their rows by
+    addRow(), kept until flush() writes them in one transaction.
+    """
+
+    def __init__(self, path):
+        # several batch runs may write to one database: wait for each other's transactions
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.scenarios = {}     # run: [its scenario, reader of it (see readScenario()), last (number, fields) read]
+        self.pending = []       # (problem, measurement) of the rows not yet written, problem id left out
+
+    def beginRun(self, cfg, scenario):
+        """Adds the run of scenario with the settings cfg (see SimController) and returns the id of the run.
+        Its problems are added as their rows are (see flush())."""
+        agent = os.path.basename(cfg["AGENT_FILE"])
+        if agent[-3:] == ".py":
+            agent = agent[:-3]
+        settings = sorted((key, value) for key, value in cfg.iteritems() if key not in TRANSIENT)
+        with self.db:
+            run = self.db.execute(
+                "INSERT INTO runs (started, machine, platform, agent, scenario, map, cost_model, cost_file,"
+                " heuristic, deadline, reps, jobs, settings) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (_now(), platform.node(), platform.platform(), agent, scenario,
+                 os.path.basename(cfg.get("MAP_FILE") or ""), cfg.get("COST_MODEL"), cfg.get("COST_FILE"),
+                 cfg.get("HEURISTIC"), float(cfg.get("DEADLINE") or 0), int(cfg.get("REPS") or 1),
+                 int(cfg.get("JOBS") or 1), repr(settings))).lastrowid
+        self.scenarios[run] = [scenario, p4_controller.readScenario(scenario), (0, None)]
+        return run
+
+    def _bucket(self, run, no):
+        """Returns the bucket of problem no of the scenario of run, read as far as no: rows come in the
+        order of the scenario, so it is read once (again from the start only if a row comes out of order)"""
+        scenario = self.scenarios[run]
+        if scenario[2][0] > no:
+            scenario[1:] = [p4_controller.readScenario(scenario[0]), (0, None)]
+        while scenario[2][0] < no:
+            scenario[2] = next(scenario[1])
+        return _value(scenario[2][1][0])
+
+    def addRow(self, run, row):
+        """Keeps row (as returned by SimController.runProblem()) of run, to be written by flush()"""
+        fields = dict(zip(p4_controller.BATCH_HEADER, row))
+        no = int(fields["no"])
+        problem = (os.path.basename(fields["map"]), self._bucket(run, no), int(fields["startx"]),
+                   int(fields["starty"]), int(fields["goalx"]), int(fields["goaly"]), float(fields["optimum"]))
+        # measured fields are empty for problems skipped as unreachable: NULL, left out of averages
+        self.pending.append((problem, (run, no) + tuple(_value(fields[key]) for key in MEASURED)))
+
+    def flush(self):
+        """Writes the rows kept, and the problems they are of if new, in one transaction"""
+        if self.pending:
+            problems = OrderedDict.fromkeys(problem for problem, measurement in self.pending).keys()
+            with self.db:
+                self.db.executemany("INSERT OR IGNORE INTO problems (map, bucket, startx, starty, goalx, goaly,"
+                                    " optimum) VALUES (?, ?, ?, ?, ?, ?, ?)", problems)
+                ids = dict((problem, self.db.execute(
+                    "SELECT id FROM problems WHERE map = ? AND startx = ? AND starty = ? AND goalx = ? AND"
+                    " goaly = ?", problem[:1] + problem[2:6]).fetchone()[0]) for problem in problems)
+                self.db.executemany("INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    [measurement[:1] + (ids[problem],) + measurement[1:]
+                                     for problem, measurement in self.pending])
+            self.pending = []
+
+    def endRun(self, run):
+        """Writes the rows kept and records the end of run"""
+        self.flush()
+        with self.db:
+            self.db.execute("UPDATE runs SET finished = ? WHERE id = ?", (_now(), run))
+        del self.scenarios[run]
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+def summary(db, mapname=None, agent=None, bucket=None):
+    """Returns rows of (map, agent, cost model, heuristic, problems, mean quality, mean time, mean expansions,
+    mean 99th percentile of step latency, highest step latency) of the measurements in db (a sqlite3
+    connection), of mapname, agent and bucket if given"""
+    where, values = ["1"], []
+    for column, value in (("runs.map", mapname), ("runs.agent", agent), ("problems.bucket", bucket)):
+        if value is not None:
+            where.append("{} = ?".format(column))
+            values.append(value)
+    return db.execute(SUMMARY.format(" AND ".join(where)), values).fetchall()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reports mean batch results (and step latencies) per map and agent")
+    parser.add_argument("DATABASE", help="results database (see p4.py -db)")
+    parser.add_argument('-m', '--map', dest='MAP', help="only this map (file name, e.g. AR0011SR.map)")
+    parser.add_argument('-a', '--agent', dest='AGENT', help="only this agent (e.g. agent_astar)")
+    parser.add_argument('-b', '--bucket', dest='BUCKET', type=int, help="only problems of this bucket")
+    args = parser.parse_args()
+    if not os.path.isfile(args.DATABASE):
+        parser.error("{} not found".format(args.DATABASE))
+    rows = summary(sqlite3.connect(args.DATABASE), args.MAP, args.AGENT, args.BUCKET)
+    print("{:24} {:18} {:12} {:10} {:>8} {:>8} {:>10} {:>12} {:>10} {:>10}".format(
+        "map", "agent", "cost model", "heuristic", "problems", "quality", "time", "expansions", "step p99",
+        "step max"))
+    for mapname, agent, model, heuristic, count, quality, time, expansions, p99, highest in rows:
+        print("{:24} {:18} {:12} {:10} {:8d} {:>8} {:>10} {:>12} {:>10} {:>10}".format(
+            mapname, agent, model, heuristic, count, _format(quality, "{:.3f}"), _format(time, "{:.5f}"),
+            _format(expansions, "{:,.0f}"), _format(p99, "{:.7f}"), _format(highest, "{:.7f}")))
@@ -0,0 +1,315 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Search kernel for agents.
+
+Cells are identified by their flat index col * height + row, as in LogicalMap.getCellSuccessors().
+A search keeps g-values and parents in arrays indexed by cell, closed cells in a bitset, and its
+open list in an indexed binary heap: a cell reached again at a lower cost has its key decreased in
+place, so no cell is ever on the open list twice. Where f-values take few distinct values, a
+bucket queue can stand in for the heap (see openList()).
+
+    search = BestFirst(lmap, lambda g, coord, cell: (g + lmap.getH(coord, goal), g, cell),
+                       queue=openList(lmap))
+    if search.run(start, goal):
+        path = search.path(goal)
+"""
+
+from array import array
+from heapq import heappush, heappop
+
+INF = float('inf')
+
+# width of the f-value buckets of BucketQueue under each cost model whose f-values are near-integer
+BUCKET_WIDTHS = {"mixed_opt1": 0.5, "mixed_opt2": 1.0}
+
+
+def openList(mapref):
+    """
+    Returns the open list suited to the cost model and heuristic of mapref, to pass to BestFirst as
+    queue: a BucketQueue where f-values fall on few distinct values (cost models mixed_opt1 and
+    mixed_opt2, or uniform costs with the octile heuristic), IndexedHeap otherwise.
+    For keys of the form (f, g, ...).
+    """
+    width = BUCKET_WIDTHS.get(mapref.costmodel)
+    if width is None and mapref.heuristic == "octile" and mapref.getUniformCosts() is not None:
+        width = mapref.OCT_CONST
+    if width is None:
+        return IndexedHeap
+    width *= mapref.costscale or 1  # integer cost mode: in scaled units
+    return lambda size: BucketQueue(size, width)
+
+
+class IndexedHeap(object):
+    """Binary min-heap of cells ordered by key, which records where each cell is, so its key can be decreased"""
+
+    def __init__(self, size):
+        self.items = []                         # (key, cell) pairs, in heap order
+        self.pos = array('i', [-1]) * size      # index of each cell in items, -1 if not on the heap
+
+    def __len__(self):
+        return len(self.items)
+
+    def push(self, cell, key):
+        """Adds cell with key, or decreases its key if it is on the heap with a greater one.
+        Returns False (and leaves the heap as is) if it is on the heap with a key not greater."""
+        items, pos = self.items, self.pos
+        k = pos[cell]
+        if k < 0:
+            k = len(items)
+            items.append(None)
+        elif not key < items[k][0]:
+            return False
+        while k:
+            up = (k - 1) >> 1
+            parent = items[up]
+            if not key < parent[0]:
+                break
+            items[k] = parent
+            pos[parent[1]] = k
+            k = up
+        items[k] = (key, cell)
+        pos[cell] = k
+        return True
+
+    def pop(self):
+        """Removes and returns the (key, cell) pair with the least key"""
+        items, pos = self.items, self.pos
+        top = items[0]
+        pos[top[1]] = -1
+        last = items.pop()
+        n = len(items)
+        if n:
+            key = last[0]
+            k = 0
+            child = 1
+            while child < n:
+                if child + 1 < n and items[child + 1][0] < items[child][0]:
+                    child += 1
+                if not items[child][0] < key:
+                    break
+                items[k] = items[child]
+                pos[items[k][1]] = k
+                k = child
+                child = 2 * k + 1
+            items[k] = last
+            pos[last[1]] = k
+        return top
+
+    def top(self):
+        """Returns the (key, cell) pair with the least key, leaving it on the heap"""
+        return self.items[0]
+
+    def cells(self):
+        """Returns the cells on the heap, in heap order"""
+        return [cell for key, cell in self.items]
+
+
+class BucketQueue(object):
+    """
+    Two-level bucket queue of cells keyed on (f, g, ...): cells are filed by f in buckets width wide,
+    and within a bucket popped in order of g (lowest first), from a heap. As a cell on the cheapest
+    path to another has no greater f (if the heuristic is consistent) and a lower g, it is popped
+    first, and A* still expands each cell at its least cost. A key decrease files the cell again,
+    leaving the old entry to be skipped when popped.
+    """
+
+    def __init__(self, size, width=1.0):
+        self.scale = 1.0 / width
+        self.buckets = []                       # bucket k: heap of (g, cell) for f in [k, k + 1) * width
+        self.low = 0                            # buckets below low are empty
+        self.count = 0                          # cells on the queue (stale entries aside)
+        self.fkey = array('d', [INF]) * size    # f and g of each cell on the queue, f INF if not on it
+        self.gkey = array('d', [INF]) * size
+
+    def __len__(self):
+        return self.count
+
+    def push(self, cell, key):
+        """Adds cell with key, or decreases its key if it is on the queue with a greater one.
+        Returns False (and leaves the queue as is) if it is on the queue with a key not greater."""
+        f, g = key[0], key[1]
+        fkey, gkey = self.fkey, self.gkey
+        if fkey[cell] < INF:
+            if not (f, g) < (fkey[cell], gkey[cell]):
+                return False
+        else:
+            self.count += 1
+        fkey[cell] = f
+        gkey[cell] = g
+        k = int(f * self.scale) if f > 0 else 0
+        buckets = self.buckets
+        if k >= len(buckets):
+            buckets.extend([] for i in xrange(k + 1 - len(buckets)))
+        heappush(buckets[k], (g, cell))
+        if k < self.low:
+            self.low = k
+        return True
+
+    def pop(self):
+        """Removes and returns ((f, g), cell) for the cell with the least g in the lowest bucket"""
+        buckets, fkey, gkey, scale = self.buckets, self.fkey, self.gkey, self.scale
+        k = self.low
+        while True:
+            bucket = buckets[k]
+            while bucket:
+                g, cell = heappop(bucket)
+                f = fkey[cell]
+                if g == gkey[cell] and k == (int(f * scale) if f > 0 else 0):
+                    fkey[cell] = gkey[cell] = INF
+                    self.count -= 1
+                    self.low = k
+                    return (f, g), cell
+            k += 1
+
+    def cells(self):
+        """Returns the cells on the queue, lowest bucket first"""
+        fkey, gkey, scale = self.fkey, self.gkey, self.scale
+        return [cell for k, bucket in enumerate(self.buckets) for g, cell in bucket
+                if g == gkey[cell] and k == (int(fkey[cell] * scale) if fkey[cell] > 0 else 0)]
+
+
+class BestFirst(object):
+    """
+    Best-first search from one cell to another of a LogicalMap, expanding cells in order of the key
+    returned by key(g, coord, cell) when a cell is reached (A*: f, then g, then cell). A cell reached
+    again at a lower g takes the new parent, and its key is decreased if the new one is lower.
+    If tiebreak is True, a cell reached again at the same g from a lower-index cell takes it as
+    parent too (as when popping the least of (f, g, cell, parent) duplicates from a heap).
+    queue makes the open list from the number of cells (IndexedHeap if None; see openList()).
+    successors gives the moves out of a cell (LogicalMap.getCellSuccessors if None); pass
+    getCellPredecessors to search backwards, from the goal. Besides run(), a search can be
+    stepped with begin() and expand(), e.g. to interleave two of them.
+    """
+
+    def __init__(self, mapref, key, tiebreak=False, keys=None, queue=None, successors=None):
+        self.mapref = mapref
+        self.key = key
+        self.tiebreak = tiebreak
+        self.keys = keys
+        self.height = mapref.height
+        size = mapref.width * mapref.height
+        self.g = [INF] * size                      # a list, so ints stay ints in integer cost mode
+        self.parent = array('i', [-1]) * size
+        self.closed = bytearray((size + 7) >> 3)    # bit (cell & 7) of byte (cell >> 3)
+        self.open = (queue or IndexedHeap)(size)
+        self.successors = successors or mapref.getCellSuccessors
+        self.expanded = 0
+        self.peakopen = 0
+        self.meetcost = INF     # least g + other.g over the cells reached by both, seen by expand()
+        self.meetcell = -1
+
+    def cell(self, coord):
+        """Returns the index of coord"""
+        return coord[0] * self.height + coord[1]
+
+    def coord(self, cell):
+        """Returns the coordinates of cell"""
+        return divmod(cell, self.height)
+
+    def isClosed(self, cell):
+        return bool(self.closed[cell >> 3] >> (cell & 7) & 1)
+
+    def run(self, start, goal):
+        """Searches from start until goal is expanded (returns True) or the open list runs out (returns False)"""
+        h = self.height
+        target = goal[0] * h + goal[1]
+        g, parent, closed = self.g, self.parent, self.closed
+        queue = self.open
+        push, pop = queue.push, queue.pop
+        getSucc = self.successors
+        key, tiebreak, keys = self.key, self.tiebreak, self.keys
+
+        source = start[0] * h + start[1]
+        g[source] = 0
+        push(source, key(0, start, source))
+        while queue:
+            if len(queue) > self.peakopen:
+                self.peakopen = len(queue)
+            current = pop()[1]
+            closed[current >> 3] |= 1 << (current & 7)
+            self.expanded += 1
+            if current == target:
+                return True
+            gcurrent = g[current]
+            for cell, cost in getSucc(current, keys):
+                if closed[cell >> 3] >> (cell & 7) & 1:
+                    continue
+                gcell = gcurrent + cost
+                if gcell < g[cell] or (tiebreak and gcell == g[cell] and current < parent[cell]):
+                    g[cell] = gcell
+                    parent[cell] = current
+                    push(cell, key(gcell, divmod(cell, h), cell))
+        return False
+
+    def begin(self, start):
+        """Puts start on the open list, at g 0, to be searched from with expand()"""
+        cell = self.cell(start)
+        self.g[cell] = 0
+        self.open.push(cell, self.key(0, start, cell))
+
+    def topKey(self):
+        """Returns the key of the next cell expand() expands (the open list must not be empty)"""
+        return self.open.top()[0]
+
+    def expand(self, other=None):
+        """
+        Expands the next cell on the open list, as run() does, and returns it. If other is a search
+        in the opposite direction, also keeps meetcost and meetcell up to date with the cheapest
+        cell reached by both searches, among the expanded cell and those it reaches.
+        """
+        g, parent, closed, h = self.g, self.parent, self.closed, self.height
+        push, key = self.open.push, self.key
+        if len(self.open) > self.peakopen:
+            self.peakopen = len(self.open)
+        current = self.open.pop()[1]
+        closed[current >> 3] |= 1 << (current & 7)
+        self.expanded += 1
+        gcurrent = g[current]
+        if other is not None and gcurrent + other.g[current] < self.meetcost:
+            self.meetcost, self.meetcell = gcurrent + other.g[current], current
+        for cell, cost in self.successors(current, self.keys):
+            if closed[cell >> 3] >> (cell & 7) & 1:
+                continue
+            gcell = gcurrent + cost
+            if gcell < g[cell] or (self.tiebreak and gcell == g[cell] and current < parent[cell]):
+                g[cell] = gcell
+                parent[cell] = current
+                push(cell, key(gcell, divmod(cell, h), cell))
+                if other is not None and gcell + other.g[cell] < self.meetcost:
+                    self.meetcost, self.meetcell = gcell + other.g[cell], cell
+        return current
+
+    def path(self, goal):
+        """Returns the path found to goal, as a list of coordinates from start to goal"""
+        cell = goal[0] * self.height + goal[1]
+        path = []
+        while cell >= 0:
+            path.append(divmod(cell, self.height))
+            cell = self.parent[cell]
+        path.reverse()
+        return path
+
+    def closedCells(self):
+        """Returns the coordinates of the expanded cells"""
+        return [divmod(8 * byte + bit, self.height) for byte, bits in enumerate(self.closed) if bits
+                for bit in xrange(8) if bits >> bit & 1]
+
+    def openCells(self):
+        """Returns the coordinates of the cells left on the open list"""
+        return [divmod(cell, self.height) for cell in self.open.cells()]
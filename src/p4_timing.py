@@ -0,0 +1,140 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Clocks the steps of agents are timed by, and histograms of step latencies.
+
+Two clocks, in seconds, at nanosecond resolution where the system has it: wallClock(), monotonic
+elapsed time, and cpuClock(), CPU time of this process. They are those of Python 3
+(time.perf_counter, time.process_time) if there, or else read from POSIX clock_gettime()
+(CLOCK_MONOTONIC, CLOCK_PROCESS_CPUTIME_ID) through ctypes; failing that, time.time and time.clock.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import sys
+import time
+from math import ceil
+
+# clock ids of clock_gettime(): (monotonic, CPU time of the process)
+CLOCK_IDS = {"darwin": (6, 12)}.get(sys.platform, (1, 2))
+# names of p4_utils.TIMER (and p4.py -t) for each clock; "clock" and "time" as of old
+TIMER_NAMES = {"wall": "wall", "time": "wall", "cpu": "cpu", "clock": "cpu"}
+
+SUB_BITS = 8        # histogram buckets per doubling of latency: 2**(SUB_BITS - 1), so within 1/128 of the value
+TICK = 1e-7         # histogram resolution (seconds)
+
+
+class _timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+def _posixClock(clockid):
+    """Returns a function reading POSIX clock clockid in seconds, or None if it cannot be read"""
+    for name in ("c", "rt"):    # clock_gettime() is in librt before glibc 2.17
+        try:
+            clock_gettime = ctypes.CDLL(ctypes.util.find_library(name)).clock_gettime
+        except (OSError, AttributeError, TypeError):
+            continue
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+        spec = _timespec()
+        ref = ctypes.byref(spec)
+        if clock_gettime(clockid, ref):
+            continue    # not supported by this library: the next may
+
+        def read():
+            clock_gettime(clockid, ref)
+            return spec.tv_sec + spec.tv_nsec * 1e-9
+        return read
+    return None
+
+
+def _pickClock(python3, clockid, fallback):
+    """Returns the first available of time.<python3>, POSIX clock clockid and time.<fallback>"""
+    clock = getattr(time, python3, None) or (_posixClock(clockid) if not sys.platform == "win32" else None)
+    if clock is None:
+        logging.warning("No high-resolution {} clock: using time.{}".format(python3, fallback))
+        clock = getattr(time, fallback)
+    return clock
+
+
+wallClock = _pickClock("perf_counter", CLOCK_IDS[0], "clock" if sys.platform == "win32" else "time")
+cpuClock = _pickClock("process_time", CLOCK_IDS[1], "clock")
+
+
+def getClock(name):
+    """Returns the clock named name: "wall" (or "time") or "cpu" (or "clock")"""
+    try:
+        return wallClock if TIMER_NAMES[name] == "wall" else cpuClock
+    except KeyError:
+        raise ValueError("unknown timer {} (wall or cpu)".format(name))
+
+
+class LatencyHistogram(object):
+    """
+    Latencies (seconds) counted in the manner of HdrHistogram: exactly up to 2**SUB_BITS ticks of TICK,
+    and above that in buckets as wide as the value over 2**(SUB_BITS - 1) at most, so percentiles are
+    within 1% at any scale, in as many buckets as there are distinct ones. The maximum is exact.
+    """
+
+    def __init__(self):
+        self.counts = {}        # bucket: latencies counted in it
+        self.total = 0
+        self.max = 0.0
+
+    def __len__(self):
+        return self.total
+
+    def record(self, latency):
+        ticks = int(latency / TICK)
+        shift = max(ticks.bit_length() - SUB_BITS, 0)
+        # bucket of ticks: the ticks themselves below 2**SUB_BITS, else shift (the doubling) times half the
+        # sub-buckets, plus the top SUB_BITS bits
+        bucket = (shift << SUB_BITS - 1) + (ticks >> shift)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        if latency > self.max:
+            self.max = latency
+
+    def merge(self, other):
+        """Adds the counts of other, another LatencyHistogram"""
+        for bucket, count in other.counts.iteritems():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def _highest(self, bucket):
+        """Returns the highest latency (seconds) counted in bucket"""
+        half = 1 << SUB_BITS - 1
+        if bucket < 2 * half:
+            return (bucket + 1) * TICK
+        shift = bucket // half - 1
+        return ((bucket - half * shift + 1) << shift) * TICK
+
+    def percentile(self, p):
+        """Returns the latency that p percent of those counted are no higher than (to bucket precision,
+        at most the maximum), 0 if none were"""
+        if not self.total:
+            return 0.0
+        rank = max(int(ceil(p / 100.0 * self.total)), 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._highest(bucket), self.max)
+        return self.max
@@ -18,6 +18,7 @@
 import signal
 import os
 from math import sqrt
+from binascii import hexlify, unhexlify
 import logging
 
 # MIN TEXT
@@ -40,7 +41,7 @@ RESET = "reset"      # reset to current map data
 COL_START = "green"  # cross at start pos
 COL_GOAL = "tomato"  # cross at goal pos
 
-TIMER = "clock"      # default timer - may be clock or time
+TIMER = "cpu"        # default timer of steps - may be cpu (time of this process) or wall (monotonic); see p4_timing
 #SQRT2 = sqrt(2)
 #SQRT2 = 1.4
 SQRT2 = 1.414
@@ -54,8 +55,29 @@ G_POS = 1   # g cost so far
 C_POS = 2   # current coord, formatted (col,row)
 P_POS = 3   # parent coord, formatted (col,row)
 
+# 8-connected moves as (col, row) offsets, clockwise from north; odd indices are diagonals
+DIRECTIONS = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+DIRECTION_INDEX = dict((move, d) for d, move in enumerate(DIRECTIONS))
+
 def addVectors(a,b):
     return (a[0]+b[0],a[1]+b[1])
+
+# Byte-parallel helpers. A byte string whose bytes are all small is read as one big integer,
+# so that a single integer AND/OR/shift operates on every byte at once (no carries occur as
+# long as each byte stays below 256). Used to build whole-map tables without per-cell loops.
+def bytesToInt(s):
+    """Returns byte string s as a big-endian integer"""
+    return int(hexlify(s), 16) if s else 0
+
+def intToBytes(v, length):
+    """Inverse of bytesToInt: returns v as a big-endian byte string of given length"""
+    return unhexlify('%0*x' % (2 * length, v)) if length else ''
+
+def shiftBytes(s, offset, fill='\0'):
+    """Returns s shifted so that result[i] == s[i + offset], padding with fill"""
+    if offset >= 0:
+        return s[offset:] + fill * offset
+    return fill * -offset + s[:len(s) + offset]
     
 def getBlock(topleft,botright):
     """Returns list of coordinates in nominated block - domain agnostic"""
@@ -0,0 +1,136 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Shared set-up of the tests: puts src/ on the path and writes small random maps. Run the tests from
+the top directory with
+
+    python -m unittest discover -s tests
+"""
+
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+from collections import deque
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from p4_model import LogicalMap
+
+# agents log every search at INFO (see p4_utils): keep the output of a test run to its results
+logging.disable(logging.INFO)
+
+COSTS = os.path.join(SRC, "..", "costs", "G1-W5-S10.cost")
+COST_MODELS = ("mixed", "mixed_real", "mixed_opt1", "mixed_opt2")
+INF = float('inf')
+
+
+class MapFiles(object):
+    """Temporary directory of map files, removed by close()"""
+
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix="p4test")
+
+    def write(self, rows, name="test.map"):
+        """Writes a map of rows (strings, one per row, all as long) and returns its path"""
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write("type octile\nheight {}\nwidth {}\nmap\n".format(len(rows), len(rows[0])))
+            f.write("\n".join(rows) + "\n")
+        return path
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def randomRows(seed, width=24, height=18, terrain="....GGSWT@"):
+    """Returns the rows of a random map of terrain characters"""
+    rand = random.Random(seed)
+    return ["".join(rand.choice(terrain) for col in xrange(width)) for row in xrange(height)]
+
+
+def loadMap(path, costfile=COSTS, model="mixed", diagonal=True, heuristic="octile", **kwargs):
+    """Returns the LogicalMap of path set up as by SimController.processPrefs()"""
+    lmap = LogicalMap(path, costfile, **kwargs)
+    lmap.setCostModel(model)
+    lmap.setDiagonal(diagonal)
+    lmap.setHeuristic(heuristic)
+    return lmap
+
+
+def cells(lmap):
+    """Returns the coordinates of all cells of lmap"""
+    return [(col, row) for col in xrange(lmap.width) for row in xrange(lmap.height)]
+
+
+def baselineSuccessors(lmap, cell):
+    """Returns [(neighbour, cost)] of the legal moves out of cell (no doors), worked out as getAdjacents()
+    and getCost() did before the successor table: every neighbour on the map, at its mixedmatrix cost,
+    unless a diagonal move cuts the corner of an impassable cell"""
+    col, row = cell
+    moves = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            diag = bool(dx and dy)
+            if not (dx or dy) or (diag and not lmap.diagonal):
+                continue
+            adj = (col + dx, row + dy)
+            if not (0 <= adj[0] < lmap.width and 0 <= adj[1] < lmap.height):
+                continue
+            if diag and not (lmap.costs[lmap.getCell((col, row + dy))] < INF and
+                             lmap.costs[lmap.getCell((col + dx, row))] < INF):
+                continue
+            cost = lmap.mixedmatrix[lmap.getCell(cell), lmap.getCell(adj), diag]
+            if cost < INF:
+                moves.append((adj, cost))
+    return moves
+
+
+def dijkstra(lmap, source):
+    """Returns {cell: cost of the cheapest path from source} over baselineSuccessors()"""
+    from heapq import heappush, heappop
+    dist = {source: 0}
+    heap = [(0, source)]
+    while heap:
+        d, cell = heappop(heap)
+        if d > dist[cell]:
+            continue
+        for adj, cost in baselineSuccessors(lmap, cell):
+            if d + cost < dist.get(adj, INF):
+                dist[adj] = d + cost
+                heappush(heap, (d + cost, adj))
+    return dist
+
+
+def bfs(start, neighbours):
+    """Returns the cells reached from start through neighbours(cell), in breadth-first order"""
+    seen = set([start])
+    order = []
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        order.append(cell)
+        for other in neighbours(cell):
+            if other not in seen:
+                seen.add(other)
+                queue.append(other)
+    return order
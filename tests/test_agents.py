@@ -0,0 +1,149 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import os
+import random
+import unittest
+
+import helpers
+from agents import agent_astar, agent_bidir, agent_cpd, agent_hpa, agent_jps, agent_jpsplus, agent_subgoal
+
+AGENTS = (agent_jps, agent_jpsplus, agent_subgoal, agent_bidir, agent_cpd)
+# agents that keep their preprocessing in a cache file with -mc (see p4_cache), by file suffix
+CACHED = ((agent_jpsplus, ".p4jps"), (agent_subgoal, ".p4ssg"), (agent_hpa, ".p4hpa"),
+          (agent_cpd, ".p4cpd"))
+
+
+class AgentCostTest(unittest.TestCase):
+    """Agents that find optimal paths: the same costs as agent_astar"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.rand = random.Random(9)
+
+    def tearDown(self):
+        self.files.close()
+
+    def walk(self, agent, lmap, start, goal):
+        """Returns the cost of the path agent takes from start to goal, stepping it by getNext() as
+        SimController does, or None if it finds none"""
+        current, cost = start, 0
+        for n in xrange(4 * lmap.width * lmap.height):
+            if current == goal:
+                return cost
+            step = agent.getNext(lmap, current, goal, 0)
+            if step is None or step == current:
+                return None
+            cost += lmap.getCost(step, current)
+            current = step
+        self.fail("{} did not reach {} from {}".format(agent.__module__, goal, start))
+
+    def checkAgents(self, lmap, problems=30):
+        """Checks the costs of AGENTS against agent_astar on random problems of lmap"""
+        passable = [cell for cell in helpers.cells(lmap) if lmap.isPassable(cell)]
+        astar = agent_astar.Agent()
+        agents = [module.Agent() for module in AGENTS]
+        for n in xrange(problems):
+            start, goal = self.rand.sample(passable, 2)
+            if not lmap.isReachable(start, goal):
+                continue
+            expected = self.walk(astar, lmap, start, goal)
+            for agent in agents:
+                self.assertAlmostEqual(self.walk(agent, lmap, start, goal), expected, 9,
+                                       (agent.__module__, start, goal))
+
+    def testUniform(self):
+        # no water: jump points, JPS+ and subgoals apply to uniform maps with reversible moves
+        lmap = helpers.loadMap(self.files.write(helpers.randomRows(9, 30, 20, "......@@T")), costfile=None)
+        self.checkAgents(lmap)
+
+    def testEdits(self):
+        # tables built from the passability grid are rebuilt after terrain edits between problems
+        lmap = helpers.loadMap(self.files.write(helpers.randomRows(11, 30, 20, "......@@T")), costfile=None)
+        astar = agent_astar.Agent()
+        agents = [module.Agent() for module in (agent_jpsplus, agent_subgoal, agent_cpd)]
+        for terrain in "@.@.":
+            lmap.setPoints(terrain, self.rand.sample(helpers.cells(lmap), 30))
+            passable = [cell for cell in helpers.cells(lmap) if lmap.isPassable(cell)]
+            for n in xrange(8):
+                start, goal = self.rand.sample(passable, 2)
+                if lmap.isReachable(start, goal):
+                    expected = self.walk(astar, lmap, start, goal)
+                    for agent in agents:
+                        self.assertAlmostEqual(self.walk(agent, lmap, start, goal), expected, 9,
+                                               (agent.__module__, start, goal))
+
+    def testMixedCosts(self):
+        lmap = helpers.loadMap(self.files.write(helpers.randomRows(10, 20, 16)), model="mixed_real")
+        self.checkAgents(lmap, 15)
+
+
+class CpdUpdateTest(unittest.TestCase):
+    """agent_cpd: the database rebuilt only when the terrain or costs have changed since it was built"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.lmap = helpers.loadMap(self.files.write(helpers.randomRows(16, 20, 16)))
+        self.agent = agent_cpd.Agent()
+        self.agent.preprocess(self.lmap)
+        self.database = self.agent.database
+
+    def tearDown(self):
+        self.files.close()
+
+    def testUpdates(self):
+        self.agent._update(self.lmap)
+        self.assertIs(self.agent.database, self.database)
+        wall = next(cell for cell in helpers.cells(self.lmap) if self.lmap.getCell(cell) == "@")
+        self.lmap.setCell(".", wall)
+        self.lmap.setCell("@", wall)    # undone: the database is still good
+        self.agent._update(self.lmap)
+        self.assertIs(self.agent.database, self.database)
+        self.lmap.setCell(".", wall)
+        self.agent._update(self.lmap)
+        self.assertIsNot(self.agent.database, self.database)
+        self.database = self.agent.database
+        self.lmap.setCostModel("mixed_real")
+        self.agent._update(self.lmap)
+        self.assertIsNot(self.agent.database, self.database)
+
+
+class AgentCacheTest(unittest.TestCase):
+    """Preprocessing caches: written only with a map cache, as the .p4grid cache of the map is"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.path = self.files.write(helpers.randomRows(14, 30, 20, "......@@T"))
+
+    def tearDown(self):
+        self.files.close()
+
+    def cacheFiles(self, directory, suffix):
+        return [name for name in os.listdir(directory) if name.endswith(suffix)]
+
+    def testCacheOnlyWhenAsked(self):
+        cachedir = os.path.join(self.files.dir, "cache")
+        os.mkdir(cachedir)
+        for module, suffix in CACHED:
+            module.Agent().preprocess(helpers.loadMap(self.path, costfile=None))
+            self.assertEqual(self.cacheFiles(self.files.dir, suffix), [], module.__name__)
+            module.Agent().preprocess(helpers.loadMap(self.path, costfile=None, cache=cachedir))
+            self.assertEqual(len(self.cacheFiles(cachedir, suffix)), 1, module.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import os
+import unittest
+
+import helpers
+import p4_controller
+import p4_matrix
+
+
+class RunProblemTest(unittest.TestCase):
+    """BatchWorker.runProblem(): the rows of batch mode"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        # two halves, walled off from each other
+        rows = ["......@....."] * 8
+        self.lmap = helpers.LogicalMap(self.files.write(rows), None)
+        cfg = dict(p4_matrix.DEFAULTS, AGENT_FILE=os.path.join(helpers.SRC, "agents", "agent_astar.py"),
+                   COST_MODEL="mixed", HEURISTIC="octile")
+        self.worker = p4_controller.BatchWorker(cfg, self.lmap)
+
+    def tearDown(self):
+        self.files.close()
+
+    def row(self, start, goal):
+        problem = ["0", "test.map", "12", "8"] + [str(n) for n in start + goal] + ["7.07"]
+        return dict(zip(p4_controller.BATCH_HEADER, self.worker.runProblem(1, problem, 1)))
+
+    def testReachable(self):
+        row = self.row((0, 0), (5, 5))       # 5 diagonal moves
+        self.assertAlmostEqual(row["actual"], 5 * self.lmap.SQRT2)
+        self.assertEqual(row["steps"], 5)
+        self.assertEqual(row["quality"], 1.0)
+
+    def testUnreachable(self):
+        row = self.row((0, 0), (8, 5))
+        self.assertEqual(row["map"], "test.map")
+        for key in p4_controller.BATCH_HEADER[p4_controller.BATCH_HEADER.index("actual"):]:
+            self.assertEqual(row[key], "", key)
+
+
+if __name__ == '__main__':
+    unittest.main()
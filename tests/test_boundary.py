@@ -0,0 +1,58 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+import helpers
+
+
+class BoundaryTest(unittest.TestCase):
+    """The cost-boundary table: same answers as _hasDiffAdj() and _getDiffAdjs()"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.lmap = helpers.loadMap(self.files.write(helpers.randomRows(5)))
+        self.rand = random.Random(5)
+
+    def tearDown(self):
+        self.files.close()
+
+    def checkBoundary(self, lmap):
+        """Checks hasDiffAdj(), getDiffAdjs() and getCostBoundary() against the baseline scans on random cells"""
+        boundary = set(lmap.getCostBoundary())
+        for cell in self.rand.sample(helpers.cells(lmap), 150):
+            self.assertEqual(lmap.hasDiffAdj(cell), lmap._hasDiffAdj(cell), cell)
+            self.assertEqual(cell in boundary, lmap._hasDiffAdj(cell), cell)
+            self.assertEqual(sorted(lmap.getDiffAdjs(cell)),
+                             sorted(adj for adj in lmap._getDiffAdjs(cell) if lmap.isPassable(adj)), cell)
+
+    def testDiagonal(self):
+        for diagonal in (True, False):
+            self.lmap.setDiagonal(diagonal)
+            self.lmap.preprocessMap()
+            self.checkBoundary(self.lmap)
+
+    def testEdits(self):
+        self.lmap.preprocessMap()
+        for terrain in "@.WSG":
+            self.lmap.setPoints(terrain, self.rand.sample(helpers.cells(self.lmap), 30))
+            self.checkBoundary(self.lmap)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+import helpers
+from agents import agent_hpa
+
+
+class HpaUpdateTest(unittest.TestCase):
+    """agent_hpa: the abstraction kept up to date from the change journal, as if built again"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.lmap = helpers.loadMap(self.files.write(helpers.randomRows(15, 48, 40)))
+        self.rand = random.Random(15)
+        self.agent = agent_hpa.Agent()
+        self.agent.preprocess(self.lmap)
+        self.builds = 0
+        preprocess = self.agent.preprocess
+
+        def counted(mapref):
+            self.builds += 1
+            preprocess(mapref)
+        self.agent.preprocess = counted
+
+    def tearDown(self):
+        self.files.close()
+
+    def assertBuiltAgain(self):
+        """Checks the abstraction of the agent against one built from scratch"""
+        fresh = agent_hpa.Agent()
+        fresh.preprocess(self.lmap)
+        self.assertEqual(self.agent.borders, fresh.borders)
+        self.assertEqual(self.agent.nodes, fresh.nodes)
+        self.assertEqual(dict((node, sorted(edges)) for node, edges in self.agent.intra.iteritems()),
+                         dict((node, sorted(edges)) for node, edges in fresh.intra.iteritems()))
+
+    def testUnchanged(self):
+        for n in xrange(3):
+            self.agent._update(self.lmap)
+        self.assertEqual(self.builds, 0)
+
+    def testRepair(self):
+        for terrain in "@.W@.":
+            self.lmap.setPoints(terrain, self.rand.sample(helpers.cells(self.lmap), 6))
+            self.lmap.setCell("G", self.rand.choice(helpers.cells(self.lmap)))
+            self.agent._update(self.lmap)
+            self.assertEqual(self.builds, 0)
+            self.assertBuiltAgain()
+
+    def testRebuilds(self):
+        self.lmap.setCostModel("mixed_real")
+        self.agent._update(self.lmap)
+        self.assertEqual(self.builds, 1)
+        for n in xrange(100):   # more changes than the journal keeps
+            self.lmap.setCell("@", self.rand.choice(helpers.cells(self.lmap)))
+        self.agent._update(self.lmap)
+        self.assertEqual(self.builds, 2)
+        self.assertBuiltAgain()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+from math import sqrt
+
+import helpers
+import p4_search
+from helpers import INF
+
+SCALE = 1000
+
+
+class IntegerCostTest(unittest.TestCase):
+    """Integer cost mode: int costs, scaled and rounded, that realCost() turns back into float ones"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.path = self.files.write(helpers.randomRows(13))
+        self.rand = random.Random(13)
+
+    def tearDown(self):
+        self.files.close()
+
+    def tolerance(self, lmap, cost):
+        """Returns how far realCost() of a move in integer mode may be from its float cost: half a scaled
+        unit of rounding, and the difference between sqrt(2) and the SQRT2 of float mode"""
+        return 0.5 / SCALE + cost * abs(sqrt(2) - lmap.SQRT2) / lmap.SQRT2 + 1e-12
+
+    def testRealCost(self):
+        lmap = helpers.loadMap(self.path)
+        self.assertEqual(lmap.realCost(2.5), 2.5)
+        lmap.setCostScale(SCALE)
+        self.assertEqual(lmap.realCost(1414), 1.414)
+        self.assertEqual(lmap.realCost(lmap.getCost((0, 0))), lmap.costs[lmap.getCell((0, 0))])
+
+    def testMoves(self):
+        for model in helpers.COST_MODELS:
+            floats = helpers.loadMap(self.path, model=model)
+            ints = helpers.loadMap(self.path, model=model)
+            ints.setCostScale(SCALE)
+            for cell in helpers.cells(floats):
+                expected = dict(helpers.baselineSuccessors(floats, cell))
+                moves = ints.getSuccessors(cell)
+                self.assertEqual(sorted(adj for adj, cost in moves), sorted(expected), cell)
+                for adj, cost in moves:
+                    self.assertIsInstance(cost, int)
+                    self.assertEqual(ints.getCost(adj, cell), cost)
+                    self.assertLessEqual(abs(ints.realCost(cost) - expected[adj]),
+                                         self.tolerance(floats, expected[adj]), (cell, adj))
+
+    def testSearch(self):
+        for model in helpers.COST_MODELS:
+            floats = helpers.loadMap(self.path, model=model)
+            ints = helpers.loadMap(self.path, model=model)
+            ints.setCostScale(SCALE)
+            passable = [cell for cell in helpers.cells(ints) if ints.isPassable(cell)]
+            for start in self.rand.sample(passable, 4):
+                dist = helpers.dijkstra(ints, start)
+                realdist = helpers.dijkstra(floats, start)
+                for goal in self.rand.sample(passable, 8):
+                    getH = ints.getH
+                    search = p4_search.BestFirst(ints, lambda g, coord, cell: (g + getH(coord, goal), g, cell),
+                                                 queue=p4_search.openList(ints))
+                    if not search.run(start, goal):
+                        self.assertNotIn(goal, dist)
+                        continue
+                    path = search.path(goal)
+                    cost = ints.validator(path)
+                    self.assertIsInstance(cost, int)
+                    self.assertEqual(cost, dist[goal], (start, goal))
+                    self.assertLessEqual(getH(start, goal), cost)
+                    # within the tolerance of every move of the cheapest path of either mode (of at most
+                    # realdist[goal] moves, as moves cost at least 1)
+                    self.assertLessEqual(abs(ints.realCost(cost) - realdist[goal]),
+                                         (len(path) + realdist[goal]) * self.tolerance(floats, 1) +
+                                         2 * self.tolerance(floats, realdist[goal]), (start, goal))
+
+    def testFloatsAgain(self):
+        lmap = helpers.loadMap(self.path, model="mixed_real")
+        matrix = dict(lmap.mixedmatrix)
+        lmap.setCostScale(SCALE)
+        self.assertTrue(all(isinstance(cost, int) for cost in lmap.mixedmatrix.itervalues() if cost < INF))
+        lmap.setCostScale(0)
+        self.assertEqual(lmap.mixedmatrix, matrix)
+        self.assertEqual(lmap.realCost(3.5), 3.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import os
+import random
+import unittest
+
+import helpers
+from helpers import INF
+
+
+class LandmarkTest(unittest.TestCase):
+    """The landmark heuristic: admissible, never below octile, and kept admissible by terrain edits"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.path = self.files.write(helpers.randomRows(8))
+        self.lmap = helpers.loadMap(self.path, heuristic="landmark")
+        self.rand = random.Random(8)
+
+    def tearDown(self):
+        self.files.close()
+
+    def checkBounds(self, lmap):
+        """Checks getH() against octile and the cheapest costs, from random cells to random goals"""
+        passable = [cell for cell in helpers.cells(lmap) if lmap.isPassable(cell)]
+        for source in self.rand.sample(passable, 12):
+            dist = helpers.dijkstra(lmap, source)
+            for goal in self.rand.sample(passable, 12):
+                h = lmap.getH(source, goal)
+                self.assertGreaterEqual(h, lmap._octile(source, goal))
+                self.assertLessEqual(h, dist.get(goal, INF) + 1e-9)
+
+    def testBounds(self):
+        for model in helpers.COST_MODELS:
+            self.lmap.setCostModel(model)
+            self.lmap.setHeuristic("landmark")
+            self.checkBounds(self.lmap)
+
+    def testRaisingEdits(self):
+        self.lmap.setPoints("@", [cell for cell in helpers.cells(self.lmap)
+                                  if self.lmap.getCell(cell) == "G"][:20])
+        self.assertFalse(self.lmap._altstale)
+        self.checkBounds(self.lmap)
+
+    def testLoweringEdits(self):
+        walls = [cell for cell in helpers.cells(self.lmap) if self.lmap.getCell(cell) == "@"]
+        self.lmap.setPoints(".", walls[:20])
+        self.assertTrue(self.lmap._altstale)
+        self.checkBounds(self.lmap)
+        self.lmap.setHeuristic("landmark")
+        self.assertFalse(self.lmap._altstale)
+        self.checkBounds(self.lmap)
+
+    def testCacheOnlyWhenAsked(self):
+        self.assertEqual([name for name in os.listdir(self.files.dir) if name.endswith(".p4alt")], [])
+        cachedir = os.path.join(self.files.dir, "cache")
+        os.mkdir(cachedir)
+        helpers.loadMap(self.path, heuristic="landmark", cache=cachedir)
+        self.assertEqual(len([name for name in os.listdir(cachedir) if name.endswith(".p4alt")]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+import helpers
+
+
+def chebyshev(a, b):
+    return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+
+
+class NearestTest(unittest.TestCase):
+    """nearestPassable(): a passable cell as few king moves away as breadth-first search finds"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.lmap = helpers.loadMap(self.files.write(helpers.randomRows(7, terrain="..G@@@@TTW")))
+        self.rand = random.Random(7)
+
+    def tearDown(self):
+        self.files.close()
+
+    def kingMoves(self, cell):
+        return [(cell[0] + dx, cell[1] + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                if 0 <= cell[0] + dx < self.lmap.width and 0 <= cell[1] + dy < self.lmap.height]
+
+    def checkNearest(self, lmap):
+        """Checks nearestPassable() on every cell against the first passable cell found by breadth-first
+        search over king moves"""
+        for cell in helpers.cells(lmap):
+            nearest = lmap.nearestPassable(cell)
+            if lmap.isPassable(cell):
+                self.assertEqual(nearest, cell)
+                continue
+            first = next(other for other in helpers.bfs(cell, self.kingMoves) if lmap.isPassable(other))
+            self.assertTrue(lmap.isPassable(nearest), cell)
+            self.assertEqual(chebyshev(cell, nearest), chebyshev(cell, first), cell)
+
+    def testNearest(self):
+        self.checkNearest(self.lmap)
+
+    def testOffMap(self):
+        for coord in ((-5, 3), (3, -5), (self.lmap.width + 2, 4), (-1, self.lmap.height)):
+            placed = self.lmap.placeOnMap(coord)
+            self.assertEqual(self.lmap.nearestPassable(coord), self.lmap.nearestPassable(placed))
+
+    def testEdits(self):
+        self.checkNearest(self.lmap)
+        for terrain in "@.@@.":
+            self.lmap.setPoints(terrain, self.rand.sample(helpers.cells(self.lmap), 40))
+            self.checkNearest(self.lmap)
+
+    def testNothingPassable(self):
+        self.lmap.setPoints("@", helpers.cells(self.lmap))
+        self.assertIsNone(self.lmap.nearestPassable((3, 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+import helpers
+
+
+class ReachableTest(unittest.TestCase):
+    """isReachable(): the components of the successor graph, as found by breadth-first search"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        # more walls than randomRows() usually has, so the map falls into several components
+        self.path = self.files.write(helpers.randomRows(6, terrain="...GSW@@@T"))
+        self.rand = random.Random(6)
+
+    def tearDown(self):
+        self.files.close()
+
+    def components(self, lmap):
+        """Returns {passable cell: label} over moves in either direction, by breadth-first search"""
+        links = dict((cell, set()) for cell in helpers.cells(lmap) if lmap.isPassable(cell))
+        for cell in links:
+            for adj, cost in helpers.baselineSuccessors(lmap, cell):
+                links[cell].add(adj)
+                links[adj].add(cell)
+        labels = {}
+        for cell in links:
+            if cell not in labels:
+                for other in helpers.bfs(cell, links.get):
+                    labels[other] = cell
+        return labels
+
+    def checkReachable(self, lmap):
+        """Checks isReachable() against components() and, where it is exact, against breadth-first search
+        along legal moves, on random pairs of cells"""
+        labels = self.components(lmap)
+        passable = sorted(labels)
+        self.assertGreater(len(set(labels.values())), 1)
+        for a in self.rand.sample(passable, 20):
+            reached = set(helpers.bfs(a, lambda cell: [adj for adj, cost in helpers.baselineSuccessors(lmap, cell)]))
+            for b in self.rand.sample(passable, 40):
+                self.assertEqual(lmap.isReachable(a, b), labels[a] == labels[b], (a, b))
+                if b in reached:
+                    self.assertTrue(lmap.isReachable(a, b), (a, b))
+                if not lmap.uniform:
+                    self.assertEqual(lmap.isReachable(a, b), b in reached, (a, b))
+        for b in self.rand.sample([cell for cell in helpers.cells(lmap) if cell not in labels], 10):
+            self.assertFalse(lmap.isReachable(passable[0], b), b)
+
+    def testCostModels(self):
+        for costfile in (helpers.COSTS, None):
+            for diagonal in (True, False):
+                self.checkReachable(helpers.loadMap(self.path, costfile, diagonal=diagonal))
+
+    def testEdits(self):
+        lmap = helpers.loadMap(self.path)
+        self.checkReachable(lmap)
+        for terrain in "@.@.":
+            lmap.setPoints(terrain, self.rand.sample(helpers.cells(lmap), 25))
+            self.checkReachable(lmap)
+
+
+if __name__ == '__main__':
+    unittest.main()
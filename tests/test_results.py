@@ -0,0 +1,87 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sqlite3
+import unittest
+
+import helpers
+import p4_results
+
+SCENARIO = """version 1
+3 maps/test.map 24 18 1 2 3 4 5.5
+0 maps/test.map 24 18 2 3 4 5 6.5
+7 maps/test.map 24 18 3 4 5 6 7.5
+"""
+
+
+class ResultsStoreTest(unittest.TestCase):
+    """ResultsStore: problems added as their rows are, with the bucket read from the scenario"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.scenario = os.path.join(self.files.dir, "test.map.scen")
+        with open(self.scenario, "w") as f:
+            f.write(SCENARIO)
+        self.path = os.path.join(self.files.dir, "results.db")
+
+    def tearDown(self):
+        self.files.close()
+
+    def row(self, no):
+        """Returns the row of a run of problem no of SCENARIO (see BATCH_HEADER)"""
+        start, goal = (no, no + 1), (no + 2, no + 3)
+        return ["agent_astar", no, "test.map", start[0], start[1], goal[0], goal[1], "{:.2f}".format(no + 4.5),
+                no + 4.5, 10, 0.5, 1.0, "", 100, 1e-6, 2e-6, 3e-6, 4e-6]
+
+    def addRun(self, store, nos):
+        run = store.beginRun({"AGENT_FILE": "agent_astar.py", "MAP_FILE": "maps/test.map"}, self.scenario)
+        for no in nos:
+            store.addRow(run, self.row(no))
+        store.endRun(run)
+        return run
+
+    def testProblems(self):
+        store = p4_results.ResultsStore(self.path)
+        self.addRun(store, [1, 3])         # as resumed: problem 2 done before
+        self.addRun(store, [2, 3, 1])      # out of order: the scenario is read again
+        store.close()
+        db = sqlite3.connect(self.path)
+        self.assertEqual(db.execute("SELECT bucket, startx, starty, goalx, goaly, optimum FROM problems"
+                                    " ORDER BY startx").fetchall(),
+                         [(3, 1, 2, 3, 4, 5.5), (0, 2, 3, 4, 5, 6.5), (7, 3, 4, 5, 6, 7.5)])
+        self.assertEqual(db.execute("SELECT run, no, problems.startx FROM measurements JOIN problems"
+                                    " ON measurements.problem = problems.id ORDER BY run, no").fetchall(),
+                         [(1, 1, 1), (1, 3, 3), (2, 1, 1), (2, 2, 2), (2, 3, 3)])
+        self.assertEqual(p4_results.summary(db, bucket=7)[0][4], 2)
+
+    def testUnreachable(self):
+        # measured fields of problems skipped as unreachable are empty: stored as NULL, left out of averages
+        store = p4_results.ResultsStore(self.path)
+        run = store.beginRun({"AGENT_FILE": "agent_astar.py", "MAP_FILE": "maps/test.map"}, self.scenario)
+        store.addRow(run, self.row(1))
+        store.addRow(run, self.row(2)[:8] + [""] * 10)
+        store.endRun(run)
+        store.close()
+        db = sqlite3.connect(self.path)
+        self.assertEqual(db.execute("SELECT no, actual, quality FROM measurements ORDER BY no").fetchall(),
+                         [(1, 5.5, 1.0), (2, None, None)])
+        self.assertEqual(p4_results.summary(db)[0][4:7], (2, 1.0, 0.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
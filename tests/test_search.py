@@ -0,0 +1,142 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+import helpers
+import p4_search
+from helpers import INF
+
+
+class IndexedHeapTest(unittest.TestCase):
+    """IndexedHeap: pops cells in order of their least key, each once"""
+
+    def testDecreaseKey(self):
+        rand = random.Random(11)
+        heap = p4_search.IndexedHeap(200)
+        least = {}
+        for n in xrange(1000):
+            cell, key = rand.randrange(200), rand.randrange(10000)
+            pushed = heap.push(cell, key)
+            self.assertEqual(pushed, key < least.get(cell, INF))
+            if pushed:
+                least[cell] = key
+            self.assertEqual(len(heap), len(least))
+            self.assertEqual(sorted(heap.cells()), sorted(least))
+            self.assertEqual(heap.top(), min((k, c) for c, k in least.iteritems()))
+        popped = []
+        while heap:
+            key, cell = heap.pop()
+            self.assertEqual(key, least.pop(cell))
+            popped.append(key)
+        self.assertEqual(popped, sorted(popped))
+        self.assertEqual(least, {})
+
+    def testPushAfterPop(self):
+        heap = p4_search.IndexedHeap(4)
+        heap.push(1, 5)
+        heap.push(2, 3)
+        self.assertEqual(heap.pop(), (3, 2))
+        self.assertTrue(heap.push(2, 7))    # off the heap: added again, whatever its key was
+        self.assertEqual([heap.pop(), heap.pop()], [(5, 1), (7, 2)])
+
+
+class BucketQueueTest(unittest.TestCase):
+    """BucketQueue: pops cells bucket by bucket of f, lowest g first within a bucket, each once at its least key"""
+
+    def testOrder(self):
+        rand = random.Random(12)
+        for width in (0.5, 1.0, 1.5):
+            queue = p4_search.BucketQueue(100, width)
+            least = {}
+            for n in xrange(600):
+                cell = rand.randrange(100)
+                g = rand.randrange(40) * 0.5
+                key = (g + rand.randrange(40) * 0.5, g)
+                pushed = queue.push(cell, key)
+                self.assertEqual(pushed, key < least.get(cell, (INF, INF)))
+                if pushed:
+                    least[cell] = key
+                self.assertEqual(len(queue), len(least))
+            self.assertEqual(sorted(queue.cells()), sorted(least))
+            popped = []
+            while queue:
+                key, cell = queue.pop()
+                self.assertEqual(key, least.pop(cell))
+                popped.append((int(key[0] / width), key[1]))
+            self.assertEqual(popped, sorted(popped))
+            self.assertEqual(least, {})
+
+    def testLowerBucket(self):
+        queue = p4_search.BucketQueue(4, 1.0)
+        queue.push(0, (3.0, 1.0))
+        queue.push(1, (5.0, 2.0))
+        self.assertEqual(queue.pop(), ((3.0, 1.0), 0))
+        queue.push(2, (0.5, 0.5))           # below the bucket last popped from
+        queue.push(1, (4.0, 1.5))           # decreased: the entry in bucket 5 is skipped
+        self.assertEqual([queue.pop(), queue.pop()], [((0.5, 0.5), 2), ((4.0, 1.5), 1)])
+        self.assertEqual(len(queue), 0)
+
+
+class BestFirstTest(unittest.TestCase):
+    """BestFirst, as A*: the cheapest costs of Dijkstra's algorithm over the baseline moves"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.path = self.files.write(helpers.randomRows(12))
+        self.rand = random.Random(12)
+
+    def tearDown(self):
+        self.files.close()
+
+    def checkCosts(self, lmap, queue=None):
+        """Checks the cost of A* on BestFirst, with queue as its open list, against dijkstra() from
+        random cells to random goals, and the cost of the path found"""
+        passable = [cell for cell in helpers.cells(lmap) if lmap.isPassable(cell)]
+        for start in self.rand.sample(passable, 6):
+            dist = helpers.dijkstra(lmap, start)
+            for goal in self.rand.sample(passable, 10):
+                search = p4_search.BestFirst(lmap, lambda g, coord, cell: (g + lmap.getH(coord, goal), g, cell),
+                                             queue=queue)
+                found = search.run(start, goal)
+                self.assertEqual(found, goal in dist, (start, goal))
+                if found:
+                    cost = search.g[goal[0] * lmap.height + goal[1]]
+                    self.assertAlmostEqual(cost, dist[goal], 9, (start, goal))
+                    self.assertAlmostEqual(lmap.validator(search.path(goal)), cost, 9, (start, goal))
+
+    def testCostModels(self):
+        for costfile in (helpers.COSTS, None):
+            for model in helpers.COST_MODELS:
+                for heuristic in ("octile", "euclid", "landmark"):
+                    self.checkCosts(helpers.loadMap(self.path, costfile, model, heuristic=heuristic))
+
+    def testBucketQueue(self):
+        # octile f-values fall on few values only where moves cost the same all over: no water
+        uniform = self.files.write(helpers.randomRows(12, terrain="....GS@T"), "uniform.map")
+        for path, costfile, model in ((self.path, helpers.COSTS, "mixed_opt1"),
+                                      (self.path, helpers.COSTS, "mixed_opt2"), (uniform, None, "mixed")):
+            lmap = helpers.loadMap(path, costfile, model)
+            queue = p4_search.openList(lmap)
+            self.assertIsNot(queue, p4_search.IndexedHeap)
+            self.checkCosts(lmap, queue)
+        self.assertIs(p4_search.openList(helpers.loadMap(self.path, model="mixed_real")), p4_search.IndexedHeap)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# Copyright (C) 2014-17 Peta Masters and Sebastian Sardina
+#
+# This file is part of "P4-Simulator" package.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+import helpers
+
+
+class SuccessorTest(unittest.TestCase):
+    """The successor table: same moves and costs as the neighbourhood and mixedmatrix it replaced"""
+
+    def setUp(self):
+        self.files = helpers.MapFiles()
+        self.path = self.files.write(helpers.randomRows(2))
+
+    def tearDown(self):
+        self.files.close()
+
+    def checkSuccessors(self, lmap):
+        """Checks getSuccessors(), getCellSuccessors() and getAdjacents() (every neighbour on the map) with
+        getCost() against baselineSuccessors() on every cell of lmap"""
+        h = lmap.height
+        for cell in helpers.cells(lmap):
+            expected = sorted(helpers.baselineSuccessors(lmap, cell))
+            self.assertEqual(sorted(lmap.getSuccessors(cell)), expected, cell)
+            self.assertEqual(sorted(lmap.getCellSuccessors(cell[0] * h + cell[1])),
+                             sorted((col * h + row, cost) for (col, row), cost in expected), cell)
+            adjacents = lmap.getAdjacents(cell)
+            self.assertEqual(sorted(adjacents), sorted(adj for adj in lmap.getAllAdjacents(cell)
+                                                       if lmap.diagonal or not lmap.isDiag(cell, adj)), cell)
+            self.assertEqual(sorted((adj, lmap.getCost(adj, cell)) for adj in adjacents
+                                    if lmap.getCost(adj, cell) < helpers.INF), expected, cell)
+
+    def testCostModels(self):
+        for costfile in (helpers.COSTS, None):
+            for diagonal in (True, False):
+                for model in helpers.COST_MODELS:
+                    self.checkSuccessors(helpers.loadMap(self.path, costfile, model, diagonal))
+
+    def testEdits(self):
+        lmap = helpers.loadMap(self.path)
+        self.checkSuccessors(lmap)
+        rand = random.Random(2)
+        for terrain in "@.WSG":
+            lmap.setPoints(terrain, rand.sample(helpers.cells(lmap), 40))
+            self.checkSuccessors(lmap)
+
+    def testPredecessors(self):
+        lmap = helpers.loadMap(self.path, model="mixed_real")
+        h = lmap.height
+        expected = dict((cell, []) for cell in xrange(lmap.width * h))
+        for (col, row) in helpers.cells(lmap):
+            for (adjcol, adjrow), cost in helpers.baselineSuccessors(lmap, (col, row)):
+                expected[adjcol * h + adjrow].append((col * h + row, cost))
+        for cell, preds in expected.iteritems():
+            self.assertEqual(sorted(lmap.getCellPredecessors(cell)), sorted(preds), cell)
+
+
+if __name__ == '__main__':
+    unittest.main()